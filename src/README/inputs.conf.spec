@@ -13,17 +13,182 @@ recurse = <value>
 only_if_changed = <value>
 * If true, then the only entries that will be returned will be the ones in which one of the time values changed
 
+track_changes = <value>
+* If true, a manifest of the paths observed is kept (next to the input's checkpoint) and only the paths that were created, modified or deleted since the last run will be returned
+* Each event includes an action field indicating the change (created, modified or deleted)
+* The access time is not considered a change; unchanged paths are skipped without computing hashes or looking up ACLs
+* This supersedes only_if_changed
+* The manifest is stored in a SQLite database next to the input's checkpoint (shared with the hash cache) so that it doesn't need to be loaded into memory
+
+watch_mode = <value>
+* If true, the directory is watched for changes (using inotify on Linux) and an event is output for each path that is created, modified or deleted as the changes happen (with an action field like track_changes)
+* The scans still run on the interval and reconcile the changes that the watcher may have missed (e.g. deletions while the queue of inotify events overflowed)
+* The directories that cannot be watched because the limit on inotify watches was reached (see /proc/sys/fs/inotify/max_user_watches) are polled instead
+* An entry for each path within the polled directories is kept in memory; if max_entries is set, the directories that would take the number of these entries past it are not polled (their changes are only reported by the scans)
+* The changed files are hashed with the same settings as the scans: the hashes are cached (see file_hash_cache) and the reads are limited by max_read_bytes_per_sec and max_stat_ops_per_sec (separately from the scans)
+* Requires recurse; this is ignored (with a warning) on hosts that don't support inotify
+* Defaults to false
+
+watch_poll_interval = <value>
+* How often to poll the directories that cannot be watched since the limit on inotify watches was reached (see watch_mode)
+* This value can include units (e.g. 1m for a minute)
+* Defaults to 60 seconds
+
 include_file_hash = <value>
-* If true, then a cryptographic hash will be generated for the files using the SHSA224 algorithm
+* If true, then a cryptographic hash will be generated for the files using the SHA224 algorithm (or the algorithms in hash_algorithms)
 * WARNING: enabling this can generate a large amount of IO load especially if large files are being monitored.
 * It is generally recommended you set a file_hash_limit limit too if you include file hashes so that large files do not generate a large amount of IO load
+* The rate that files are read at can be limited with max_read_bytes_per_sec
 
 file_hash_limit = <value>
 * This places a limit on the size of the files that will be hashed (see include_file_hash above); files larger than this value will not be hashed
 * This value can include units (e.g. 15mb for 15 megabytes, 1gb for 1 gigabyte)
 
+file_hash_chunk_size = <value>
+* The amount of data that will be read at a time when computing file hashes (defaults to 1mb)
+* The memory used for hashing is bounded by this value (per hashing thread) regardless of the size of the files
+* This value can include units (e.g. 64kb for 64 kilobytes, 1mb for 1 megabyte)
+
+file_hash_mmap_threshold = <value>
+* If set, files at least this large will be memory-mapped when computing the hash instead of being read into a buffer
+* This value can include units (e.g. 15mb for 15 megabytes, 1gb for 1 gigabyte)
+
+hash_algorithms = <value>
+* A comma separated list of the hash algorithms to compute when include_file_hash is enabled (e.g. sha256,md5,blake2b)
+* Each hash is included in a field named after the algorithm (e.g. sha256)
+* All of the hashes are computed from a single read of the file
+* Defaults to sha224
+
+file_hash_cache = <value>
+* If true, the hashes will be cached (next to the input's checkpoint) and re-used on later runs for files whose device, inode, size and modification time haven't changed
+* Only the files that are new or changed will be read
+* The cache is stored in a SQLite database next to the input's checkpoint (shared with the manifest)
+* Defaults to false
+
+hash_workers = <value>
+* The number of threads that will be used to compute file hashes concurrently (see include_file_hash above)
+* Defaults to 1 (hashes are computed one at a time)
+
+traversal_workers = <value>
+* The number of threads that will be used to list directories (and get the file information) concurrently
+* This speeds up scans of file-systems with a high latency per call (such as SMB or NFS mounts)
+* The events are still output in the same order
+* Defaults to 1 (directories are listed one at a time)
+
+scan_processes = <value>
+* The number of processes that will be used to scan the top-level sub-directories (each builds and serializes the events of its sub-directories)
+* The events of the sub-directories are built in the worker processes (so that this work can run on several cores) and sent back to this process to be output
+* The events of the sub-directories are interleaved so they are not output in the same order as a single process
+* This is not supported with track_changes or file_hash_cache (a single process will be used)
+* Defaults to 1 (the scan is done in a single process)
+
+max_read_bytes_per_sec = <value>
+* The maximum amount of data that will be read per second when computing file hashes (shared across the hashing threads and processes)
+* When scan_processes is used, the limit is split equally between the worker processes and the process that scans the files directly within file_path
+* This value can include units (e.g. 20mb for 20 megabytes per second)
+* The amount read and the time spent waiting are included in the log message at the end of each run
+* Defaults to no limit
+
+max_stat_ops_per_sec = <value>
+* The maximum number of metadata operations (directory listings and stat calls) that will be done per second
+* When scan_processes is used, the limit is split equally between the processes (like max_read_bytes_per_sec)
+* The number of operations and the time spent waiting are included in the log message at the end of each run
+* Defaults to no limit
+
+max_scan_duration = <value>
+* If set, a run will stop scanning once this amount of time has passed (after finishing the directory it is on); can include time units (e.g. 15m for 15 minutes)
+* The position of the scan is saved in the input's checkpoint and the next run resumes from there so that each path is still output exactly once per pass over the tree
+* The record for the root directory (with the recursive counts) and the deleted paths (see track_changes) are output once the pass is complete
+* This is not supported with scan_processes (a single process will be used)
+* Defaults to no limit
+
 depth_limit = <value>
 * If set and greater than zero, then only the input will stop after recurising down directories once the limit is reached
+* The walk doesn't descend below the limit so the directories beneath it are not listed
+
+identity_cache_ttl = <value>
+* How long the names of the owners and groups (resolved from the uid and gid) are cached for; can include time units (e.g. 1h for 1 hour)
+* The names are looked up once per id instead of once per file which avoids a round-trip to the name service (e.g. LDAP or SSSD) for each file; ids that cannot be resolved are cached too
+* The cache hit rate is included in the log message at the end of each run
+* Defaults to 10m
+
+output_format = <value>
+* The format of the events: "kv" for space-separated key=value pairs or "json" for a compact JSON object (where the multi-value fields are arrays)
+* JSON events use the sourcetype file_meta_data:json (unless another sourcetype is set) which extracts the fields with KV_MODE = json
+* Defaults to kv
+
+output_batch_size = <value>
+* The maximum number of events that are written to Splunk at a time (as a single stream with one write and flush)
+* Each event is still complete on its own so batching doesn't change how the events are broken
+* The events that are pending are always written at the end of each run
+* Defaults to 1 (each event is written as soon as it is found)
+
+output_batch_ms = <value>
+* The maximum number of milliseconds that events are held for before being written when output_batch_size is greater than 1
+* The events are written once they have been held this long even if no more events are found (e.g. while waiting on a slow directory listing)
+* Defaults to no limit
+
+output_mode = <value>
+* Where the events are sent: "stdout" to have Splunk read them from the input or "hec" to post them to an HTTP Event Collector (see hec_url and hec_token_name)
+* With hec, the events are sent in gzipped batches of output_batch_size events (defaults to 500) over persistent connections and the requests that fail with a connection error or a 429 or 5xx status are retried with an exponential backoff
+* The check-point is not updated if the events could not be sent so that the next run sends them again
+* Defaults to stdout
+
+hec_url = <value>
+* The URL of the HTTP Event Collector endpoint (e.g. https://splunk.example.com:8088/services/collector/event)
+* Required when output_mode is hec
+
+hec_token_name = <value>
+* The name of the secure password (in storage/passwords) that holds the HTTP Event Collector token to send the events with so that the token isn't stored in plain text
+* The token must be stored with the realm file_meta_data_hec and this value as the username, e.g.: curl -k -u admin https://localhost:8089/servicesNS/nobody/file_meta_data/storage/passwords -d realm=file_meta_data_hec -d name=<hec_token_name> -d password=<token>
+* Defaults to the first secure password with the realm file_meta_data_hec
+
+hec_connections = <value>
+* The number of batches that are sent to the HTTP Event Collector concurrently (each over its own connection)
+* Defaults to 1
+
+hec_verify_ssl = <value>
+* If false, the certificate of the HTTP Event Collector is not verified
+* Defaults to true
+
+telemetry = <value>
+* If true, an event with the performance telemetry of each run is output (as JSON with the sourcetype file_meta_data:telemetry) to the same destination as the other events
+* This includes the wall time of the run and of each phase (walk, stat, acl, hash, serialize and output), the files and directories processed per second, the bytes hashed, the counts of the errors and the percentiles of the latency of the stat calls
+* The times of the hash phase are summed across the hashing threads and the times of all of the phases are summed across the processes when scan_processes is used
+* Defaults to false
+
+max_entries = <value>
+* If set, the scan stops once this many files and directories have been listed and a warning event (with the field limit_reached) is output instead of the record for the root directory
+* This guards against a stanza that is pointed at a much larger tree than intended
+* The paths that were not scanned are not reported as deleted (see track_changes)
+* This is not supported with scan_processes (a single process will be used)
+* Defaults to no limit
+
+max_directories = <value>
+* Like max_entries but limits the number of directories that are scanned
+* Defaults to no limit
+
+fields = <value>
+* A comma-separated list of the fields to include in the events (e.g. "size,mtime_epoch,sha256"); path is always included
+* The work needed only for the fields that are left out is skipped: e.g. the owner and group names aren't looked up unless owner or group is included, the files aren't hashed unless a hash algorithm is included, and the times are only formatted for the fields that are included
+* Defaults to all of the fields
 
 file_filter = <value>
-* Limits the files analyzed to those that match this wildcard
+* Limits the files analyzed to those that match one of these comma-separated wildcards (e.g. "*.log,*.conf")
+* A wildcard without a slash is matched against the name of the file; one with a slash is matched against the path of the file relative to file_path the same way as include_dirs
+* Each wildcard in a relative path only matches within one component of it; e.g. "*/cache/*" matches "a/cache/b.txt" but not "a/b/cache/c.txt"
+* A wildcard that starts with a slash (e.g. "/var/log/*.log") is matched against the full path of the file instead (and a wildcard in it can match several components)
+
+exclude_files = <value>
+* A comma-separated list of wildcards of the files to exclude (e.g. "*.tmp,*~"); matched like file_filter
+
+include_dirs = <value>
+* A comma-separated list of wildcards of the directories to walk (e.g. "logs,var/spool/*")
+* A wildcard without a slash is matched against the name of each directory; one with a slash is matched against the path relative to file_path
+* Only the matching directories (and everything within them) are included; the directories above them are walked to reach them but nothing else within them is included
+* Defaults to walking all directories
+
+exclude_dirs = <value>
+* A comma-separated list of wildcards of the directories not to walk (e.g. ".snapshot,node_modules,*/cache")
+* Matched like include_dirs; the excluded directories are pruned from the walk so nothing within them is listed or stat'ed
+* The number of directories skipped is included in the log message at the end of each run
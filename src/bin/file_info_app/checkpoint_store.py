@@ -0,0 +1,313 @@
+import sqlite3
+import threading
+
+
+class CheckpointStore(object):
+    """
+    Stores large amounts of keyed state (such as an entry for every file on a file-system)
+    between runs. The state is kept in a SQLite database in WAL mode so that it doesn't need to be
+    loaded into memory; entries are looked up by their key through the primary-key index and
+    writes are buffered and written in batches.
+
+    The writes (including the start of a new generation) are only committed when commit() is
+    called so that the state of a run isn't persisted until the run's events were output; the
+    batches are written into an open transaction in the meantime so that they don't need to be
+    held in memory. rollback() (or close(commit=False)) discards everything since the last commit.
+
+    Entries are grouped into namespaces (e.g. "hashes" and "manifest"). Each namespace has a
+    generation number that is incremented when a new run starts; entries are stamped with the
+    generation they were last written or touched in so that the entries that were not observed in
+    a run (the stale entries) can be identified without keeping a list of the keys in memory.
+    """
+
+    DEFAULT_BATCH_SIZE = 10000
+
+    DEFAULT_TIMEOUT = 5.0
+
+    def __init__(self, file_path, batch_size=None, timeout=None):
+        """
+        Open (or create) the store.
+
+        Arguments:
+        file_path -- The path of the database file
+        batch_size -- The number of writes to buffer before writing them to the open transaction
+        timeout -- The number of seconds to wait for the database if another connection is writing
+                   to it (defaults to 5); sqlite3.OperationalError is raised once this passes and
+                   the writes are kept pending so that they can be tried again
+        """
+
+        if batch_size is None or batch_size <= 0:
+            batch_size = CheckpointStore.DEFAULT_BATCH_SIZE
+
+        if timeout is None:
+            timeout = CheckpointStore.DEFAULT_TIMEOUT
+
+        self.file_path = file_path
+        self.batch_size = batch_size
+
+        # The pending writes keyed by (namespace, key); a value of None indicates that the entry
+        # only needs to be stamped with the current generation
+        self.pending = {}
+
+        self.generations = {}
+
+        self.lock = threading.RLock()
+
+        # The connection is shared by the hashing threads; access is serialized with the lock
+        self.connection = sqlite3.connect(file_path, timeout=timeout, check_same_thread=False)
+
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS entries ("
+                                    "namespace TEXT NOT NULL, "
+                                    "key TEXT NOT NULL, "
+                                    "value TEXT NOT NULL, "
+                                    "generation INTEGER NOT NULL, "
+                                    "PRIMARY KEY (namespace, key)) WITHOUT ROWID")
+
+            self.connection.execute("CREATE INDEX IF NOT EXISTS entries_generation "
+                                    "ON entries (namespace, generation)")
+
+            self.connection.execute("CREATE TABLE IF NOT EXISTS generations ("
+                                    "namespace TEXT PRIMARY KEY, "
+                                    "generation INTEGER NOT NULL)")
+
+    def close(self, commit=True):
+        """
+        Close the store.
+
+        Arguments:
+        commit -- If true, the pending writes are committed; otherwise, they are discarded (see
+                  rollback())
+        """
+
+        with self.lock:
+            if self.connection is not None:
+                if commit:
+                    self.commit()
+                else:
+                    self.rollback()
+
+                self.connection.close()
+                self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get_generation(self, namespace):
+        """
+        Get the current generation of the namespace.
+
+        Arguments:
+        namespace -- The namespace of the entries
+        """
+
+        with self.lock:
+            if namespace not in self.generations:
+                row = self.connection.execute("SELECT generation FROM generations "
+                                              "WHERE namespace = ?", (namespace,)).fetchone()
+
+                if row is None:
+                    self.generations[namespace] = 0
+                else:
+                    self.generations[namespace] = row[0]
+
+            return self.generations[namespace]
+
+    def start_generation(self, namespace):
+        """
+        Start a new generation for the namespace (this should be done at the start of each run).
+        Entries not written or touched after this are considered stale.
+
+        Arguments:
+        namespace -- The namespace of the entries
+        """
+
+        with self.lock:
+            self.write_pending()
+
+            generation = self.get_generation(namespace) + 1
+
+            self.connection.execute("INSERT OR REPLACE INTO generations (namespace, generation) "
+                                    "VALUES (?, ?)", (namespace, generation))
+
+            self.generations[namespace] = generation
+
+            return generation
+
+    def get(self, namespace, key):
+        """
+        Get the value of the entry (as a string) or None if there is no entry for the key.
+
+        Arguments:
+        namespace -- The namespace of the entry
+        key -- The key of the entry
+        """
+
+        with self.lock:
+            value = self.pending.get((namespace, key))
+
+            if value is not None:
+                return value
+
+            row = self.connection.execute("SELECT value FROM entries WHERE namespace = ? AND key = ?",
+                                          (namespace, key)).fetchone()
+
+            if row is None:
+                return None
+
+            return row[0]
+
+    def put(self, namespace, key, value):
+        """
+        Write the entry (and stamp it with the current generation). The write is buffered until
+        enough writes are accumulated; it isn't persisted until commit() is called.
+
+        Arguments:
+        namespace -- The namespace of the entry
+        key -- The key of the entry
+        value -- The value of the entry (a string)
+        """
+
+        with self.lock:
+            self.pending[(namespace, key)] = value
+
+            if len(self.pending) >= self.batch_size:
+                self.write_pending()
+
+    def touch(self, namespace, key):
+        """
+        Stamp the existing entry with the current generation so that it isn't considered stale.
+
+        Arguments:
+        namespace -- The namespace of the entry
+        key -- The key of the entry
+        """
+
+        with self.lock:
+            if (namespace, key) not in self.pending:
+                self.pending[(namespace, key)] = None
+
+            if len(self.pending) >= self.batch_size:
+                self.write_pending()
+
+    def write_pending(self):
+        """
+        Write the pending entries into the open transaction (without committing it) so that they
+        don't need to be held in memory.
+        """
+
+        with self.lock:
+            if not self.pending:
+                return
+
+            upserts = []
+            touches = []
+
+            for (namespace, key), value in self.pending.items():
+                generation = self.get_generation(namespace)
+
+                if value is None:
+                    touches.append((generation, namespace, key))
+                else:
+                    upserts.append((namespace, key, value, generation))
+
+            self.connection.executemany("INSERT OR REPLACE INTO entries "
+                                        "(namespace, key, value, generation) "
+                                        "VALUES (?, ?, ?, ?)", upserts)
+
+            self.connection.executemany("UPDATE entries SET generation = ? "
+                                        "WHERE namespace = ? AND key = ?", touches)
+
+            self.pending = {}
+
+    def commit(self):
+        """
+        Write the pending entries and commit them (along with the entries written and the
+        generations started since the last commit) to disk in a single transaction.
+        """
+
+        with self.lock:
+            self.write_pending()
+            self.connection.commit()
+
+    def rollback(self):
+        """
+        Discard the pending entries and everything written since the last commit (including the
+        generations that were started) so that the store is left as it was after the last commit.
+        """
+
+        with self.lock:
+            self.pending = {}
+            self.connection.rollback()
+
+            # The generations that were started are no longer current
+            self.generations = {}
+
+    def iter_stale(self, namespace):
+        """
+        Yield the (key, value) of each entry that was not written or touched in the current
+        generation.
+
+        Arguments:
+        namespace -- The namespace of the entries
+        """
+
+        with self.lock:
+            self.write_pending()
+
+            generation = self.get_generation(namespace)
+
+            cursor = self.connection.execute("SELECT key, value FROM entries "
+                                             "WHERE namespace = ? AND generation < ?",
+                                             (namespace, generation))
+
+        # Fetch the rows in pages so that a large number of stale entries isn't loaded at once
+        while True:
+            with self.lock:
+                rows = cursor.fetchmany(1000)
+
+            if not rows:
+                break
+
+            for row in rows:
+                yield row[0], row[1]
+
+    def delete_stale(self, namespace):
+        """
+        Delete the entries that were not written or touched in the current generation. Returns
+        the number of entries deleted.
+
+        Arguments:
+        namespace -- The namespace of the entries
+        """
+
+        with self.lock:
+            self.write_pending()
+
+            generation = self.get_generation(namespace)
+
+            cursor = self.connection.execute("DELETE FROM entries "
+                                             "WHERE namespace = ? AND generation < ?",
+                                             (namespace, generation))
+
+            return cursor.rowcount
+
+    def count(self, namespace):
+        """
+        Get the number of entries in the namespace.
+
+        Arguments:
+        namespace -- The namespace of the entries
+        """
+
+        with self.lock:
+            self.write_pending()
+
+            return self.connection.execute("SELECT COUNT(*) FROM entries WHERE namespace = ?",
+                                           (namespace,)).fetchone()[0]
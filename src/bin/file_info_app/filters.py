@@ -0,0 +1,437 @@
+import fnmatch
+import os
+import re
+
+
+class DirectoryFilter(object):
+    """
+    Determines which directories of a tree ought to be walked based on lists of wildcards of the
+    directories to include and exclude. This is used to prune the walk so that nothing within the
+    directories that are filtered out is listed or stat'ed.
+
+    A pattern without a slash (e.g. "node_modules" or ".snapshot*") is matched against the name
+    of each directory. A pattern with a slash (e.g. "var/log" or "*/cache") is matched against the
+    path of the directory relative to the root of the scan (using forward slashes).
+
+    If include patterns are provided, then only the directories that match them (and the
+    directories within them) are included. The directories above them are still walked in order
+    to reach them but the files within them are not included.
+    """
+
+    # The states of a directory
+    INCLUDED = 'included'
+    ANCESTOR = 'ancestor'
+    EXCLUDED = 'excluded'
+
+    def __init__(self, root, include=None, exclude=None):
+        """
+        Set up the filter.
+
+        Arguments:
+        root -- The root of the scan that the relative paths are computed from
+        include -- A list of the wildcards of the directories to include (all are included if
+                   None or empty)
+        exclude -- A list of the wildcards of the directories to exclude
+        """
+
+        self.root = os.path.normpath(root)
+
+        self.include_names, self.include_paths = self.compile_patterns(include)
+        self.exclude_names, self.exclude_paths = self.compile_patterns(exclude)
+
+        self.has_includes = bool(self.include_names or self.include_paths)
+
+    @classmethod
+    def compile_patterns(cls, patterns):
+        """
+        Compile the wildcards into a list of the regular expressions for the name patterns and a
+        list of the lists of the regular expressions (one per component) for the path patterns.
+
+        Arguments:
+        patterns -- A list of wildcards
+        """
+
+        name_patterns = []
+        path_patterns = []
+
+        for pattern in patterns or []:
+            pattern = pattern.strip().strip('/')
+
+            if len(pattern) == 0:
+                continue
+
+            if '/' in pattern:
+                path_patterns.append([re.compile(fnmatch.translate(component))
+                                      for component in pattern.split('/')])
+            else:
+                name_patterns.append(re.compile(fnmatch.translate(pattern)))
+
+        return name_patterns, path_patterns
+
+    def get_components(self, path):
+        """
+        Get the list of the components of the path relative to the root.
+
+        Arguments:
+        path -- The path of the directory
+        """
+
+        relative_path = os.path.relpath(path, self.root)
+
+        if relative_path == os.curdir:
+            return []
+
+        return relative_path.split(os.sep)
+
+    @classmethod
+    def matches(cls, components, name_patterns, path_patterns):
+        """
+        Determine if the directory with the given relative path components matches one of the
+        patterns.
+        """
+
+        if len(components) == 0:
+            return False
+
+        for pattern in name_patterns:
+            if pattern.match(components[-1]):
+                return True
+
+        for pattern in path_patterns:
+            if len(pattern) == len(components) and \
+               all(regex.match(component) for regex, component in zip(pattern, components)):
+                return True
+
+        return False
+
+    @classmethod
+    def may_contain_match(cls, components, name_patterns, path_patterns):
+        """
+        Determine if a directory within the directory with the given relative path components
+        could match one of the patterns.
+        """
+
+        if name_patterns:
+            return True
+
+        for pattern in path_patterns:
+            if len(pattern) > len(components) and \
+               all(regex.match(component) for regex, component in zip(pattern, components)):
+                return True
+
+        return False
+
+    def get_state(self, path):
+        """
+        Get the state of the given directory: DirectoryFilter.INCLUDED if it is to be included,
+        DirectoryFilter.ANCESTOR if it is only to be walked in order to reach the directories that
+        are included and DirectoryFilter.EXCLUDED if it is not to be walked at all.
+
+        The directories above the given one are assumed to have been checked already (which is
+        the case when the walk is pruned as it goes).
+
+        Arguments:
+        path -- The path of the directory
+        """
+
+        components = self.get_components(path)
+
+        if self.matches(components, self.exclude_names, self.exclude_paths):
+            return DirectoryFilter.EXCLUDED
+
+        if not self.has_includes:
+            return DirectoryFilter.INCLUDED
+
+        # Check if the directory or one of the directories above it was included
+        for index in range(len(components)):
+            if self.matches(components[:index + 1], self.include_names, self.include_paths):
+                return DirectoryFilter.INCLUDED
+
+        if self.may_contain_match(components, self.include_names, self.include_paths):
+            return DirectoryFilter.ANCESTOR
+
+        return DirectoryFilter.EXCLUDED
+
+
+class PatternSet(object):
+    """
+    A set of wildcards that are sorted into classes that can be matched without a regular
+    expression: exact names (a set lookup), extensions such as "*.log" (a set lookup of the text
+    after the last dot) and prefixes ("core.*") or suffixes ("*~") (a string test). The rest are
+    combined into a single regular expression.
+
+    A wildcard without a slash is matched against the name of the file. A wildcard with a slash is
+    matched against the path of the file relative to the root of the scan (using forward slashes)
+    the same way as the patterns of DirectoryFilter: each wildcard only matches within a
+    component of the path (so "*/cache/*" matches "a/cache/b" but not "a/b/cache/c").
+
+    A wildcard that starts with a slash (e.g. "/var/log/*.log") is matched against the full path
+    of the file the way file_filter was matched before the relative paths were supported (so a
+    wildcard can match across components).
+    """
+
+    # The characters that make a wildcard more than a plain string
+    WILDCARD_CHARACTERS = re.compile(r'[*?\[]')
+
+    def __init__(self, patterns):
+        """
+        Sort the wildcards into the classes.
+
+        Arguments:
+        patterns -- A list of wildcards
+        """
+
+        names = set()
+        extensions = set()
+        prefixes = []
+        suffixes = []
+        name_regexes = []
+
+        paths = set()
+        path_regexes = []
+        absolute_regexes = []
+
+        for pattern in patterns or []:
+            pattern = pattern.strip()
+
+            if len(pattern) == 0:
+                continue
+
+            if pattern.startswith('/'):
+                absolute_regexes.append(fnmatch.translate(pattern))
+
+            elif '/' in pattern:
+                pattern = pattern.strip('/')
+
+                if self.is_plain(pattern):
+                    paths.add(pattern)
+                else:
+                    path_regexes.append(self.translate_path(pattern))
+
+            elif self.is_plain(pattern):
+                names.add(pattern)
+
+            elif pattern.startswith('*.') and self.is_plain(pattern[2:]) and \
+                 '.' not in pattern[2:]:
+                extensions.add(pattern[1:])
+
+            elif pattern.endswith('*') and self.is_plain(pattern[:-1]):
+                prefixes.append(pattern[:-1])
+
+            elif pattern.startswith('*') and self.is_plain(pattern[1:]):
+                suffixes.append(pattern[1:])
+
+            else:
+                name_regexes.append(fnmatch.translate(pattern))
+
+        self.names = frozenset(names)
+        self.extensions = frozenset(extensions)
+        self.prefixes = tuple(prefixes)
+        self.suffixes = tuple(suffixes)
+        self.name_regex = self.combine(name_regexes)
+
+        self.paths = frozenset(paths)
+        self.path_regex = self.combine(path_regexes)
+        self.has_paths = bool(paths or path_regexes)
+
+        self.absolute_regex = self.combine(absolute_regexes)
+
+        self.count = len(names) + len(extensions) + len(prefixes) + len(suffixes) + \
+                     len(name_regexes) + len(paths) + len(path_regexes) + len(absolute_regexes)
+
+    def __len__(self):
+        return self.count
+
+    @classmethod
+    def is_plain(cls, pattern):
+        """
+        Determine if the wildcard doesn't include any wildcard characters.
+        """
+
+        return len(pattern) > 0 and cls.WILDCARD_CHARACTERS.search(pattern) is None
+
+    @classmethod
+    def translate_path(cls, pattern):
+        """
+        Translate a wildcard of a path into a regular expression like fnmatch.translate() except
+        that the wildcards don't match a slash (so they only match within a component).
+        """
+
+        regex = []
+        index = 0
+
+        while index < len(pattern):
+            character = pattern[index]
+            index += 1
+
+            if character == '*':
+                regex.append('[^/]*')
+
+            elif character == '?':
+                regex.append('[^/]')
+
+            elif character == '[':
+                # Find the end of the set (a ']' right after the '[' or '[!' is part of the set)
+                end = index
+
+                if end < len(pattern) and pattern[end] == '!':
+                    end += 1
+
+                if end < len(pattern) and pattern[end] == ']':
+                    end += 1
+
+                end = pattern.find(']', end)
+
+                if end < 0:
+                    regex.append('\\[')
+                else:
+                    characters = pattern[index:end].replace('\\', '\\\\')
+                    index = end + 1
+
+                    if characters.startswith('!'):
+                        characters = '^' + characters[1:]
+                    elif characters.startswith('^'):
+                        characters = '\\' + characters
+
+                    regex.append('[%s]' % characters)
+
+            else:
+                regex.append(re.escape(character))
+
+        return ''.join(regex) + '\\Z'
+
+    @classmethod
+    def combine(cls, regexes):
+        """
+        Combine the regular expressions into one that matches if any of them match (or None if
+        there are none).
+        """
+
+        if len(regexes) == 0:
+            return None
+
+        return re.compile('|'.join('(?:%s)' % regex for regex in regexes))
+
+    def matches(self, path, name, full_path=None):
+        """
+        Determine if the file matches any of the wildcards.
+
+        Arguments:
+        path -- The path of the file relative to the root (using forward slashes)
+        name -- The name of the file (the last component of the path)
+        full_path -- The full path of the file (using forward slashes) for the wildcards that
+                     start with a slash
+        """
+
+        if name in self.names:
+            return True
+
+        if self.extensions:
+            index = name.rfind('.')
+
+            if index >= 0 and name[index:] in self.extensions:
+                return True
+
+        if self.prefixes and name.startswith(self.prefixes):
+            return True
+
+        if self.suffixes and name.endswith(self.suffixes):
+            return True
+
+        if self.name_regex is not None and self.name_regex.match(name):
+            return True
+
+        if self.paths or self.path_regex is not None:
+            if path in self.paths:
+                return True
+
+            if self.path_regex is not None and self.path_regex.match(path):
+                return True
+
+        if self.absolute_regex is not None and full_path is not None and \
+           self.absolute_regex.match(full_path):
+            return True
+
+        return False
+
+
+class PathFilter(object):
+    """
+    Determines which files are included based on lists of wildcards of the files to include and
+    exclude (see PatternSet for how the wildcards are matched). A file is included if it matches
+    one of the include wildcards (or there are none) and none of the exclude wildcards.
+
+    This has a match() function like a compiled regular expression so that it can be used
+    wherever a file_filter is accepted.
+    """
+
+    def __init__(self, include=None, exclude=None, root=None):
+        """
+        Set up the filter.
+
+        Arguments:
+        include -- A list of the wildcards of the files to include (all are included if None or
+                   empty)
+        exclude -- A list of the wildcards of the files to exclude
+        root -- The root of the scan that the wildcards with a slash are matched relative to (if
+                None, they are matched against the path as provided without a leading slash)
+        """
+
+        self.include = PatternSet(include)
+        self.exclude = PatternSet(exclude)
+
+        self.has_paths = self.include.has_paths or self.exclude.has_paths
+
+        if root is not None:
+            self.root = os.path.normpath(root)
+            self.root_prefix = root.rstrip(os.sep) + os.sep
+        else:
+            self.root = None
+            self.root_prefix = None
+
+    def get_relative_path(self, path):
+        """
+        Get the path of the file relative to the root (using forward slashes).
+
+        Arguments:
+        path -- The path of the file
+        """
+
+        if self.root_prefix is not None and path.startswith(self.root_prefix):
+            path = path[len(self.root_prefix):]
+        elif self.root is not None:
+            path = os.path.relpath(path, self.root)
+        else:
+            path = path.lstrip(os.sep)
+
+        if os.sep != '/':
+            path = path.replace(os.sep, '/')
+
+        return path
+
+    def match(self, path):
+        """
+        Determine if the file is included.
+
+        Arguments:
+        path -- The path of the file
+        """
+
+        name = path[path.rfind(os.sep) + 1:]
+
+        if os.sep != '/':
+            full_path = path.replace(os.sep, '/')
+        else:
+            full_path = path
+
+        # Only get the relative path if a wildcard needs it
+        if self.has_paths:
+            path = self.get_relative_path(path)
+
+        if len(self.include) > 0 and not self.include.matches(path, name, full_path):
+            return False
+
+        if len(self.exclude) > 0 and self.exclude.matches(path, name, full_path):
+            return False
+
+        return True
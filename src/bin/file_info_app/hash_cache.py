@@ -0,0 +1,100 @@
+import json
+import threading
+
+
+class HashCache(object):
+    """
+    A persistent cache of file hashes. The hashes are re-used as long as the file's identity and
+    stat signature (device, inode, size and modification time) haven't changed so that unchanged
+    files don't need to be read again.
+
+    The entries are kept in a CheckpointStore. Creating the cache starts a new run; the entries
+    for paths that are not looked up during the run are evicted when the cache is saved.
+    """
+
+    NAMESPACE = 'hashes'
+
+    def __init__(self, store, new_run=True):
+        """
+        Set up the cache.
+
+        Arguments:
+        store -- The CheckpointStore that the cache is persisted in
+        new_run -- If false, the previous run is continued (e.g. when resuming a scan that was
+                   stopped early) so the paths it observed are not considered stale
+        """
+
+        self.store = store
+
+        self.hits = 0
+        self.misses = 0
+
+        self.lock = threading.Lock()
+
+        if new_run:
+            self.store.start_generation(HashCache.NAMESPACE)
+
+    @classmethod
+    def get_signature(cls, stat_info):
+        """
+        Get the signature that identifies the version of the file described by the stat result.
+
+        Arguments:
+        stat_info -- The result of os.stat() for the file
+        """
+
+        return [stat_info.st_dev, stat_info.st_ino, stat_info.st_size, stat_info.st_mtime_ns]
+
+    def save(self, evict=True):
+        """
+        Commit the cache to disk.
+
+        Arguments:
+        evict -- If true, the entries for paths that were not looked up during this run will be
+                 removed (this should only be done if the entire tree was scanned)
+        """
+
+        if evict:
+            self.store.delete_stale(HashCache.NAMESPACE)
+
+        self.store.commit()
+
+    def get(self, path, stat_info):
+        """
+        Get the cached hashes for the given file. Returns a dictionary of the hashes (keyed by the
+        algorithm) or None if the file isn't in the cache or has changed.
+
+        Arguments:
+        path -- The path of the file
+        stat_info -- The result of os.stat() for the file
+        """
+
+        value = self.store.get(HashCache.NAMESPACE, path)
+
+        if value is not None:
+            signature, hashes = json.loads(value)
+
+            if signature == self.get_signature(stat_info):
+                self.store.touch(HashCache.NAMESPACE, path)
+
+                with self.lock:
+                    self.hits += 1
+
+                return hashes
+
+        with self.lock:
+            self.misses += 1
+
+        return None
+
+    def set(self, path, stat_info, hashes):
+        """
+        Store the hashes for the given file.
+
+        Arguments:
+        path -- The path of the file
+        stat_info -- The result of os.stat() for the file (as observed before it was hashed)
+        hashes -- A dictionary of the hashes keyed by the algorithm
+        """
+
+        self.store.put(HashCache.NAMESPACE, path, json.dumps([self.get_signature(stat_info), hashes]))
@@ -0,0 +1,212 @@
+import hashlib
+import mmap
+import os
+import threading
+import time
+from io import open
+
+
+class FileHasher(object):
+    """
+    Computes hashes of files by streaming them through a fixed-size buffer so that the memory
+    used doesn't depend on the size of the file.
+
+    The buffer is allocated once per thread and re-used for every file so that a single instance
+    can be shared by a pool of threads.
+    """
+
+    DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+    DEFAULT_ALGORITHMS = ['sha224']
+
+    def __init__(self, chunk_size=None, mmap_threshold=None, cache=None, algorithms=None,
+                 governor=None):
+        """
+        Set up the hasher.
+
+        Arguments:
+        chunk_size -- The number of bytes to read at a time (defaults to 1 MB)
+        mmap_threshold -- If set, files at least this large will be memory-mapped instead of
+                          being read into the buffer
+        cache -- A HashCache to re-use the hashes of files that haven't changed from
+        algorithms -- A list of the names of the hash algorithms to compute (defaults to SHA224);
+                      all of them are computed from a single read of the file
+        governor -- An IOGovernor to limit the rate that files are read at
+        """
+
+        if chunk_size is None or chunk_size <= 0:
+            chunk_size = FileHasher.DEFAULT_CHUNK_SIZE
+
+        if not algorithms:
+            algorithms = FileHasher.DEFAULT_ALGORITHMS
+
+        # Make sure the algorithms are valid now instead of when the first file is hashed
+        for algorithm in algorithms:
+            self.new_hash(algorithm)
+
+        self.algorithms = list(algorithms)
+        self.chunk_size = chunk_size
+        self.mmap_threshold = mmap_threshold
+        self.cache = cache
+        self.governor = governor
+
+        self._local = threading.local()
+
+        # The number of bytes read to compute the hashes and the time it took (summed across the
+        # threads; the cached hashes aren't counted)
+        self.bytes_hashed = 0
+        self.hash_seconds = 0.0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def new_hash(cls, algorithm):
+        """
+        Make a new hash object for the given algorithm. A ValueError will be raised if the
+        algorithm is not supported.
+
+        Arguments:
+        algorithm -- The name of the algorithm (e.g. "sha256")
+        """
+
+        # The SHAKE algorithms are not supported since they need the length of the digest
+        if algorithm.startswith('shake_'):
+            raise ValueError('Variable-length algorithms are not supported: ' + algorithm)
+
+        return hashlib.new(algorithm)
+
+    def get_buffer(self):
+        """
+        Get the buffer for the current thread (allocating it if necessary).
+        """
+
+        buffer = getattr(self._local, 'buffer', None)
+
+        if buffer is None:
+            buffer = memoryview(bytearray(self.chunk_size))
+            self._local.buffer = buffer
+
+        return buffer
+
+    def use_mmap(self, file):
+        """
+        Determine if the given file ought to be memory-mapped.
+
+        Arguments:
+        file -- The open file
+        """
+
+        if self.mmap_threshold is None or self.mmap_threshold <= 0:
+            return False
+
+        file_size = os.fstat(file.fileno()).st_size
+
+        # Empty files cannot be mapped
+        return file_size > 0 and file_size >= self.mmap_threshold
+
+    def update_from_file(self, file_path, hashers):
+        """
+        Read the file and feed its contents to each of the given hash objects. Returns the number
+        of bytes read.
+
+        Arguments:
+        file_path -- The path of the file to hash
+        hashers -- A list of hash objects (such as those from hashlib) to update
+        """
+
+        with open(file_path, 'rb', buffering=0) as file:
+
+            # Memory-map large files so that the contents don't need to be copied into the buffer
+            if self.use_mmap(file):
+                return self._update_from_mmap(file, hashers)
+
+            buffer = self.get_buffer()
+            total_bytes_read = 0
+
+            while True:
+                bytes_read = file.readinto(buffer)
+
+                if not bytes_read:
+                    return total_bytes_read
+
+                total_bytes_read += bytes_read
+
+                if self.governor is not None:
+                    self.governor.consume_read(bytes_read)
+
+                chunk = buffer[:bytes_read]
+
+                for hasher in hashers:
+                    hasher.update(chunk)
+
+    def _update_from_mmap(self, file, hashers):
+        """
+        Feed the contents of the given file to the hash objects using a memory-map. Returns the
+        number of bytes read.
+
+        Arguments:
+        file -- The open file to hash
+        hashers -- A list of hash objects to update
+        """
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+
+            # Let the OS know that we will be reading this sequentially so that it can read ahead
+            # and drop the pages once we are done with them
+            if hasattr(mapped, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+
+            view = memoryview(mapped)
+
+            try:
+                for offset in range(0, len(view), self.chunk_size):
+                    chunk = view[offset:offset + self.chunk_size]
+
+                    if self.governor is not None:
+                        self.governor.consume_read(len(chunk))
+
+                    for hasher in hashers:
+                        hasher.update(chunk)
+
+                    chunk.release()
+
+                return len(view)
+            finally:
+                view.release()
+
+    def hash_file(self, file_path, stat_info=None):
+        """
+        Compute the hashes of the given file and return a dictionary of the hex digests keyed by
+        the algorithm.
+
+        Arguments:
+        file_path -- The path of the file to hash
+        stat_info -- The result of os.stat() for the file; this is necessary for the cache to be
+                     used
+        """
+
+        use_cache = self.cache is not None and stat_info is not None
+
+        # Use the cached hashes if the file hasn't changed
+        if use_cache:
+            hashes = self.cache.get(file_path, stat_info)
+
+            if hashes is not None and all(algorithm in hashes for algorithm in self.algorithms):
+                return dict((algorithm, hashes[algorithm]) for algorithm in self.algorithms)
+
+        start = time.perf_counter()
+
+        hashers = [self.new_hash(algorithm) for algorithm in self.algorithms]
+
+        bytes_read = self.update_from_file(file_path, hashers)
+
+        hashes = dict((algorithm, hasher.hexdigest())
+                      for algorithm, hasher in zip(self.algorithms, hashers))
+
+        with self.lock:
+            self.bytes_hashed += bytes_read
+            self.hash_seconds += time.perf_counter() - start
+
+        if use_cache:
+            self.cache.set(file_path, stat_info, hashes)
+
+        return hashes
@@ -0,0 +1,401 @@
+from concurrent.futures import ThreadPoolExecutor
+import collections
+import gzip
+import http.client
+import json
+import queue
+import ssl
+import threading
+import time
+from urllib.parse import urlparse
+
+from file_info_app.serialization import XMLEventSerializer, JSONEventSerializer, BatchTimer
+
+
+class HECError(Exception):
+    """
+    Indicates that events could not be sent to the HTTP Event Collector.
+    """
+
+    def __init__(self, message, status=None):
+        super(HECError, self).__init__(message)
+        self.status = status
+
+
+class HECEventSerializer(object):
+    """
+    Serializes records into the JSON objects that the HTTP Event Collector accepts (one per line).
+    This has the same serialize_event() function as XMLEventSerializer so that the events can be
+    built in the worker processes the same way.
+    """
+
+    def __init__(self, sourcetype=None, source=None, index=None, host=None, output_format=None):
+        """
+        Set up the serializer.
+
+        Arguments:
+        sourcetype -- The sourcetype
+        source -- The source field value
+        index -- The index to send the event to
+        host -- The host
+        output_format -- The format of the events: "kv" for key=value pairs (the default) or
+                         "json" for a JSON object
+        """
+
+        # Make the part of the payload that is the same for every event
+        self.metadata = collections.OrderedDict()
+
+        for name, value in (('host', host), ('source', source), ('sourcetype', sourcetype),
+                            ('index', index)):
+            if value is not None:
+                self.metadata[name] = value
+
+        if output_format == 'json':
+            self.data_serializer = None
+        else:
+            self.data_serializer = XMLEventSerializer(None, stanza_attribute=False)
+
+    def serialize_event(self, data_dict):
+        """
+        Make the JSON object for the event.
+
+        Arguments:
+        data_dict -- A dictionary containing the fields
+        """
+
+        payload = collections.OrderedDict(self.metadata)
+
+        if self.data_serializer is None:
+            payload['event'] = data_dict
+        else:
+            payload['event'] = self.data_serializer.make_data_string(data_dict)
+
+        return json.dumps(payload, separators=(',', ':'), default=JSONEventSerializer.json_default)
+
+
+class HTTPConnectionPool(object):
+    """
+    A pool of persistent (keep-alive) connections to a single host.
+    """
+
+    def __init__(self, url, size=1, timeout=30, verify_ssl=True):
+        """
+        Set up the pool.
+
+        Arguments:
+        url -- The URL of the endpoint (only the scheme, host and port are used)
+        size -- The maximum number of idle connections to keep
+        timeout -- The timeout of the connections (in seconds)
+        verify_ssl -- If false, the certificate of the server won't be verified
+        """
+
+        parsed_url = urlparse(url)
+
+        if parsed_url.scheme not in ('http', 'https'):
+            raise ValueError("The URL '%s' is not an HTTP or HTTPS URL" % url)
+
+        self.scheme = parsed_url.scheme
+        self.host = parsed_url.hostname
+        self.port = parsed_url.port
+        self.timeout = timeout
+
+        if self.scheme == 'https' and not verify_ssl:
+            self.ssl_context = ssl._create_unverified_context()
+        else:
+            self.ssl_context = None
+
+        self.connections = queue.LifoQueue(maxsize=size)
+
+        # The number of connections that were opened (for checking that they are re-used)
+        self.opened = 0
+
+    def make_connection(self):
+        """
+        Open a new connection.
+        """
+
+        self.opened += 1
+
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout,
+                                               context=self.ssl_context)
+        else:
+            return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def get(self):
+        """
+        Get an idle connection (or a new one if none are idle).
+        """
+
+        try:
+            return self.connections.get_nowait()
+        except queue.Empty:
+            return self.make_connection()
+
+    def put(self, connection):
+        """
+        Return the connection to the pool so that it can be re-used.
+
+        Arguments:
+        connection -- The connection from get()
+        """
+
+        try:
+            self.connections.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def close(self):
+        """
+        Close the idle connections.
+        """
+
+        while True:
+            try:
+                self.connections.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class HECEventSink(object):
+    """
+    Sends the events to a Splunk HTTP Event Collector endpoint in batches. Each batch is posted as
+    a (gzipped) request over a connection from a pool of persistent connections; the requests
+    that fail with a connection error or a status that indicates that the server is busy are
+    retried with an exponential backoff.
+
+    This has the same add() and flush() functions as EventBatcher so that it can be used in its
+    place.
+    """
+
+    DEFAULT_BATCH_SIZE = 500
+    DEFAULT_BATCH_BYTES = 1024 * 1024
+
+    # The statuses that indicate that the request can be retried
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, url, token, batch_size=None, batch_ms=None, batch_bytes=None,
+                 connections=1, compress=True, max_retries=3, backoff=1.0, timeout=30,
+                 verify_ssl=True):
+        """
+        Set up the sink.
+
+        Arguments:
+        url -- The URL of the endpoint (e.g. https://splunk:8088/services/collector/event)
+        token -- The HEC token
+        batch_size -- The maximum number of events to send in a request
+        batch_ms -- The maximum number of milliseconds an event is held before its batch is sent;
+                    the batch is sent by a timer if no more events are added in time
+        batch_bytes -- The maximum size of a request before compression
+        connections -- The number of requests that can be sent concurrently
+        compress -- If true, the requests will be gzipped
+        max_retries -- The number of times to retry a request
+        backoff -- The number of seconds to wait before the first retry (this doubles with each
+                   retry)
+        timeout -- The timeout of the requests (in seconds)
+        verify_ssl -- If false, the certificate of the server won't be verified
+        """
+
+        if batch_size is None or batch_size < 1:
+            batch_size = HECEventSink.DEFAULT_BATCH_SIZE
+
+        if batch_bytes is None or batch_bytes < 1:
+            batch_bytes = HECEventSink.DEFAULT_BATCH_BYTES
+
+        if connections is None or connections < 1:
+            connections = 1
+
+        self.path = urlparse(url).path or '/services/collector/event'
+        self.token = token
+        self.batch_size = batch_size
+        self.batch_ms = batch_ms
+        self.batch_bytes = batch_bytes
+        self.compress = compress
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self.pool = HTTPConnectionPool(url, connections, timeout, verify_ssl)
+
+        # Send the batches on a pool of threads if more than one connection is allowed
+        if connections > 1:
+            self.executor = ThreadPoolExecutor(max_workers=connections)
+        else:
+            self.executor = None
+
+        self.max_pending = connections * 2
+        self.pending = collections.deque()
+
+        self.events = []
+        self.events_size = 0
+        self.batch_started = None
+
+        # Statistics on the requests
+        self.stats = collections.Counter()
+        self.lock = threading.Lock()
+
+        # The timer sends the batch from another thread so the events and the requests that are
+        # in flight are accessed with the batch lock
+        self.batch_lock = threading.RLock()
+
+        if batch_ms:
+            self.timer = BatchTimer(self.send_batch, batch_ms, self.batch_lock)
+        else:
+            self.timer = None
+
+    def add(self, event):
+        """
+        Add the event, sending the batch if it is full (or has been held too long).
+
+        Arguments:
+        event -- The serialized event (see HECEventSerializer.serialize_event())
+        """
+
+        with self.batch_lock:
+            if self.timer is not None:
+                self.timer.raise_error()
+
+            if len(self.events) == 0 and self.batch_ms:
+                self.batch_started = time.time()
+
+                if self.timer is not None:
+                    self.timer.start()
+
+            self.events.append(event)
+            self.events_size += len(event) + 1
+
+            if len(self.events) >= self.batch_size or self.events_size >= self.batch_bytes:
+                self.send_batch()
+
+            elif self.batch_ms and (time.time() - self.batch_started) * 1000 >= self.batch_ms:
+                self.send_batch()
+
+    def send_batch(self):
+        """
+        Send the events that are pending (in the background if there are several connections).
+        """
+
+        with self.batch_lock:
+            if self.timer is not None:
+                self.timer.cancel()
+
+            if len(self.events) == 0:
+                return
+
+            events = self.events
+            self.events = []
+            self.events_size = 0
+
+            body = '\n'.join(events).encode('utf-8')
+
+            if self.executor is None:
+                self.post(body, len(events))
+                return
+
+            # Wait for the oldest request if too many are in flight
+            while len(self.pending) >= self.max_pending:
+                self.pending.popleft().result()
+
+            self.pending.append(self.executor.submit(self.post, body, len(events)))
+
+    def post(self, body, event_count):
+        """
+        Post the batch, retrying if the request fails with an error that may be temporary. A
+        HECError is raised if the batch could not be sent.
+
+        Arguments:
+        body -- The events of the batch (one per line)
+        event_count -- The number of events in the batch
+        """
+
+        headers = {
+            'Authorization': 'Splunk %s' % self.token,
+            'Content-Type': 'application/json'
+        }
+
+        if self.compress:
+            body = gzip.compress(body, compresslevel=6)
+            headers['Content-Encoding'] = 'gzip'
+
+        attempt = 0
+
+        while True:
+            connection = self.pool.get()
+
+            try:
+                connection.request('POST', self.path, body, headers)
+                response = connection.getresponse()
+                response_body = response.read()
+
+            except (OSError, http.client.HTTPException) as exception:
+                connection.close()
+                error = HECError('Unable to send the events, reason="%s"' % str(exception))
+
+            else:
+                self.pool.put(connection)
+
+                if response.status == 200:
+                    with self.lock:
+                        self.stats['events_sent'] += event_count
+                        self.stats['batches_sent'] += 1
+                        self.stats['bytes_sent'] += len(body)
+
+                    return
+
+                error = HECError('The events were rejected, status=%i, response="%s"' %
+                                 (response.status, response_body.decode('utf-8', 'replace')),
+                                 response.status)
+
+                if response.status not in HECEventSink.RETRY_STATUSES:
+                    raise error
+
+            if attempt >= self.max_retries:
+                raise error
+
+            time.sleep(self.backoff * (2 ** attempt))
+            attempt += 1
+
+            with self.lock:
+                self.stats['retries'] += 1
+
+    def flush(self):
+        """
+        Send the events that are pending and wait for the requests to complete. A HECError is
+        raised if any of the batches could not be sent.
+        """
+
+        with self.batch_lock:
+            if self.timer is not None:
+                self.timer.raise_error()
+
+            self.send_batch()
+
+            while self.pending:
+                self.pending.popleft().result()
+
+    def close(self):
+        """
+        Send the events that are pending and close the connections.
+        """
+
+        try:
+            self.flush()
+        finally:
+            if self.timer is not None:
+                self.timer.close()
+
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+
+            self.pool.close()
+
+    def get_stats(self):
+        """
+        Get the statistics on the requests.
+        """
+
+        stats = collections.OrderedDict()
+
+        for name in ('events_sent', 'batches_sent', 'bytes_sent', 'retries'):
+            stats['hec_' + name] = self.stats[name]
+
+        return stats
@@ -0,0 +1,212 @@
+import collections
+import threading
+import time
+
+try:
+    import pwd
+except ImportError:
+    pwd = None
+
+# grp isn't available on some Python builds (such as older versions of Splunk's) so the group file
+# is parsed directly when it is missing
+try:
+    import grp
+except ImportError:
+    grp = None
+
+
+class IdentityCache(object):
+    """
+    Caches the names of the users and groups keyed by the uid and gid so that the name service
+    (which may be backed by LDAP or SSSD) isn't queried for every file. The ids that cannot be
+    resolved are cached too so that they are not looked up over and over.
+
+    Entries expire after the TTL so that changes to the users and groups are eventually noticed
+    when the cache is kept across runs.
+    """
+
+    DEFAULT_TTL = 600
+
+    GROUP_FILE = '/etc/group'
+
+    def __init__(self, ttl=None, group_file=None):
+        """
+        Set up the cache.
+
+        Arguments:
+        ttl -- The number of seconds that the names are cached for (defaults to 10 minutes)
+        group_file -- The file in the format of /etc/group to read the group names from if the
+                      grp module isn't available
+        """
+
+        if ttl is None:
+            ttl = IdentityCache.DEFAULT_TTL
+
+        if group_file is None:
+            group_file = IdentityCache.GROUP_FILE
+
+        self.ttl = ttl
+        self.group_file = group_file
+
+        # The cached names keyed by the id; each is a tuple of the name (None if it couldn't be
+        # resolved) and the time it expires
+        self.users = {}
+        self.groups = {}
+
+        self.hits = 0
+        self.misses = 0
+
+        self.lock = threading.Lock()
+
+    @classmethod
+    def lookup_user(cls, uid):
+        """
+        Get the name of the user with the given uid from the name service (None if it is
+        unknown).
+
+        Arguments:
+        uid -- The id of the user
+        """
+
+        if pwd is None:
+            return None
+
+        try:
+            return pwd.getpwuid(uid).pw_name
+        except KeyError:
+            return None
+
+    def lookup_group(self, gid):
+        """
+        Get the name of the group with the given gid (None if it is unknown). The group file is
+        read if the grp module isn't available; all of the groups in it are added to the cache so
+        that the file doesn't need to be read again for the other groups.
+
+        Arguments:
+        gid -- The id of the group
+        """
+
+        if grp is not None:
+            try:
+                return grp.getgrgid(gid).gr_name
+            except KeyError:
+                return None
+
+        groups = self.read_group_file(self.group_file)
+        expires = time.time() + self.ttl
+
+        with self.lock:
+            for other_gid, name in groups.items():
+                self.groups[other_gid] = (name, expires)
+
+        return groups.get(gid, None)
+
+    @classmethod
+    def read_group_file(cls, group_file):
+        """
+        Read the group names keyed by the gid from a file in the format of /etc/group (an empty
+        dictionary is returned if the file cannot be read).
+
+        Arguments:
+        group_file -- The path of the file
+        """
+
+        groups = {}
+
+        try:
+            with open(group_file, 'r') as file:
+                for line in file:
+                    fields = line.strip().split(':')
+
+                    if len(fields) < 3 or line.startswith('#'):
+                        continue
+
+                    try:
+                        groups.setdefault(int(fields[2]), fields[0])
+                    except ValueError:
+                        continue
+        except (IOError, OSError):
+            pass
+
+        return groups
+
+    def get(self, cache, key, lookup):
+        """
+        Get the name from the cache, looking it up if it isn't cached or has expired.
+        """
+
+        now = time.time()
+
+        with self.lock:
+            entry = cache.get(key, None)
+
+            if entry is not None and entry[1] > now:
+                self.hits += 1
+                return entry[0]
+
+            self.misses += 1
+
+        name = lookup(key)
+
+        with self.lock:
+            cache[key] = (name, now + self.ttl)
+
+        return name
+
+    def get_user_name(self, uid):
+        """
+        Get the name of the user with the given uid (None if it is unknown).
+
+        Arguments:
+        uid -- The id of the user
+        """
+
+        return self.get(self.users, uid, self.lookup_user)
+
+    def get_group_name(self, gid):
+        """
+        Get the name of the group with the given gid (None if it is unknown).
+
+        Arguments:
+        gid -- The id of the group
+        """
+
+        return self.get(self.groups, gid, self.lookup_group)
+
+    def reset_stats(self):
+        """
+        Reset the statistics (e.g. at the start of each run when the cache is kept across runs).
+        """
+
+        with self.lock:
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self):
+        """
+        Get the statistics on the use of the cache.
+        """
+
+        stats = collections.OrderedDict()
+
+        stats['identity_cache_hits'] = self.hits
+        stats['identity_cache_misses'] = self.misses
+
+        if self.hits + self.misses > 0:
+            stats['identity_cache_hit_rate'] = round(100.0 * self.hits /
+                                                     (self.hits + self.misses), 1)
+
+        return stats
+
+    def add_stats(self, stats):
+        """
+        Include the statistics from another cache (such as one in a worker process) in this
+        cache's statistics.
+
+        Arguments:
+        stats -- The statistics from get_stats()
+        """
+
+        with self.lock:
+            self.hits += stats.get('identity_cache_hits', 0)
+            self.misses += stats.get('identity_cache_misses', 0)
@@ -0,0 +1,107 @@
+import json
+import stat
+
+
+class FileManifest(object):
+    """
+    Keeps track of the stat signature of each path between runs so that the paths that were
+    created, modified or deleted since the last run can be identified.
+
+    The access time is not included in the signature since reading a file would otherwise cause
+    it to be considered modified.
+
+    The entries are kept in a CheckpointStore. Creating the manifest starts a new run; the paths
+    that are not checked during the run are considered deleted.
+    """
+
+    NAMESPACE = 'manifest'
+
+    CREATED = 'created'
+    MODIFIED = 'modified'
+    DELETED = 'deleted'
+
+    def __init__(self, store, new_run=True):
+        """
+        Set up the manifest.
+
+        Arguments:
+        store -- The CheckpointStore that the manifest is persisted in
+        new_run -- If false, the previous run is continued (e.g. when resuming a scan that was
+                   stopped early) so the paths it observed are not considered stale
+        """
+
+        self.store = store
+
+        if new_run:
+            self.store.start_generation(FileManifest.NAMESPACE)
+
+    @classmethod
+    def get_signature(cls, stat_info):
+        """
+        Get the signature describing the state of the file from the stat result.
+
+        Arguments:
+        stat_info -- The result of os.stat() for the file
+        """
+
+        return [stat_info.st_dev, stat_info.st_ino, stat_info.st_size, stat_info.st_mtime_ns,
+                stat_info.st_ctime_ns, stat_info.st_mode, stat_info.st_uid, stat_info.st_gid]
+
+    @classmethod
+    def is_directory(cls, signature):
+        """
+        Determine if the given signature is for a directory.
+
+        Arguments:
+        signature -- A signature from get_signature()
+        """
+
+        return stat.S_ISDIR(signature[5])
+
+    def save(self, remove_deleted=True):
+        """
+        Commit the manifest to disk.
+
+        Arguments:
+        remove_deleted -- If true, the paths that were not checked during this run will be removed
+                          (this should only be done if the entire tree was scanned)
+        """
+
+        if remove_deleted:
+            self.store.delete_stale(FileManifest.NAMESPACE)
+
+        self.store.commit()
+
+    def check(self, path, stat_info):
+        """
+        Record the current state of the path and determine what changed. This returns
+        FileManifest.CREATED or FileManifest.MODIFIED if the path is new or changed and None if
+        it is unchanged.
+
+        Arguments:
+        path -- The path of the file
+        stat_info -- The result of os.stat() for the file
+        """
+
+        signature = json.dumps(self.get_signature(stat_info))
+        previous_signature = self.store.get(FileManifest.NAMESPACE, path)
+
+        if previous_signature == signature:
+            self.store.touch(FileManifest.NAMESPACE, path)
+            return None
+
+        self.store.put(FileManifest.NAMESPACE, path, signature)
+
+        if previous_signature is None:
+            return FileManifest.CREATED
+        else:
+            return FileManifest.MODIFIED
+
+    def get_deleted(self):
+        """
+        Yield the path and signature of each of the paths that were in the manifest but that
+        haven't been checked during this run.
+        """
+
+        for path, signature in self.store.iter_stale(FileManifest.NAMESPACE):
+            yield path, json.loads(signature)
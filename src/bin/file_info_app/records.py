@@ -0,0 +1,362 @@
+import collections
+from collections.abc import MutableMapping
+import os
+import time
+
+# The attributes of the stat results (these differ by platform) in the order they are output
+STAT_FIELDS = tuple(name for name in dir(os.stat_result) if name.startswith('st_'))
+
+# The float times that can be derived from the nanosecond times so that they needn't be stored
+DERIVED_STAT_FIELDS = frozenset(name for name in STAT_FIELDS if name + '_ns' in STAT_FIELDS)
+
+# The attributes whose values are stored in the records
+STORED_STAT_FIELDS = tuple(name for name in STAT_FIELDS if name not in DERIVED_STAT_FIELDS)
+
+# The attributes that are times (these are output both formatted and as is)
+TIME_STAT_FIELDS = tuple(name for name in STAT_FIELDS if 'time' in name)
+
+# The fields that require the names of the owner and group to be looked up
+IDENTITY_FIELDS = frozenset(['owner', 'group'])
+
+# The fields of the Unix ACL information
+NIX_ACL_FIELDS = IDENTITY_FIELDS | frozenset(['owner_uid', 'group_uid', 'permission_mask'])
+
+# The fields of the Windows ACL information (in addition to the fields of each ACE)
+WINDOWS_ACL_FIELDS = frozenset(['owner', 'owner_sid', 'group', 'group_sid'])
+
+
+class FileRecord(MutableMapping):
+    """
+    The record of a file or directory. This stores the raw values from the stat call in a tuple
+    and formats the fields (such as the times) when the record is iterated (i.e. when it is
+    serialized) instead of holding a dictionary of the formatted fields for each file, which uses
+    several times more memory. The strings that are repeated across records (the directory
+    containing the file and the names of the owner and group) are shared.
+
+    This behaves like the dictionary of the fields (in the same order). Fields that are not part
+    of the record (such as the time) can be added; changing or removing the fields derived from
+    the stat results converts the record into a dictionary.
+
+    If the fields to include are set, the other fields are left out (without being formatted);
+    the path, the action and the fields that were added are always included.
+    """
+
+    __slots__ = ('is_directory', 'file_count', 'directory_count', 'directory', 'name', 'action',
+                 'hashes', 'stat_values', 'owner', 'group', 'acl', 'extra', 'fields')
+
+    # The directories that were seen recently; the walk produces the records directory by
+    # directory so consecutive records share the same string for the directory
+    interned = {}
+
+    MAX_INTERNED = 1024
+
+    def __init__(self, path, stat_info, is_directory, fields=None):
+        """
+        Set up the record.
+
+        Arguments:
+        path -- The absolute path of the file
+        stat_info -- The result of os.stat() for the file
+        is_directory -- Whether the path is a directory
+        fields -- A set of the names of the fields to include (all of them are included if None)
+        """
+
+        directory, self.name = os.path.split(path)
+
+        self.directory = self.intern(directory)
+        self.is_directory = 1 if is_directory else 0
+        self.stat_values = tuple(getattr(stat_info, name) for name in STORED_STAT_FIELDS)
+
+        self.file_count = None
+        self.directory_count = None
+        self.action = None
+        self.hashes = None
+        self.owner = None
+        self.group = None
+        self.acl = None
+        self.extra = None
+        self.fields = fields
+
+    @classmethod
+    def is_any_field_requested(cls, fields, names):
+        """
+        Determine if any of the fields would be included given the fields that were requested.
+
+        Arguments:
+        fields -- A set of the names of the fields to include (all of them are included if None)
+        names -- The names of the fields to check for
+        """
+
+        return fields is None or not fields.isdisjoint(names)
+
+    @classmethod
+    def is_windows_acl_requested(cls, fields):
+        """
+        Determine if any of the fields of the Windows ACL information would be included.
+
+        Arguments:
+        fields -- A set of the names of the fields to include (all of them are included if None)
+        """
+
+        if cls.is_any_field_requested(fields, WINDOWS_ACL_FIELDS):
+            return True
+
+        return any(name.startswith('ace_') for name in fields)
+
+    @classmethod
+    def intern(cls, value):
+        """
+        Get the shared copy of the string (the cache is cleared once it is full).
+
+        Arguments:
+        value -- The string to share
+        """
+
+        interned = cls.interned.get(value, None)
+
+        if interned is not None:
+            return interned
+
+        if len(cls.interned) >= cls.MAX_INTERNED:
+            cls.interned.clear()
+
+        cls.interned[value] = value
+
+        return value
+
+    @classmethod
+    def format_time(cls, value):
+        """
+        Format the time the way that time.ctime() does (values that cannot be formatted, such as
+        the times in nanoseconds, are returned as is).
+
+        Arguments:
+        value -- The time in seconds since the epoch
+        """
+
+        try:
+            return time.ctime(value)
+        except Exception:
+            return value
+
+    def set_identity(self, owner, group):
+        """
+        Set the names of the owner and group (the Unix ACL fields are only included once this is
+        called).
+
+        Arguments:
+        owner -- The name of the owner (or the uid if it cannot be resolved); this may be empty
+                 if none of the fields that include the names were requested
+        group -- The name of the group (None if it cannot be resolved)
+        """
+
+        self.owner = self.intern(owner)
+        self.group = group
+
+    def get_stat_value(self, name):
+        """
+        Get the raw value of the attribute of the stat results.
+
+        Arguments:
+        name -- The name of the attribute (e.g. "st_mtime")
+        """
+
+        if name in DERIVED_STAT_FIELDS:
+
+            # This is computed the same way as os.stat() does
+            seconds, nanoseconds = divmod(self.get_stat_value(name + '_ns'), 1000000000)
+
+            return seconds + nanoseconds * 1e-9
+
+        return self.stat_values[STORED_STAT_FIELDS.index(name)]
+
+    def get_path(self):
+        """
+        Get the absolute path of the file.
+        """
+
+        return os.path.join(self.directory, self.name)
+
+    def iter_fields(self, include_values=True):
+        """
+        Yield the fields of the record in order (as tuples of the name and value unless
+        include_values is false in which case only the names are yielded).
+
+        Arguments:
+        include_values -- If false, only the names are yielded (the values aren't formatted)
+        """
+
+        # Only the extra fields remain once the record was converted into a dictionary
+        if self.stat_values is None:
+            if include_values:
+                for item in self.extra.items():
+                    yield item
+            else:
+                for name in self.extra:
+                    yield name
+
+            return
+
+        fields = self.fields
+        items = []
+
+        items.append(('is_directory', self.is_directory))
+
+        if self.file_count is not None:
+            items.append(('file_count', self.file_count))
+            items.append(('directory_count', self.directory_count))
+
+        items.append(('path', self.get_path() if include_values else None))
+
+        if self.action is not None:
+            items.append(('action', self.action))
+
+        if self.hashes is not None:
+            items.extend(self.hashes.items())
+
+        for item in items:
+            if fields is None or item[0] in fields or item[0] in ('path', 'action'):
+                yield item if include_values else item[0]
+
+        # Format the attributes of the stat results (only those that are to be included)
+        stat_values = iter(self.stat_values)
+
+        for attribute in STAT_FIELDS:
+            if attribute in DERIVED_STAT_FIELDS:
+                value = None
+            else:
+                value = next(stat_values)
+
+            name = attribute[3:]
+
+            if 'time' in attribute:
+                include_formatted = fields is None or name in fields
+                include_raw = fields is None or name + '_epoch' in fields
+
+                if include_values and (include_formatted or include_raw) and value is None:
+                    value = self.get_stat_value(attribute)
+
+                if include_formatted:
+                    yield (name, self.format_time(value)) if include_values else name
+
+                if include_raw:
+                    yield (name + '_epoch', value) if include_values else name + '_epoch'
+
+            elif fields is None or name in fields:
+                yield (name, value) if include_values else name
+
+        items = []
+
+        # Include the Windows ACL information
+        if self.acl is not None:
+            items.extend(self.acl.items())
+
+        # Include the Unix ACL information
+        if self.owner is not None:
+            if include_values:
+                items.append(('owner_uid', self.get_stat_value('st_uid')))
+            else:
+                items.append(('owner_uid', None))
+
+            items.append(('owner', self.owner))
+
+            if include_values:
+                items.append(('group_uid', self.get_stat_value('st_gid')))
+            else:
+                items.append(('group_uid', None))
+
+            if self.group is not None:
+                items.append(('group', self.group))
+
+            if include_values:
+                items.append(('permission_mask', oct(self.get_stat_value('st_mode') & 0o777)))
+            else:
+                items.append(('permission_mask', None))
+
+        for item in items:
+            if fields is None or item[0] in fields:
+                yield item if include_values else item[0]
+
+        if self.extra is not None:
+            for item in self.extra.items():
+                yield item if include_values else item[0]
+
+    def materialize(self):
+        """
+        Convert the record into a dictionary of its fields (so that the fields derived from the
+        stat results can be changed).
+        """
+
+        if self.stat_values is not None:
+            self.extra = collections.OrderedDict(self.iter_fields())
+            self.stat_values = None
+            self.hashes = None
+            self.acl = None
+
+    def items(self):
+        return list(self.iter_fields())
+
+    def values(self):
+        return [value for _, value in self.iter_fields()]
+
+    def __iter__(self):
+        return self.iter_fields(include_values=False)
+
+    def __contains__(self, key):
+
+        if self.extra is not None and key in self.extra:
+            return True
+
+        return key in self.iter_fields(include_values=False)
+
+    def __len__(self):
+        return sum(1 for _ in self.iter_fields(include_values=False))
+
+    def __getitem__(self, key):
+
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+
+        if self.hashes is not None and key in self.hashes:
+            return self.hashes[key]
+
+        if key == 'path' and self.stat_values is not None:
+            return self.get_path()
+
+        for name, value in self.iter_fields():
+            if name == key:
+                return value
+
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+
+        if self.hashes is not None and key in self.hashes:
+            self.hashes[key] = value
+            return
+
+        if (self.extra is None or key not in self.extra) and key in self.iter_fields(False):
+            self.materialize()
+
+        if self.extra is None:
+            self.extra = collections.OrderedDict()
+
+        self.extra[key] = value
+
+    def __delitem__(self, key):
+
+        if self.hashes is not None and key in self.hashes:
+            del self.hashes[key]
+
+        elif self.extra is not None and key in self.extra:
+            del self.extra[key]
+
+        elif key in self.iter_fields(False):
+            self.materialize()
+            del self.extra[key]
+
+        else:
+            raise KeyError(key)
+
+    def __repr__(self):
+        return 'FileRecord(%r)' % (self.items(),)
@@ -0,0 +1,408 @@
+import collections
+from collections.abc import Mapping
+import json
+import threading
+import time
+
+
+class XMLEventSerializer(object):
+    """
+    Serializes records into the <stream><event> XML that Splunk reads from modular inputs. This
+    produces the same output as ModularInput.create_event_string() but builds the string directly
+    instead of building (and then serializing) a DOM for each event; the parts of the event that
+    are the same for every record are only escaped once.
+    """
+
+    def __init__(self, stanza, sourcetype=None, source=None, index=None, host=None,
+                 unbroken=False, close=False, stanza_attribute=True,
+                 encapsulate_value_in_double_quotes=False):
+        """
+        Set up the serializer.
+
+        Arguments:
+        stanza -- The stanza used for the input
+        sourcetype -- The sourcetype
+        source -- The source field value
+        index -- The index to send the event to
+        host -- The host
+        unbroken -- If true, the events will be marked as unbroken
+        close -- If true, the events will include the done element
+        stanza_attribute -- If true, the stanza will be included as an attribute of the event
+                            (this is the case when the input is in streaming mode)
+        encapsulate_value_in_double_quotes -- If true, the values will have double-quotes added
+                                              around them
+        """
+
+        self.encapsulate_value_in_double_quotes = encapsulate_value_in_double_quotes
+
+        # Make the parts of the event that come before and after the data
+        prefix = '<event'
+
+        if unbroken:
+            prefix += ' unbroken="1"'
+
+        if stanza_attribute:
+            prefix += ' stanza="%s"' % self.escape_xml(stanza)
+
+        self.prefix = prefix + '><data>'
+
+        suffix = '</data>'
+
+        for name, value in (('index', index), ('sourcetype', sourcetype), ('source', source),
+                            ('host', host)):
+            if value is not None:
+                suffix += '<%s>%s</%s>' % (name, self.escape_xml(str(value)), name)
+
+        if close:
+            suffix += '<done/>'
+
+        self.suffix = suffix + '</event>'
+
+    @classmethod
+    def escape_xml(cls, text):
+        """
+        Escape the text for including in an element or attribute the way that minidom does.
+
+        Arguments:
+        text -- The text to escape
+        """
+
+        if '&' in text:
+            text = text.replace('&', '&amp;')
+
+        if '<' in text:
+            text = text.replace('<', '&lt;')
+
+        if '"' in text:
+            text = text.replace('"', '&quot;')
+
+        if '>' in text:
+            text = text.replace('>', '&gt;')
+
+        return text
+
+    @classmethod
+    def escape_value(cls, value, encapsulate_in_double_quotes=False):
+        """
+        Escape the field name or value the way that ModularInput.escape_spaces() does: the quotes
+        are escaped and the value is quoted if it includes a space or is empty.
+
+        Arguments:
+        value -- The value to escape
+        encapsulate_in_double_quotes -- If true, the value will have double-quotes added around it
+        """
+
+        if value is None:
+            return 'None'
+
+        value = str(value)
+
+        if '"' in value:
+            value = value.replace('"', '\\"')
+
+        if "'" in value:
+            value = value.replace("'", "\\'")
+
+        if encapsulate_in_double_quotes or ' ' in value or value == '':
+            return '"' + value + '"'
+
+        return value
+
+    def make_data_string(self, data_dict):
+        """
+        Make the content of the event from the record (as key=value pairs where the values of lists
+        are included as separate pairs).
+
+        Arguments:
+        data_dict -- A dictionary containing the fields
+        """
+
+        escape_value = self.escape_value
+        encapsulate = self.encapsulate_value_in_double_quotes
+        parts = []
+
+        for key, value in data_dict.items():
+            key_escaped = escape_value(key)
+
+            if isinstance(value, list):
+                for item in value:
+                    parts.append(key_escaped + '=' + escape_value(item, encapsulate))
+            else:
+                parts.append(key_escaped + '=' + escape_value(value, encapsulate))
+
+        return ' '.join(parts)
+
+    def serialize_event(self, data_dict):
+        """
+        Make the event element without the stream element around it (see EventBatcher).
+
+        Arguments:
+        data_dict -- A dictionary containing the fields
+        """
+
+        return self.prefix + self.escape_xml(self.make_data_string(data_dict)) + self.suffix
+
+    def serialize(self, data_dict):
+        """
+        Make the string representing the event.
+
+        Arguments:
+        data_dict -- A dictionary containing the fields
+        """
+
+        return '<stream>' + self.serialize_event(data_dict) + '</stream>'
+
+
+class JSONEventSerializer(XMLEventSerializer):
+    """
+    Serializes records like XMLEventSerializer but with the content of each event as a compact
+    JSON object (where the lists are arrays) instead of key=value pairs. Splunk can then extract
+    the fields with KV_MODE = json instead of regular expressions.
+    """
+
+    def make_data_string(self, data_dict):
+        """
+        Make the content of the event from the record as a JSON object.
+
+        Arguments:
+        data_dict -- A dictionary containing the fields
+        """
+
+        return json.dumps(data_dict, separators=(',', ':'), default=self.json_default)
+
+    @classmethod
+    def json_default(cls, value):
+        """
+        Convert the values that the json module cannot serialize: records that aren't
+        dictionaries (such as a FileRecord) are converted into one and anything else into a
+        string.
+
+        Arguments:
+        value -- The value to convert
+        """
+
+        if isinstance(value, Mapping):
+            return collections.OrderedDict(value.items())
+
+        return str(value)
+
+
+class BatchTimer(object):
+    """
+    Calls a function once a batch of events has been held for the given number of milliseconds so
+    that the batch is output on time even if no more events are added (e.g. while the scan is
+    throttled or waiting on a slow directory listing or a large hash).
+
+    The function is called from a single thread that is started with the first batch and waits
+    for the deadline of each batch in turn (rather than a thread for each batch); close() stops
+    it.
+
+    An exception raised by the function is kept so that it can be raised in the thread that adds
+    the events (see raise_error()).
+    """
+
+    def __init__(self, function, batch_ms, lock=None):
+        """
+        Set up the timer.
+
+        Arguments:
+        function -- The function that outputs the batch
+        batch_ms -- The number of milliseconds after which the function is called
+        lock -- The lock to call the function with (so that an exception it raises is kept before
+                the lock is released and thus cannot be missed by raise_error())
+        """
+
+        self.function = function
+        self.batch_ms = batch_ms
+
+        if lock is None:
+            lock = threading.RLock()
+
+        self.lock = lock
+
+        # The deadline of the current batch (if any) is guarded by the condition
+        self.condition = threading.Condition()
+        self.deadline = None
+        self.closed = False
+
+        self.thread = None
+        self.error = None
+
+    def start(self):
+        """
+        Start timing a new batch (the timing of the previous batch is cancelled).
+        """
+
+        with self.condition:
+            self.deadline = time.time() + self.batch_ms / 1000.0
+
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run)
+                self.thread.daemon = True
+                self.thread.start()
+
+            self.condition.notify()
+
+    def run(self):
+        """
+        Wait for the deadline of each batch and call the function once it passes (until closed).
+        """
+
+        while True:
+            with self.condition:
+                while not self.closed and (self.deadline is None or time.time() < self.deadline):
+                    if self.deadline is None:
+                        self.condition.wait()
+                    else:
+                        self.condition.wait(self.deadline - time.time())
+
+                if self.closed:
+                    return
+
+                self.deadline = None
+
+            with self.lock:
+                try:
+                    self.function()
+                except Exception as exception:
+                    self.error = exception
+
+    def cancel(self):
+        """
+        Stop timing the batch (once it was output).
+        """
+
+        with self.condition:
+            self.deadline = None
+
+    def close(self):
+        """
+        Stop the thread of the timer.
+        """
+
+        with self.condition:
+            self.closed = True
+            self.deadline = None
+            self.condition.notify()
+
+    def raise_error(self):
+        """
+        Raise the exception that the function raised when it was called by the timer (if it
+        did).
+        """
+
+        if self.error is not None:
+            error = self.error
+            self.error = None
+
+            raise error
+
+
+class EventBatcher(object):
+    """
+    Collects serialized event elements and outputs them in batches, each as a single stream
+    element, so that the output is written (and flushed) once per batch instead of once per event.
+
+    Each event must be complete on its own (i.e. include the done element if it is unbroken) since
+    the events of a batch are output together. The events that are pending must be output with
+    flush() (or close()) once the last event is added.
+    """
+
+    def __init__(self, output, batch_size=None, batch_ms=None):
+        """
+        Set up the batcher.
+
+        Arguments:
+        output -- The function to call with the serialized stream of each batch
+        batch_size -- The maximum number of events in a batch (each event is output on its own if
+                      None or less than two)
+        batch_ms -- The maximum number of milliseconds an event is held before its batch is output;
+                    the batch is output by a timer if no more events are added in time
+        """
+
+        if batch_size is None or batch_size < 1:
+            batch_size = 1
+
+        self.output = output
+        self.batch_size = batch_size
+        self.batch_ms = batch_ms
+
+        self.events = []
+        self.batch_started = None
+
+        self.batches = 0
+
+        # The timer outputs the batch from another thread so the events are accessed with the lock
+        self.lock = threading.RLock()
+
+        if batch_ms and batch_size > 1:
+            self.timer = BatchTimer(self.output_batch, batch_ms, self.lock)
+        else:
+            self.timer = None
+
+    def add(self, event):
+        """
+        Add the event element, outputting the batch if it is full (or has been held too long).
+
+        Arguments:
+        event -- The event element (see XMLEventSerializer.serialize_event())
+        """
+
+        with self.lock:
+            if self.timer is not None:
+                self.timer.raise_error()
+
+            if len(self.events) == 0 and self.batch_ms:
+                self.batch_started = time.time()
+
+                if self.timer is not None:
+                    self.timer.start()
+
+            self.events.append(event)
+
+            if len(self.events) >= self.batch_size:
+                self.output_batch()
+
+            elif self.batch_ms and (time.time() - self.batch_started) * 1000 >= self.batch_ms:
+                self.output_batch()
+
+    def output_batch(self):
+        """
+        Output the events that are pending (if any) as a batch.
+        """
+
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+
+            if len(self.events) == 0:
+                return
+
+            events = self.events
+            self.events = []
+
+            self.output('<stream>' + ''.join(events) + '</stream>')
+            self.batches += 1
+
+    def flush(self):
+        """
+        Output the events that are pending (if any). An exception raised while the timer was
+        outputting a batch is raised here so that the events are not assumed to have been output.
+        """
+
+        with self.lock:
+            self.output_batch()
+
+            if self.timer is not None:
+                self.timer.raise_error()
+
+    def close(self):
+        """
+        Output the events that are pending and stop the timer.
+        """
+
+        try:
+            self.flush()
+        finally:
+            if self.timer is not None:
+                self.timer.close()
@@ -0,0 +1,218 @@
+import logging
+import logging.handlers
+import multiprocessing
+import queue
+
+
+class ResultQueueHandler(logging.handlers.QueueHandler):
+    """
+    Sends the records logged in a worker process back to the coordinating process over the queue
+    of the results (see ShardedScan) so that only the coordinator writes to the log.
+    """
+
+    def enqueue(self, record):
+        self.queue.put((ShardedScan.LOG, None, [record], None))
+
+
+class ShardedScan(object):
+    """
+    Runs a function over a list of shards (such as the top-level sub-directories of a tree) on a
+    pool of processes. The items produced by the function are sent back to the coordinating
+    process in batches so that they can be processed (e.g. written out) as they are produced.
+
+    The function is called as function(shard, summary, *args) and must return an iterable of
+    picklable items; it can populate the summary dictionary with information about the shard
+    (such as counts) which is sent back once the shard is complete.
+
+    The worker processes are started from a fresh interpreter (with the "forkserver" or "spawn"
+    start method) rather than forked from the coordinator since the coordinator may be running
+    threads (such as the pools of the hashes and the watchers) whose locks a forked child would
+    inherit in whatever state they were in. The function and its arguments must thus be
+    picklable.
+
+    The records logged in the workers to the logger with the same name as the coordinator's
+    logger are sent back to the coordinator and logged there.
+    """
+
+    DEFAULT_BATCH_SIZE = 500
+
+    # The types of the messages sent from the workers
+    ITEMS = 'items'
+    DONE = 'done'
+    FAILED = 'failed'
+    LOG = 'log'
+
+    def __init__(self, function, processes, batch_size=None, logger=None):
+        """
+        Set up the scan.
+
+        Arguments:
+        function -- The function to run for each shard
+        processes -- The number of processes to run the shards on
+        batch_size -- The number of items to send back to the coordinator at a time
+        logger -- The logger to log the records from the workers to (they are discarded if None)
+        """
+
+        if batch_size is None or batch_size <= 0:
+            batch_size = ShardedScan.DEFAULT_BATCH_SIZE
+
+        self.function = function
+        self.processes = processes
+        self.batch_size = batch_size
+        self.logger = logger
+
+        self.shards = []
+        self.summaries = {}
+        self.workers = []
+        self.task_queue = None
+        self.result_queue = None
+
+    @classmethod
+    def get_context(cls):
+        """
+        Get the multiprocessing context to start the workers with (see above).
+        """
+
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            return multiprocessing.get_context('forkserver')
+        else:
+            return multiprocessing.get_context('spawn')
+
+    @classmethod
+    def run_worker(cls, function, args, task_queue, result_queue, batch_size, logger_name,
+                   logger_level):
+        """
+        Process the shards from the task queue until the sentinel (None) is received.
+        """
+
+        # Send the records logged by the function back to the coordinator
+        if logger_name is not None:
+            logger = logging.getLogger(logger_name)
+
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+
+            logger.addHandler(ResultQueueHandler(result_queue))
+            logger.setLevel(logger_level)
+            logger.propagate = False
+
+        while True:
+            shard = task_queue.get()
+
+            if shard is None:
+                break
+
+            batch = []
+            summary = {}
+
+            try:
+                for item in function(shard, summary, *args):
+                    batch.append(item)
+
+                    if len(batch) >= batch_size:
+                        result_queue.put((ShardedScan.ITEMS, shard, batch, None))
+                        batch = []
+
+                result_queue.put((ShardedScan.DONE, shard, batch, summary))
+
+            except Exception as exception:
+                summary['error'] = str(exception)
+                result_queue.put((ShardedScan.FAILED, shard, batch, summary))
+
+    def start(self, shards, *args):
+        """
+        Start the worker processes on the given shards.
+
+        Arguments:
+        shards -- A list of the shards (these must be picklable)
+        args -- Additional arguments to pass to the function (these must be picklable)
+        """
+
+        context = self.get_context()
+
+        self.shards = list(shards)
+        self.summaries = {}
+        self.workers = []
+
+        if len(self.shards) == 0:
+            return
+
+        # The queues are kept until the scan stops since the workers open them once they start
+        self.task_queue = context.Queue()
+
+        # Bound the number of batches waiting so that the workers don't get too far ahead
+        self.result_queue = context.Queue(maxsize=self.processes * 4)
+
+        for shard in self.shards:
+            self.task_queue.put(shard)
+
+        if self.logger is not None:
+            logger_name = self.logger.name
+            logger_level = self.logger.getEffectiveLevel()
+        else:
+            logger_name = None
+            logger_level = None
+
+        for _ in range(min(self.processes, len(self.shards))):
+            worker = context.Process(target=ShardedScan.run_worker,
+                                     args=(self.function, args, self.task_queue, self.result_queue,
+                                           self.batch_size, logger_name, logger_level))
+            worker.daemon = True
+            worker.start()
+
+            self.workers.append(worker)
+
+            self.task_queue.put(None)
+
+    def iter_results(self):
+        """
+        Yield the items from the workers as they are received. The items of a given shard are
+        yielded in order but the items of different shards are interleaved.
+
+        Once iteration completes, the summaries attribute will include the summary of each shard
+        (keyed by the shard) including "failed" indicating if the shard failed.
+        """
+
+        while len(self.summaries) < len(self.shards):
+            try:
+                message_type, shard, items, summary = self.result_queue.get(timeout=1)
+            except queue.Empty:
+
+                # Stop if the workers died without completing the shards
+                if not any(worker.is_alive() for worker in self.workers):
+                    for shard in self.shards:
+                        if shard not in self.summaries:
+                            self.summaries[shard] = {'failed': True,
+                                                     'error': 'The worker process exited'}
+                    break
+
+                continue
+
+            # Log the records from the workers
+            if message_type == ShardedScan.LOG:
+                if self.logger is not None:
+                    for record in items:
+                        self.logger.handle(record)
+
+                continue
+
+            for item in items:
+                yield item
+
+            if message_type != ShardedScan.ITEMS:
+                summary['failed'] = message_type == ShardedScan.FAILED
+                self.summaries[shard] = summary
+
+    def stop(self):
+        """
+        Wait for the worker processes to exit (stopping them if the shards are not complete).
+        """
+
+        for worker in self.workers:
+            if len(self.summaries) < len(self.shards) and worker.is_alive():
+                worker.terminate()
+
+            worker.join()
+
+        self.workers = []
+        self.task_queue = None
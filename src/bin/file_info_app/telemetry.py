@@ -0,0 +1,252 @@
+import collections
+import math
+import threading
+import time
+
+
+class ScanTelemetry(object):
+    """
+    Collects the performance telemetry of a run: the time spent in each phase of the scan, the
+    number of files and directories processed, the number of bytes hashed, the number of errors
+    and the distribution of the latency of the stat calls.
+
+    The latencies are counted in logarithmic buckets (four per doubling) so that the memory used
+    doesn't grow with the size of the scan; the percentiles are thus accurate to within about
+    20%.
+
+    The telemetry is updated by the thread running the scan (so it isn't locked) except for the
+    counters, which may be incremented by the threads computing the hashes. The time spent hashing
+    and the bytes hashed are taken from the FileHasher once the scan is done (see
+    add_file_hasher_stats()).
+    """
+
+    # The phases of the scan that are timed
+    PHASES = ('walk', 'stat', 'acl', 'hash', 'serialize', 'output')
+
+    # The kinds of errors that are counted
+    ERRORS = ('walk_errors', 'stat_errors', 'acl_errors', 'hash_errors')
+
+    # The number of buckets of the histogram of the latencies per doubling of the latency (the
+    # last bucket holds the latencies of more than 2^32 microseconds)
+    BUCKETS_PER_DOUBLING = 4
+    BUCKETS = BUCKETS_PER_DOUBLING * 32 + 1
+
+    # The percentiles of the stat latency that are included in the event
+    PERCENTILES = (50, 90, 99)
+
+    def __init__(self):
+        self.phase_seconds = collections.Counter()
+        self.counts = collections.Counter()
+
+        # The number of stat calls in each bucket of their latency
+        self.stat_latencies = [0] * ScanTelemetry.BUCKETS
+        self.max_stat_latency = 0.0
+
+        # The number of files and directories that were stat'ed
+        self.files = 0
+        self.directories = 0
+
+        # The errors of the hashes may be counted by a pool of threads
+        self.lock = threading.Lock()
+
+    def add_time(self, phase, seconds):
+        """
+        Add the time spent in the phase.
+
+        Arguments:
+        phase -- The name of the phase (see PHASES)
+        seconds -- The number of seconds spent
+        """
+
+        self.phase_seconds[phase] += seconds
+
+    def call_timed(self, phase, function, *args):
+        """
+        Call the function and add the time it took to the phase; returns the result of the
+        function.
+
+        Arguments:
+        phase -- The name of the phase (see PHASES)
+        function -- The function to call with the remaining arguments
+        """
+
+        start = time.perf_counter()
+
+        try:
+            return function(*args)
+        finally:
+            self.add_time(phase, time.perf_counter() - start)
+
+    def increment(self, name, count=1):
+        """
+        Increment the counter.
+
+        Arguments:
+        name -- The name of the counter (e.g. "bytes_hashed" or one of ERRORS)
+        count -- The amount to add
+        """
+
+        with self.lock:
+            self.counts[name] += count
+
+    def add_stat(self, seconds, is_directory):
+        """
+        Add the stat call of a file or directory (its latency is included in the time of the stat
+        phase too).
+
+        Arguments:
+        seconds -- The number of seconds the stat call took
+        is_directory -- Whether the path is a directory
+        """
+
+        microseconds = seconds * 1000000
+
+        if microseconds > 1:
+            bucket = min(int(math.log2(microseconds) * ScanTelemetry.BUCKETS_PER_DOUBLING),
+                         ScanTelemetry.BUCKETS - 1)
+        else:
+            bucket = 0
+
+        self.phase_seconds['stat'] += seconds
+        self.stat_latencies[bucket] += 1
+
+        if seconds > self.max_stat_latency:
+            self.max_stat_latency = seconds
+
+        if is_directory:
+            self.directories += 1
+        else:
+            self.files += 1
+
+    def add_file_hasher_stats(self, file_hasher):
+        """
+        Add the time spent hashing and the number of bytes hashed by the FileHasher.
+
+        Arguments:
+        file_hasher -- The FileHasher that computed the hashes of the scan
+        """
+
+        self.phase_seconds['hash'] += file_hasher.hash_seconds
+        self.increment('bytes_hashed', file_hasher.bytes_hashed)
+
+    def iter_timed(self, phase, iterator):
+        """
+        Yield the items of the iterator adding the time spent getting each of them to the phase.
+
+        Arguments:
+        phase -- The name of the phase (see PHASES)
+        iterator -- The iterable to time (such as a generator that walks the tree)
+        """
+
+        iterator = iter(iterator)
+
+        while True:
+            start = time.perf_counter()
+
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_time(phase, time.perf_counter() - start)
+                return
+
+            self.add_time(phase, time.perf_counter() - start)
+
+            yield item
+
+    def get_stat_latency_percentile(self, percentile):
+        """
+        Get the latency (in seconds) that the given percentage of the stat calls completed within
+        (None if no stat calls were made).
+
+        Arguments:
+        percentile -- The percentile (e.g. 99)
+        """
+
+        total = sum(self.stat_latencies)
+
+        if total == 0:
+            return None
+
+        threshold = total * percentile / 100.0
+        seen = 0
+
+        for bucket, count in enumerate(self.stat_latencies):
+            seen += count
+
+            if count and seen >= threshold:
+                break
+
+        # Use the upper bound of the bucket (but no more than the slowest call)
+        upper_bound = 2 ** ((bucket + 1) / float(ScanTelemetry.BUCKETS_PER_DOUBLING)) / 1000000
+
+        return min(upper_bound, self.max_stat_latency)
+
+    def get_state(self):
+        """
+        Get the state of the telemetry so that it can be added to that of another process (see
+        add_state()).
+        """
+
+        return {
+            'phase_seconds': dict(self.phase_seconds),
+            'counts': dict(self.counts),
+            'stat_latencies': list(self.stat_latencies),
+            'max_stat_latency': self.max_stat_latency,
+            'files': self.files,
+            'directories': self.directories
+        }
+
+    def add_state(self, state):
+        """
+        Add the telemetry of another process (such as the workers of a sharded scan).
+
+        Arguments:
+        state -- The state from get_state()
+        """
+
+        self.phase_seconds.update(state['phase_seconds'])
+        self.stat_latencies = [count + other_count for count, other_count in
+                               zip(self.stat_latencies, state['stat_latencies'])]
+        self.max_stat_latency = max(self.max_stat_latency, state['max_stat_latency'])
+        self.files += state['files']
+        self.directories += state['directories']
+
+        with self.lock:
+            self.counts.update(state['counts'])
+
+    def make_event(self, file_path, duration):
+        """
+        Make the record of the telemetry of the run.
+
+        Arguments:
+        file_path -- The path that was scanned
+        duration -- The wall time of the run (in seconds)
+        """
+
+        result = collections.OrderedDict()
+
+        result['path'] = file_path
+        result['run_seconds'] = round(duration, 3)
+
+        for phase in ScanTelemetry.PHASES:
+            result[phase + '_seconds'] = round(self.phase_seconds[phase], 3)
+
+        result['files'] = self.files
+        result['directories'] = self.directories
+        result['files_per_sec'] = round(self.files / max(duration, 0.001), 1)
+        result['directories_per_sec'] = round(self.directories / max(duration, 0.001), 1)
+        result['bytes_hashed'] = self.counts['bytes_hashed']
+
+        for name in ScanTelemetry.ERRORS:
+            result[name] = self.counts[name]
+
+        for percentile in ScanTelemetry.PERCENTILES:
+            latency = self.get_stat_latency_percentile(percentile)
+
+            if latency is not None:
+                result['stat_latency_p%i_ms' % percentile] = round(latency * 1000, 3)
+
+        if any(self.stat_latencies):
+            result['stat_latency_max_ms'] = round(self.max_stat_latency * 1000, 3)
+
+        return result
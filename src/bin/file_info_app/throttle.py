@@ -0,0 +1,225 @@
+import collections
+import threading
+import time
+
+
+class TokenBucket(object):
+    """
+    A token bucket that limits the rate at which some resource is consumed. The bucket refills at
+    the given rate up to its capacity; callers that consume more than is available wait until the
+    tokens they need would have been refilled.
+
+    Consumption is reserved before waiting so that the bucket can be shared by several threads
+    (each thread waits for its own share).
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        Set up the bucket.
+
+        Arguments:
+        rate -- The number of tokens added per second
+        capacity -- The maximum number of tokens that can accumulate (defaults to one second's
+                    worth); this is the largest burst allowed
+        """
+
+        if capacity is None or capacity <= 0:
+            capacity = rate
+
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+        # Statistics on the use of the bucket
+        self.consumed = 0
+        self.throttled = 0
+        self.throttled_time = 0.0
+
+        self.lock = threading.Lock()
+
+    def consume(self, amount=1):
+        """
+        Consume the given number of tokens, waiting if necessary. Returns the number of seconds
+        that were spent waiting.
+
+        Arguments:
+        amount -- The number of tokens to consume (this can be larger than the capacity)
+        """
+
+        with self.lock:
+            now = time.monotonic()
+
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            self.tokens -= amount
+            self.consumed += amount
+
+            if self.tokens < 0:
+                wait = -self.tokens / self.rate
+
+                self.throttled += 1
+                self.throttled_time += wait
+            else:
+                wait = 0
+
+        if wait > 0:
+            time.sleep(wait)
+
+        return wait
+
+    def set_rate(self, rate, capacity=None):
+        """
+        Change the rate (and capacity) of the bucket; the tokens that accumulated so far are kept
+        (up to the new capacity).
+
+        Arguments:
+        rate -- The number of tokens added per second
+        capacity -- The maximum number of tokens that can accumulate (defaults to one second's
+                    worth)
+        """
+
+        if capacity is None or capacity <= 0:
+            capacity = rate
+
+        with self.lock:
+            now = time.monotonic()
+
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            self.rate = float(rate)
+            self.capacity = float(capacity)
+            self.tokens = min(self.capacity, self.tokens)
+
+
+class IOGovernor(object):
+    """
+    Limits the rate of the I/O done by a scan: the number of bytes read (when computing hashes) and
+    the number of metadata operations (directory listings and stat calls).
+    """
+
+    def __init__(self, max_read_bytes_per_sec=None, max_stat_ops_per_sec=None):
+        """
+        Set up the governor.
+
+        Arguments:
+        max_read_bytes_per_sec -- The maximum number of bytes to read per second (unlimited if
+                                  None)
+        max_stat_ops_per_sec -- The maximum number of metadata operations per second (unlimited
+                                if None)
+        """
+
+        self.max_read_bytes_per_sec = max_read_bytes_per_sec
+        self.max_stat_ops_per_sec = max_stat_ops_per_sec
+
+        if max_read_bytes_per_sec is not None and max_read_bytes_per_sec > 0:
+            self.read_bucket = TokenBucket(max_read_bytes_per_sec)
+        else:
+            self.read_bucket = None
+
+        if max_stat_ops_per_sec is not None and max_stat_ops_per_sec > 0:
+            self.stat_bucket = TokenBucket(max_stat_ops_per_sec)
+        else:
+            self.stat_bucket = None
+
+        # The statistics from other governors (such as those in worker processes)
+        self.added_stats = collections.Counter()
+
+    def consume_read(self, size):
+        """
+        Account for reading the given number of bytes, waiting if the budget is exhausted.
+
+        Arguments:
+        size -- The number of bytes read
+        """
+
+        if self.read_bucket is not None:
+            self.read_bucket.consume(size)
+
+    def consume_stat(self, count=1):
+        """
+        Account for the given number of metadata operations, waiting if the budget is exhausted.
+
+        Arguments:
+        count -- The number of operations
+        """
+
+        if self.stat_bucket is not None:
+            self.stat_bucket.consume(count)
+
+    def get_options(self, parts=1):
+        """
+        Get the arguments for making a governor with an equal share of this governor's budget
+        (e.g. for each of several worker processes).
+
+        Arguments:
+        parts -- The number of parts to split the budget into
+        """
+
+        options = {}
+
+        if self.read_bucket is not None:
+            options['max_read_bytes_per_sec'] = max(1, self.max_read_bytes_per_sec // parts)
+
+        if self.stat_bucket is not None:
+            options['max_stat_ops_per_sec'] = max(1, self.max_stat_ops_per_sec // parts)
+
+        return options
+
+    def split(self, parts):
+        """
+        Split the budget into equal parts: this governor keeps one of them and the arguments for
+        making a governor with each of the others (e.g. for worker processes that run at the same
+        time as this one) are returned. This keeps the total rate within the limits.
+
+        Arguments:
+        parts -- The number of parts to split the budget into (including this governor's)
+        """
+
+        options = self.get_options(parts)
+
+        if self.read_bucket is not None:
+            self.max_read_bytes_per_sec = options['max_read_bytes_per_sec']
+            self.read_bucket.set_rate(self.max_read_bytes_per_sec)
+
+        if self.stat_bucket is not None:
+            self.max_stat_ops_per_sec = options['max_stat_ops_per_sec']
+            self.stat_bucket.set_rate(self.max_stat_ops_per_sec)
+
+        return options
+
+    def get_stats(self):
+        """
+        Get the statistics on the throttling (for the limits that are enabled).
+        """
+
+        stats = collections.OrderedDict()
+
+        if self.read_bucket is not None:
+            stats['read_bytes'] = self.read_bucket.consumed + self.added_stats['read_bytes']
+            stats['read_throttled'] = self.read_bucket.throttled + \
+                                      self.added_stats['read_throttled']
+            stats['read_throttled_seconds'] = round(self.read_bucket.throttled_time +
+                                                    self.added_stats['read_throttled_seconds'], 3)
+
+        if self.stat_bucket is not None:
+            stats['stat_ops'] = self.stat_bucket.consumed + self.added_stats['stat_ops']
+            stats['stat_throttled'] = self.stat_bucket.throttled + \
+                                      self.added_stats['stat_throttled']
+            stats['stat_throttled_seconds'] = round(self.stat_bucket.throttled_time +
+                                                    self.added_stats['stat_throttled_seconds'], 3)
+
+        return stats
+
+    def add_stats(self, stats):
+        """
+        Include the statistics from another governor in this governor's statistics.
+
+        Arguments:
+        stats -- The statistics from get_stats()
+        """
+
+        self.added_stats.update(stats)
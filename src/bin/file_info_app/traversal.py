@@ -0,0 +1,214 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+
+def walk_entries(top, governor=None, stack=None):
+    """
+    Walk the directory tree rooted at the given path. This works like os.walk(topdown=True)
+    except that it yields the os.DirEntry objects returned by os.scandir() instead of names. The
+    entries cache the results of is_dir() and stat() so that the caller doesn't need to make
+    additional calls to the file-system for information that was already obtained when the
+    directory was listed.
+
+    This yields a tuple of (path, entry, dirs, files) for each directory:
+    path -- The path of the directory
+    entry -- The DirEntry for the directory as listed by its parent (None for the top directory)
+    dirs -- A list of DirEntry objects for the sub-directories (this list can be pruned in place
+            in order to avoid descending into sub-directories)
+    files -- A list of DirEntry objects for everything else
+
+    If the directory cannot be listed, then dirs and files will be None.
+
+    Like os.walk(), symbolic links to directories are included in dirs but are not descended into.
+
+    Arguments:
+    top -- The directory to walk
+    governor -- An IOGovernor to limit the rate of the directory listings with
+    stack -- The list to use as the stack of the (path, entry) of the directories left to walk
+             (the last is walked next); this can be provided in order to resume a walk or to
+             inspect where the walk is (see get_pending_directories())
+    """
+
+    if stack is None:
+        stack = [(top, None)]
+
+    while stack:
+        path, entry = stack.pop()
+
+        try:
+            dirs, files = list_directory(path, governor=governor)
+        except OSError:
+            yield path, entry, None, None
+            continue
+
+        yield path, entry, dirs, files
+
+        # Push the sub-directories in reverse so that they are walked in the order listed
+        for child in reversed(dirs):
+            if not is_symlink(child):
+                stack.append((child.path, child))
+
+
+def parallel_walk_entries(top, workers, file_filter=None, governor=None, stack=None):
+    """
+    Walk the directory tree like walk_entries() but list the directories that will be walked next
+    (and stat their entries) on a pool of threads. This is useful on file-systems where each call
+    has a high latency (such as SMB or NFS mounts) since the sibling sub-trees are listed
+    concurrently.
+
+    The directories are still yielded in the same order as walk_entries() and the dirs list can
+    still be pruned in place; the directories that were pruned are not listed.
+
+    Arguments:
+    top -- The directory to walk
+    workers -- The number of threads to list the directories with
+    file_filter -- A filter with a match() function; only the files that match are stat'ed in the
+                   background (the caller still needs to apply the filter)
+    governor -- An IOGovernor to limit the rate of the directory listings with
+    stack -- The list to use as the stack of the directories left to walk (see walk_entries())
+    """
+
+    if stack is None:
+        stack = [(top, None)]
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+
+    # The number of the directories at the top of the stack to list ahead of time
+    lookahead = workers * 2
+
+    # The Futures of the listings that were started keyed by the path
+    futures = {}
+
+    try:
+        while stack:
+
+            # Start listing the directories that will be walked next
+            for path, _ in stack[-lookahead:]:
+                if path not in futures:
+                    futures[path] = executor.submit(list_directory, path, True, file_filter,
+                                                    governor)
+
+            path, entry = stack.pop()
+            future = futures.pop(path)
+
+            try:
+                dirs, files = future.result()
+            except OSError:
+                yield path, entry, None, None
+                continue
+
+            yield path, entry, dirs, files
+
+            # Push the sub-directories in reverse so that they are walked in the order listed
+            for child in reversed(dirs):
+                if not is_symlink(child):
+                    stack.append((child.path, child))
+
+    finally:
+        # Cancel the listings of the directories that will not be walked
+        for future in futures.values():
+            future.cancel()
+
+        executor.shutdown(wait=True)
+
+
+def get_pending_directories(stack):
+    """
+    Get the paths of the directories on the stack of a walk in the order they would be walked.
+    The result can be used to make the stack for resuming the walk. Note that the sub-directories
+    of the directory that was last yielded are not on the stack until the walk continues.
+
+    Arguments:
+    stack -- The stack provided to walk_entries() or parallel_walk_entries()
+    """
+
+    return [path for path, _ in reversed(stack)]
+
+
+def list_directory(path, prefetch_stat=False, file_filter=None, governor=None):
+    """
+    List the given directory. This returns a tuple of the list of DirEntry objects for the
+    sub-directories and the list for everything else.
+
+    An OSError will be raised if the directory could not be listed.
+
+    Arguments:
+    path -- The directory to list
+    prefetch_stat -- If true, stat() will be called on the entries so that the result is cached
+    file_filter -- A filter with a match() function; if provided, only the files that match will
+                   be stat'ed when prefetching
+    governor -- An IOGovernor to account for the listing with (the stat calls are accounted for
+                by the caller when the records are made)
+    """
+
+    if governor is not None:
+        governor.consume_stat()
+
+    dirs = []
+    files = []
+
+    with os.scandir(path) as scandir_it:
+        for child in scandir_it:
+            try:
+                is_dir = child.is_dir()
+            except OSError:
+                is_dir = False
+
+            if is_dir:
+                dirs.append(child)
+            else:
+                files.append(child)
+
+    if prefetch_stat:
+        for child in dirs + [child for child in files
+                             if file_filter is None or file_filter.match(child.path)]:
+            try:
+                child.stat()
+            except OSError:
+                # The error will be encountered again when the caller gets the stat result
+                pass
+
+    return dirs, files
+
+
+def is_symlink(entry):
+    """
+    Determine if the DirEntry is a symbolic link (treating errors as not being a link).
+
+    Arguments:
+    entry -- The DirEntry to check
+    """
+
+    try:
+        return entry.is_symlink()
+    except OSError:
+        return False
+
+
+def count_entries(path):
+    """
+    Count the files and directories within the given directory. This returns a tuple of the
+    count of files and directories.
+
+    An OSError will be raised if the directory could not be listed.
+
+    Arguments:
+    path -- The directory to count the entries of
+    """
+
+    file_count = 0
+    directory_count = 0
+
+    with os.scandir(path) as scandir_it:
+        for child in scandir_it:
+            try:
+                is_dir = child.is_dir()
+            except OSError:
+                is_dir = False
+
+            if is_dir:
+                directory_count += 1
+            else:
+                file_count += 1
+
+    return file_count, directory_count
@@ -0,0 +1,639 @@
+import collections
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import stat
+import struct
+import sys
+import time
+
+from file_info_app.filters import DirectoryFilter
+from file_info_app.manifest import FileManifest
+from file_info_app.traversal import list_directory, is_symlink
+
+# The flags of inotify (see inotify(7))
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+# The events that are watched for on each directory
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | \
+             IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW | \
+             IN_EXCL_UNLINK
+
+# The header of each event (the wd, mask, cookie and the length of the name that follows it)
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class Inotify(object):
+    """
+    A minimal wrapper around the inotify API of Linux (through ctypes so that no additional
+    modules are needed).
+    """
+
+    libc = None
+
+    def __init__(self):
+        """
+        Open the inotify instance. An OSError is raised if inotify is unavailable.
+        """
+
+        if not self.is_available():
+            raise OSError(errno.ENOSYS, 'inotify is not available on this host')
+
+        self.fd = Inotify.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+    @classmethod
+    def is_available(cls):
+        """
+        Determine if inotify can be used on this host.
+        """
+
+        if not sys.platform.startswith('linux'):
+            return False
+
+        if cls.libc is None:
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+
+                libc.inotify_init1.argtypes = [ctypes.c_int]
+                libc.inotify_init1.restype = ctypes.c_int
+                libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+                libc.inotify_add_watch.restype = ctypes.c_int
+                libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+                libc.inotify_rm_watch.restype = ctypes.c_int
+
+                cls.libc = libc
+            except (OSError, AttributeError):
+                return False
+
+        return True
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        """
+        Watch the directory and return the watch descriptor. An OSError is raised if the watch
+        could not be added (with ENOSPC if the limit on the number of watches was reached).
+
+        Arguments:
+        path -- The path of the directory
+        mask -- The events to watch for
+        """
+
+        wd = Inotify.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+
+        return wd
+
+    def remove_watch(self, wd):
+        """
+        Stop watching the directory (errors are ignored since the watch is removed automatically
+        when the directory is deleted).
+
+        Arguments:
+        wd -- The watch descriptor
+        """
+
+        Inotify.libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self, timeout=None):
+        """
+        Wait for events and return them as a list of tuples of the watch descriptor, mask, cookie
+        and name (an empty list is returned if none arrive before the timeout).
+
+        Arguments:
+        timeout -- The maximum number of seconds to wait
+        """
+
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+
+        if not readable:
+            return []
+
+        events = []
+
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+
+            offset = 0
+
+            while offset < len(data):
+                wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+
+                events.append((wd, mask, cookie, name))
+
+        return events
+
+    def close(self):
+        """
+        Close the inotify instance (which removes all of the watches).
+        """
+
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class TreeWatcher(object):
+    """
+    Watches the directories under a path with inotify and reports the paths that were created,
+    modified or deleted.
+
+    The sub-trees that cannot be watched because the limit on the number of watches was reached
+    (see /proc/sys/fs/inotify/max_user_watches) are polled instead (as long as the snapshots of
+    them fit within max_polled_entries). If the queue of events overflows (so some events were
+    lost), the watched directories that may have changed since the events were last read are
+    rescanned (see rescan()).
+    """
+
+    def __init__(self, root, directory_filter=None, depth_limit=None, poll_interval=60,
+                 max_watches=None, max_polled_entries=None):
+        """
+        Set up the watcher (call start() to add the watches).
+
+        Arguments:
+        root -- The directory to watch
+        directory_filter -- A DirectoryFilter; the directories it excludes are not watched
+        depth_limit -- The depth of the directories whose entries are watched (the same as the
+                       depth_limit of the scan)
+        poll_interval -- How often (in seconds) to poll the sub-trees that couldn't be watched
+        max_watches -- The maximum number of directories to watch (the rest are polled); the
+                       limit of the host applies too
+        max_polled_entries -- The maximum number of entries to keep in the snapshots of the
+                              polled sub-trees (across all of them); the sub-trees that don't fit
+                              are neither watched nor polled so their changes are only reported by
+                              the scans
+        """
+
+        self.root = root
+        self.directory_filter = directory_filter
+        self.depth_limit = depth_limit
+        self.poll_interval = poll_interval
+        self.max_watches = max_watches
+        self.max_polled_entries = max_polled_entries
+
+        self.root_depth = root.rstrip(os.sep).count(os.sep)
+
+        self.inotify = None
+
+        # The watched directories by watch descriptor and vice versa
+        self.paths = {}
+        self.watches = {}
+
+        # The snapshots of the polled sub-trees (keyed by the path of the sub-tree); each maps the
+        # paths within it to a tuple of the modification and change times, the size and whether it
+        # is a directory
+        self.polled = {}
+        self.next_poll = None
+
+        # The sub-trees that couldn't be watched and were too large to poll
+        self.unpolled = set()
+
+        # When the events were last read (in nanoseconds, for rescanning after an overflow)
+        self.last_read = None
+
+        self.overflows = 0
+
+        # The paths reported as deleted that were directories (since they can no longer be
+        # stat'ed); the consumer of the changes clears this once it has handled them
+        self.deleted_directories = set()
+
+    def start(self):
+        """
+        Watch the tree.
+        """
+
+        self.inotify = Inotify()
+        self.last_read = time.time_ns()
+        self.next_poll = time.time() + self.poll_interval
+
+        self.watch_tree(self.root)
+
+    def close(self):
+        """
+        Stop watching the tree.
+        """
+
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+        self.paths.clear()
+        self.watches.clear()
+        self.polled.clear()
+        self.unpolled.clear()
+        self.deleted_directories.clear()
+
+    def get_depth(self, path):
+        """
+        Get the depth of the directory relative to the root (the same way as the scan does).
+        """
+
+        if path == self.root:
+            return 0
+
+        return path.count(os.sep) - self.root_depth
+
+    def should_watch(self, path):
+        """
+        Determine if the entries of the directory would be included in the scan (and thus
+        whether the directory needs to be watched).
+        """
+
+        if self.depth_limit is not None and self.depth_limit > 0 and \
+           self.get_depth(path) >= self.depth_limit:
+            return False
+
+        if self.directory_filter is not None and \
+           self.directory_filter.get_state(path) == DirectoryFilter.EXCLUDED:
+            return False
+
+        return True
+
+    def watch_tree(self, top, changes=None):
+        """
+        Watch the directory and those within it. The sub-trees that cannot be watched due to the
+        limit on the number of watches are polled instead.
+
+        Arguments:
+        top -- The directory to start at
+        changes -- A dictionary to add the entries found to (as created); this is used for the
+                   directories that were just created since entries may have been added to them
+                   before they were watched
+        """
+
+        stack = [top]
+
+        while stack:
+            path = stack.pop()
+
+            if path in self.watches or not self.should_watch(path):
+                continue
+
+            # Stop watching (and poll the sub-tree instead) once the limit is reached
+            try:
+                if self.max_watches is not None and len(self.watches) >= self.max_watches:
+                    raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC), path)
+
+                wd = self.inotify.add_watch(path)
+
+            except OSError as exception:
+                if exception.errno == errno.ENOSPC:
+                    self.poll_tree(path)
+
+                continue
+
+            self.paths[wd] = path
+            self.watches[path] = wd
+
+            try:
+                dirs, files = list_directory(path)
+            except OSError:
+                continue
+
+            if changes is not None:
+                for entry in files:
+                    changes[entry.path] = FileManifest.CREATED
+
+            for entry in dirs:
+                if changes is not None:
+                    changes[entry.path] = FileManifest.CREATED
+
+                if not is_symlink(entry):
+                    stack.append(entry.path)
+
+    def unwatch_tree(self, top):
+        """
+        Forget about the directory and those within it (once they were deleted or moved away).
+
+        Arguments:
+        top -- The directory that was deleted or moved
+        """
+
+        prefix = top + os.sep
+
+        for path in [path for path in self.watches if path == top or path.startswith(prefix)]:
+            wd = self.watches.pop(path)
+            self.paths.pop(wd, None)
+            self.inotify.remove_watch(wd)
+
+        for path in [path for path in self.polled if path == top or path.startswith(prefix)]:
+            del self.polled[path]
+
+        for path in [path for path in self.unpolled if path == top or path.startswith(prefix)]:
+            self.unpolled.remove(path)
+
+    def poll_tree(self, top):
+        """
+        Poll the sub-tree (since it couldn't be watched) unless its snapshot would exceed
+        max_polled_entries.
+
+        Arguments:
+        top -- The directory to start at
+        """
+
+        snapshot = self.take_snapshot(top, self.get_poll_capacity())
+
+        if snapshot is None:
+            self.unpolled.add(top)
+        else:
+            self.polled[top] = snapshot
+
+    def get_poll_capacity(self, exclude=None):
+        """
+        Get the number of entries that can still be added to the snapshots of the polled
+        sub-trees (or None if there is no limit).
+
+        Arguments:
+        exclude -- The sub-tree whose snapshot is not counted (since it is being replaced)
+        """
+
+        if self.max_polled_entries is None or self.max_polled_entries <= 0:
+            return None
+
+        used = sum(len(snapshot) for top, snapshot in self.polled.items() if top != exclude)
+
+        return max(0, self.max_polled_entries - used)
+
+    def iter_entries(self, top):
+        """
+        Yield the path and stat results of the entries within the directory (and those within
+        the sub-directories that would be watched) without following symbolic links.
+
+        Arguments:
+        top -- The directory to start at
+        """
+
+        stack = [top]
+
+        while stack:
+            path = stack.pop()
+
+            if not self.should_watch(path):
+                continue
+
+            try:
+                dirs, files = list_directory(path)
+            except OSError:
+                continue
+
+            for entry in files + dirs:
+                try:
+                    yield entry.path, entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+
+            for entry in dirs:
+                if not is_symlink(entry):
+                    stack.append(entry.path)
+
+    def take_snapshot(self, top, max_entries=None):
+        """
+        Get the state of the entries of the sub-tree so that the changes can be found by
+        comparing it to a later snapshot. Returns None if the sub-tree has more than max_entries
+        entries.
+
+        Arguments:
+        top -- The directory to start at
+        max_entries -- The maximum number of entries to include in the snapshot
+        """
+
+        snapshot = {}
+
+        for path, stat_info in self.iter_entries(top):
+            if max_entries is not None and len(snapshot) >= max_entries:
+                return None
+
+            snapshot[path] = (stat_info.st_mtime_ns, stat_info.st_ctime_ns, stat_info.st_size,
+                              stat.S_ISDIR(stat_info.st_mode))
+
+        return snapshot
+
+    def poll(self, changes):
+        """
+        Add the changes to the sub-trees that are polled since they were last polled.
+
+        Arguments:
+        changes -- The dictionary to add the changed paths to
+        """
+
+        for top, previous in list(self.polled.items()):
+            current = self.take_snapshot(top, self.get_poll_capacity(top))
+
+            # Stop polling the sub-tree if it grew too large (the changes are left to the scans)
+            if current is None:
+                del self.polled[top]
+                self.unpolled.add(top)
+                continue
+
+            for path, signature in current.items():
+                previous_signature = previous.get(path, None)
+
+                if previous_signature is None:
+                    changes[path] = FileManifest.CREATED
+                elif previous_signature != signature:
+                    changes[path] = FileManifest.MODIFIED
+
+            for path, signature in previous.items():
+                if path not in current:
+                    changes[path] = FileManifest.DELETED
+
+                    if signature[3]:
+                        self.deleted_directories.add(path)
+
+            self.polled[top] = current
+
+    def rescan(self, since, changes):
+        """
+        Add the entries of the watched tree that changed since the given time (after events
+        were lost since the queue overflowed). Only the watched directories that may have changed
+        are listed rather than the whole tree: those whose own modification or change time moved
+        (since an entry was created, deleted or renamed within them) and those that changes were
+        already observed in. Deletions and the modifications of files in directories that
+        otherwise didn't change cannot be detected this way; they are reported by the next full
+        scan.
+
+        Arguments:
+        since -- The time (in nanoseconds since the epoch) to look for changes since
+        changes -- The dictionary to add the changed paths to
+        """
+
+        directories = set(os.path.dirname(path) for path in changes)
+
+        for path in list(self.watches.keys()):
+            try:
+                stat_info = os.stat(path, follow_symlinks=False)
+            except OSError:
+                continue
+
+            if stat_info.st_mtime_ns >= since or stat_info.st_ctime_ns >= since:
+                directories.add(path)
+
+                if path != self.root:
+                    changes.setdefault(path, FileManifest.MODIFIED)
+
+        for directory in directories:
+            if directory not in self.watches:
+                continue
+
+            try:
+                dirs, files = list_directory(directory)
+            except OSError:
+                continue
+
+            for entry in files + dirs:
+                try:
+                    stat_info = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+
+                if stat_info.st_mtime_ns < since and stat_info.st_ctime_ns < since:
+                    continue
+
+                # Watch the directories that were created while the events were lost (the entries
+                # within them are reported as created)
+                if stat.S_ISDIR(stat_info.st_mode) and entry.path not in self.watches and \
+                   entry.path not in self.polled:
+                    changes.setdefault(entry.path, FileManifest.CREATED)
+                    self.watch_tree(entry.path, changes)
+                else:
+                    changes.setdefault(entry.path, FileManifest.MODIFIED)
+
+    def process_events(self, events, changes):
+        """
+        Add the paths that changed according to the events.
+
+        Arguments:
+        events -- A list of tuples of the watch descriptor, mask, cookie and name
+        changes -- The dictionary to add the changed paths to
+        """
+
+        overflowed = False
+
+        for wd, mask, _, name in events:
+
+            if mask & IN_Q_OVERFLOW:
+                overflowed = True
+                continue
+
+            directory = self.paths.get(wd, None)
+
+            # The watch was removed (since the directory was deleted or moved)
+            if mask & IN_IGNORED:
+                if directory is not None:
+                    self.paths.pop(wd, None)
+                    self.watches.pop(directory, None)
+
+                continue
+
+            if directory is None:
+                continue
+
+            # The removal of the directory is reported by its parent
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                continue
+
+            if name:
+                path = os.path.join(directory, name)
+            else:
+                path = directory
+
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                changes[path] = FileManifest.DELETED
+
+                if mask & IN_ISDIR:
+                    self.deleted_directories.add(path)
+                    self.unwatch_tree(path)
+
+            elif mask & (IN_CREATE | IN_MOVED_TO):
+                changes[path] = FileManifest.CREATED
+
+                if mask & IN_ISDIR:
+                    self.watch_tree(path, changes)
+
+            elif changes.get(path, None) != FileManifest.CREATED:
+                changes[path] = FileManifest.MODIFIED
+
+        return overflowed
+
+    def read_changes(self, timeout=None, changes=None):
+        """
+        Wait for changes and return a dictionary of the paths that changed and how (created,
+        modified or deleted) in the order they were observed.
+
+        Arguments:
+        timeout -- The maximum number of seconds to wait for events
+        changes -- The dictionary of the changes that were already read to add to (so that
+                   several reads can be coalesced)
+        """
+
+        if changes is None:
+            changes = collections.OrderedDict()
+
+        # Don't wait past when the polled sub-trees are due to be polled
+        if self.polled:
+            remaining = max(0, self.next_poll - time.time())
+
+            if timeout is None or remaining < timeout:
+                timeout = remaining
+
+        since = self.last_read
+        self.last_read = time.time_ns()
+
+        events = self.inotify.read_events(timeout)
+
+        # Rescan for the changes that were lost if the queue overflowed (allowing for the
+        # granularity of the timestamps of the file-system)
+        if self.process_events(events, changes):
+            self.overflows += 1
+            self.rescan(since - 1000000000, changes)
+
+        if self.polled and time.time() >= self.next_poll:
+            self.poll(changes)
+            self.next_poll = time.time() + self.poll_interval
+
+        return changes
+
+    def get_stats(self):
+        """
+        Get the statistics on the watches.
+        """
+
+        stats = collections.OrderedDict()
+
+        stats['watched_directories'] = len(self.watches)
+        stats['polled_subtrees'] = len(self.polled)
+        stats['unpolled_subtrees'] = len(self.unpolled)
+        stats['watch_overflows'] = self.overflows
+
+        return stats
@@ -1,7 +1,13 @@
 import collections
+from concurrent.futures import Future, ThreadPoolExecutor
 import hashlib
 from io import open
+import json
+import logging
 import re
+import sqlite3
+import stat
+import threading
 import time
 
 import os
@@ -11,7 +17,23 @@ path_to_mod_input_lib = os.path.join(os.path.dirname(
     os.path.abspath(__file__)), 'modular_input.zip')
 sys.path.insert(0, path_to_mod_input_lib)
 
-from modular_input import ModularInput, DurationField, BooleanField, IntegerField, WildcardField, Field, FieldValidationException
+from modular_input import ModularInput, DurationField, BooleanField, IntegerField, ListField, StaticListField, Field, FieldValidationException
+from modular_input.secure_password import get_secure_password
+from file_info_app.checkpoint_store import CheckpointStore
+from file_info_app.filters import DirectoryFilter, PathFilter
+from file_info_app.hash_cache import HashCache
+from file_info_app.hashing import FileHasher
+from file_info_app.hec import HECError, HECEventSerializer, HECEventSink
+from file_info_app.identity import IdentityCache
+from file_info_app.manifest import FileManifest
+from file_info_app.records import FileRecord, TIME_STAT_FIELDS, IDENTITY_FIELDS, NIX_ACL_FIELDS
+from file_info_app.serialization import XMLEventSerializer, JSONEventSerializer, EventBatcher
+from file_info_app.sharding import ShardedScan
+from file_info_app.telemetry import ScanTelemetry
+from file_info_app.throttle import IOGovernor
+from file_info_app.traversal import walk_entries, parallel_walk_entries, count_entries, \
+    list_directory, is_symlink, get_pending_directories
+from file_info_app.watcher import Inotify, TreeWatcher
 
 try:
     import win32security
@@ -112,11 +134,55 @@ class DataSizeField(Field):
         return str(value)
 
 
+class HashAlgorithmsField(ListField):
+    """
+    Represents a list of hash algorithms (e.g. "sha256,md5").
+
+    The names are normalized to lower-case and checked to make sure that they are supported.
+    """
+
+    def to_python(self, value, session_key=None):
+        values = ListField.to_python(self, value, session_key)
+
+        algorithms = []
+
+        for algorithm in values:
+            algorithm = algorithm.strip().lower()
+
+            if len(algorithm) == 0:
+                continue
+
+            try:
+                FileHasher.new_hash(algorithm)
+            except ValueError:
+                raise FieldValidationException(
+                    "The hash algorithm '%s' for the '%s' parameter is not supported" % (algorithm, self.name))
+
+            if algorithm not in algorithms:
+                algorithms.append(algorithm)
+
+        if len(algorithms) == 0:
+            return None
+
+        return algorithms
+
+
 class FileMetaDataModularInput(ModularInput):
     """
     The file meta-data modular input retrieves file meta-data into Splunk.
     """
 
+    # How long to wait (in seconds) for the related changes when watching for changes
+    WATCH_DELAY = 1
+
+    # How long to wait (in seconds) before sending the changes again if the watcher couldn't send
+    # them to the HTTP Event Collector
+    WATCH_RETRY_DELAY = 30
+
+    # The realm of the secure passwords (in storage/passwords) that hold the tokens of the HTTP
+    # Event Collector
+    HEC_TOKEN_REALM = 'file_meta_data_hec'
+
     def __init__(self):
 
         scheme_args = {'title': "File Meta-data",
@@ -138,21 +204,117 @@ class FileMetaDataModularInput(ModularInput):
                           "The interval defining how often to import the feed; can include time units (e.g. 15m for 15 minutes, 8h for 8 hours)",
                           empty_allowed=False),
             BooleanField("include_file_hash", "Compute file hash",
-                         "Compute a hash on the file (SHA224)", empty_allowed=False),
+                         "Compute a hash on the file (SHA224 unless other algorithms are selected)",
+                         empty_allowed=False),
             DataSizeField("file_hash_limit", "File-size hash limit",
                           "Only include items when one of the time fields is changed",
                           empty_allowed=False),
+            DataSizeField("file_hash_chunk_size", "File hash read size",
+                          "The amount of data to read at a time when computing file hashes",
+                          none_allowed=True, empty_allowed=True),
+            DataSizeField("file_hash_mmap_threshold", "File hash memory-map threshold",
+                          "Files at least this large will be memory-mapped when computing hashes",
+                          none_allowed=True, empty_allowed=True),
+            HashAlgorithmsField("hash_algorithms", "Hash algorithms",
+                                "The hash algorithms to compute (e.g. sha256,md5); defaults to sha224",
+                                none_allowed=True, empty_allowed=True),
+            BooleanField("file_hash_cache", "Cache file hashes",
+                         "Re-use the hashes of files that haven't changed since the last run",
+                         none_allowed=True, empty_allowed=True),
+            IntegerField("hash_workers", "Hashing threads",
+                         "The number of threads to use for computing file hashes concurrently",
+                         none_allowed=True, empty_allowed=True),
+            IntegerField("traversal_workers", "Traversal threads",
+                         "The number of threads to use for listing directories concurrently",
+                         none_allowed=True, empty_allowed=True),
+            IntegerField("scan_processes", "Scanning processes",
+                         "The number of processes to scan the top-level sub-directories with",
+                         none_allowed=True, empty_allowed=True),
+            DataSizeField("max_read_bytes_per_sec", "Maximum read rate",
+                          "The maximum amount of data to read per second when computing file hashes",
+                          none_allowed=True, empty_allowed=True),
+            IntegerField("max_stat_ops_per_sec", "Maximum metadata operations rate",
+                         "The maximum number of directory listings and stat calls per second",
+                         none_allowed=True, empty_allowed=True),
+            DurationField("max_scan_duration", "Maximum scan duration",
+                          "The amount of time a run can scan for before stopping and resuming on the next run",
+                          none_allowed=True, empty_allowed=True),
             IntegerField("depth_limit", "Depth Limit",
                          "A limit on how many directories deep to get results for",
                          none_allowed=True, empty_allowed=True),
-            WildcardField("file_filter", "File Name Filter",
-                          "A wildcard for which files will be included",
-                          none_allowed=True, empty_allowed=True)
+            DurationField("identity_cache_ttl", "Owner and group name cache duration",
+                          "How long the names of the owners and groups are cached for (e.g. 10m)",
+                          none_allowed=True, empty_allowed=True),
+            StaticListField("output_format", "Output format",
+                            "The format of the events: kv for key=value pairs or json for JSON objects",
+                            none_allowed=True, empty_allowed=True, valid_values=["kv", "json"]),
+            IntegerField("output_batch_size", "Output batch size",
+                         "The maximum number of events to write to Splunk at a time",
+                         none_allowed=True, empty_allowed=True),
+            IntegerField("output_batch_ms", "Output batch time",
+                         "The maximum number of milliseconds to hold events for before writing them",
+                         none_allowed=True, empty_allowed=True),
+            StaticListField("output_mode", "Output destination",
+                            "Where to send the events: stdout to have Splunk read them from the input or hec to send them to an HTTP Event Collector",
+                            none_allowed=True, empty_allowed=True, valid_values=["stdout", "hec"]),
+            Field("hec_url", "HTTP Event Collector URL",
+                  "The URL of the HTTP Event Collector endpoint (e.g. https://splunk.example.com:8088/services/collector/event)",
+                  none_allowed=True, empty_allowed=True),
+            Field("hec_token_name", "HTTP Event Collector token name",
+                  "The name (username) of the secure password in the file_meta_data_hec realm of storage/passwords that holds the token of the HTTP Event Collector",
+                  none_allowed=True, empty_allowed=True),
+            IntegerField("hec_connections", "HTTP Event Collector connections",
+                         "The number of connections to send the events to the HTTP Event Collector over concurrently",
+                         none_allowed=True, empty_allowed=True),
+            BooleanField("hec_verify_ssl", "Verify HTTP Event Collector certificate",
+                         "Verify the certificate of the HTTP Event Collector",
+                         none_allowed=True, empty_allowed=True),
+            BooleanField("telemetry", "Output telemetry",
+                         "Output an event with the performance telemetry of each run (with the file_meta_data:telemetry sourcetype)",
+                         none_allowed=True, empty_allowed=True),
+            BooleanField("watch_mode", "Watch for changes",
+                         "Watch the tree for changes with inotify (Linux only) and output them as they happen; the full scan still runs at the interval",
+                         none_allowed=True, empty_allowed=True),
+            DurationField("watch_poll_interval", "Watch poll interval",
+                          "How often to poll the directories that cannot be watched since the limit on inotify watches was reached (e.g. 1m)",
+                          none_allowed=True, empty_allowed=True),
+            IntegerField("max_entries", "Maximum entries",
+                         "The maximum number of files and directories to scan before stopping with a warning",
+                         none_allowed=True, empty_allowed=True),
+            IntegerField("max_directories", "Maximum directories",
+                         "The maximum number of directories to scan before stopping with a warning",
+                         none_allowed=True, empty_allowed=True),
+            BooleanField("track_changes", "Track changes",
+                         "Only include the items that were created, modified or deleted since the last run",
+                         none_allowed=True, empty_allowed=True),
+            ListField("fields", "Fields",
+                      "A list of the fields to include in the events (all of them are included if empty)",
+                      none_allowed=True, empty_allowed=True, trim_values=True),
+            ListField("file_filter", "File Name Filter",
+                      "A list of wildcards for which files will be included",
+                      none_allowed=True, empty_allowed=True, trim_values=True),
+            ListField("exclude_files", "File Name Exclusions",
+                      "A list of wildcards for which files will be excluded",
+                      none_allowed=True, empty_allowed=True, trim_values=True),
+            ListField("include_dirs", "Directories to include",
+                      "A list of wildcards of the directories to walk (by name or by the path relative to file_path)",
+                      none_allowed=True, empty_allowed=True, trim_values=True),
+            ListField("exclude_dirs", "Directories to exclude",
+                      "A list of wildcards of the directories not to walk (by name or by the path relative to file_path)",
+                      none_allowed=True, empty_allowed=True, trim_values=True)
         ]
 
         ModularInput.__init__(self, scheme_args, args,
                               logger_name='file_meta_data_modular_input')
 
+        # The cache of the owner and group names is kept across runs
+        self.identity_cache = None
+
+        # The watchers of the stanzas in watch mode (keyed by the stanza); each is a tuple of the
+        # TreeWatcher, the thread running it, the event that stops it and the settings it was
+        # started with
+        self.watchers = {}
+
     @classmethod
     def boolean_to_int(cls, boolean):
         """
@@ -166,15 +328,202 @@ class FileMetaDataModularInput(ModularInput):
 
     @classmethod
     def get_files_data(cls, file_path, logger=None, latest_time=None, must_be_later_than=None,
-                       file_hash_limit=0, depth_limit=0, file_filter=None, throw_on_error=False):
+                       file_hash_limit=0, depth_limit=0, file_filter=None, throw_on_error=False,
+                       **kwargs):
         """
         Get the data for the files within the directory.
+
+        This collects all of the records produced by iter_files_data() into a list; use
+        iter_files_data() directly when the records ought to be processed as they are found. Any
+        additional keyword arguments are passed to iter_files_data().
+        """
+
+        scan_info = {}
+
+        results = list(cls.iter_files_data(file_path, logger, latest_time, must_be_later_than,
+                                           file_hash_limit, depth_limit, file_filter,
+                                           throw_on_error, scan_info=scan_info, **kwargs))
+
+        # Return the results and the latest time
+        if scan_info.get('failed', False):
+            return None, scan_info['latest_time']
+        else:
+            return results, scan_info['latest_time']
+
+    @classmethod
+    def iter_files_data(cls, file_path, logger=None, latest_time=None, must_be_later_than=None,
+                        file_hash_limit=0, depth_limit=0, file_filter=None, throw_on_error=False,
+                        scan_info=None, hash_workers=1, file_hasher=None, manifest=None,
+                        traversal_workers=1, governor=None, max_scan_duration=None,
+                        cursor=None, directory_filter=None, max_entries=None,
+                        max_directories=None, identity_cache=None, fields=None, telemetry=None):
+        """
+        Get the data for the files within the directory, yielding each record as soon as it is
+        produced so that the caller doesn't need to hold the entire result set in memory.
+
+        Arguments:
+        scan_info -- A dictionary that will be populated with the state of the scan. Once
+                     iteration completes, it includes the latest time observed ("latest_time"),
+                     the number of files ("file_count") and directories ("directory_count")
+                     observed, the number of directories skipped by the directory_filter
+                     ("skipped_directories"), whether the scan failed ("failed"), the cursor
+                     for resuming the scan if it was stopped early ("cursor"; None if the scan is
+                     complete) and the name of the limit that stopped the scan
+                     ("limit_reached"; None if no limit was reached).
+        hash_workers -- The number of threads to use for computing file hashes; the records are
+                        still returned in the order they were found
+        file_hasher -- The FileHasher to compute file hashes with
+        manifest -- A FileManifest; if provided, only the paths that were created or modified
+                    since the last run will be returned (see iter_deleted_files_data() for the
+                    paths that were deleted)
+        traversal_workers -- The number of threads to use for listing directories; the records
+                             are still returned in the same order
+        governor -- An IOGovernor to limit the rate of the directory listings and stat calls
+                    with (the rate of reading files is limited by the file_hasher's governor)
+        max_scan_duration -- The number of seconds after which the scan will stop (once the
+                             directory being processed is complete); the root directory's record
+                             is only returned once the entire tree has been scanned
+        cursor -- The cursor from the scan_info of a scan that was stopped early; the scan will
+                  resume where it left off (with the same must_be_later_than)
+        directory_filter -- A DirectoryFilter; the sub-directories it excludes are pruned from
+                            the walk so that nothing within them is listed or stat'ed
+        max_entries -- The maximum number of entries (files and directories) to scan; if the
+                       limit is reached, the scan stops with a warning record (instead of the
+                       root directory's record)
+        max_directories -- The maximum number of directories to scan (see max_entries)
+        identity_cache -- The IdentityCache to resolve the names of the owners and groups with
+        fields -- A set of the names of the fields to include in the records (see
+                  get_file_data())
+        telemetry -- A ScanTelemetry to add the timings and counts of the scan to
         """
 
-        results = []
+        if scan_info is None:
+            scan_info = {}
+
+        # Share a single hasher across the scan so that its buffers are re-used
+        if file_hasher is None:
+            file_hasher = FileHasher()
+
+        # Share a single cache of the owner and group names across the scan
+        if identity_cache is None:
+            identity_cache = IdentityCache()
 
-        total_file_count = 0
-        total_dir_count = 0
+        # Make the pool of threads for computing hashes if more than one is requested
+        hash_executor = None
+
+        if hash_workers is not None and hash_workers > 1 and file_hash_limit is not None and \
+           file_hash_limit > 0:
+            hash_executor = ThreadPoolExecutor(max_workers=hash_workers)
+
+        results = cls._iter_files_data(file_path, logger, latest_time, must_be_later_than,
+                                       file_hash_limit, depth_limit, file_filter, throw_on_error,
+                                       scan_info, hash_executor, file_hasher, manifest,
+                                       traversal_workers, governor, max_scan_duration, cursor,
+                                       directory_filter, max_entries, max_directories,
+                                       identity_cache, fields, telemetry)
+
+        try:
+            if hash_executor is not None:
+                results = cls.complete_file_hashes(results, hash_workers * 4)
+
+            for result in results:
+                yield result
+
+        finally:
+            results.close()
+
+            if hash_executor is not None:
+                hash_executor.shutdown(wait=True)
+
+    @classmethod
+    def complete_file_hashes(cls, results, max_pending):
+        """
+        Wait for the hashes that are being computed in the background to complete and yield the
+        records in the same order that they were provided.
+
+        Arguments:
+        results -- An iterable of records where the hashes may be a Future
+        max_pending -- The maximum number of records to hold while waiting on the hashes
+        """
+
+        pending = collections.deque()
+
+        try:
+            for result in results:
+                pending.append(result)
+
+                while len(pending) > max_pending:
+                    yield cls.complete_file_hash(pending.popleft())
+
+            while pending:
+                yield cls.complete_file_hash(pending.popleft())
+
+        finally:
+            # Cancel the hashes of any records that will not be returned
+            for result in pending:
+                for value in result.values():
+                    if isinstance(value, Future):
+                        value.cancel()
+
+            if hasattr(results, 'close'):
+                results.close()
+
+    @classmethod
+    def complete_file_hash(cls, result):
+        """
+        Wait for the hashes of the given record if they are being computed in the background.
+
+        Arguments:
+        result -- The record that may include hashes that are being computed (each hash field
+                  will be the same Future that returns a dictionary of the hashes)
+        """
+
+        for name, value in list(result.items()):
+            if isinstance(value, Future):
+                file_hashes = value.result()
+
+                if file_hashes is not None and name in file_hashes:
+                    result[name] = file_hashes[name]
+                else:
+                    del result[name]
+
+        return result
+
+    @classmethod
+    def _iter_files_data(cls, file_path, logger, latest_time, must_be_later_than, file_hash_limit,
+                         depth_limit, file_filter, throw_on_error, scan_info, hash_executor,
+                         file_hasher, manifest, traversal_workers, governor, max_scan_duration,
+                         cursor, directory_filter, max_entries, max_directories,
+                         identity_cache, fields, telemetry):
+        """
+        Walk the directory and yield the records. See iter_files_data().
+        """
+
+        # Resume from where the previous scan stopped (if it did)
+        if cursor is not None:
+            stack = [(path, None) for path in reversed(cursor['pending'])]
+            total_file_count = cursor['file_count']
+            total_dir_count = cursor['directory_count']
+            root_counts = cursor['root_counts']
+            must_be_later_than = cursor['must_be_later_than']
+        else:
+            stack = [(file_path, None)]
+            total_file_count = 0
+            total_dir_count = 0
+            root_counts = None
+
+        # Determine when to stop if the duration of the scan is limited
+        if max_scan_duration is not None and max_scan_duration > 0:
+            deadline = time.time() + max_scan_duration
+        else:
+            deadline = None
+
+        # List the directories on a pool of threads if more than one is requested
+        if traversal_workers is not None and traversal_workers > 1:
+            entries = parallel_walk_entries(file_path, traversal_workers, file_filter, governor,
+                                            stack)
+        else:
+            entries = walk_entries(file_path, governor, stack)
 
         if latest_time is not None:
             latest_time_derived = latest_time
@@ -183,66 +532,221 @@ class FileMetaDataModularInput(ModularInput):
 
         this_latest_time = None
 
+        scan_info['latest_time'] = latest_time_derived
+        scan_info['failed'] = False
+        scan_info['cursor'] = None
+        scan_info['skipped_directories'] = 0
+        scan_info['limit_reached'] = None
+
         try:
 
-            # Get the information
-            for root, dirs, files in os.walk(file_path, topdown=True):
+            # The depth is computed from the number of separators since the paths of the
+            # sub-directories are made by joining their names onto the path of the root
+            file_path_depth = file_path.rstrip(os.sep).count(os.sep)
 
-                file_path_depth = os.path.normpath(file_path).count(os.sep)
-                current_depth = os.path.normpath(root).count(os.sep)
-                current_depth_relative = current_depth - file_path_depth
+            directories_scanned = 0
+            entries_scanned = 0
 
-                # Stop if we hit the depth limit
-                if depth_limit is None or depth_limit <= 0 or current_depth_relative < depth_limit:
+            # Time the listing of the directories
+            if telemetry is not None:
+                walked_entries = telemetry.iter_timed('walk', entries)
+            else:
+                walked_entries = entries
+
+            # Get the information
+            for root, root_entry, dirs, files in walked_entries:
+
+                # Stop if the time budget was used up (but only once some progress was made); the
+                # directories that remain are saved in the cursor so that the scan can be resumed
+                if deadline is not None and directories_scanned > 0 and time.time() >= deadline:
+                    scan_info['cursor'] = {
+                        'file_path': file_path,
+                        'pending': [root] + get_pending_directories(stack),
+                        'file_count': total_file_count,
+                        'directory_count': total_dir_count,
+                        'root_counts': root_counts,
+                        'must_be_later_than': must_be_later_than
+                    }
+
+                    return
+
+                if dirs is not None:
+                    counts = (len(files), len(dirs))
+                else:
+                    counts = None
 
-                    for name in files:
+                # Stop if the scan is larger than allowed
+                if max_directories is not None and max_directories > 0 and \
+                   directories_scanned >= max_directories:
+                    scan_info['limit_reached'] = 'max_directories'
 
-                        # Continue only if the files matches the filter (if one is defined)
-                        if file_filter is None or file_filter.match(os.path.join(root, name)):
+                elif max_entries is not None and max_entries > 0 and counts is not None and \
+                     entries_scanned + sum(counts) > max_entries:
+                    scan_info['limit_reached'] = 'max_entries'
 
-                            info, this_latest_time = cls.get_file_data(os.path.join(root, name),
-                                                                       logger, latest_time_derived,
-                                                                       must_be_later_than,
-                                                                       file_hash_limit)
+                if scan_info['limit_reached'] is not None:
+                    if logger:
+                        logger.warning('Scan stopped since the limit was reached, limit=%s, '
+                                       'path="%s", directories_scanned=%i, entries_scanned=%i',
+                                       scan_info['limit_reached'], file_path, directories_scanned,
+                                       entries_scanned)
 
-                            if info is not None:
-                                results.append(info)
+                    yield cls.get_limit_reached_data(file_path, scan_info['limit_reached'],
+                                                     max_entries, max_directories,
+                                                     directories_scanned, entries_scanned)
+                    return
 
-                            if this_latest_time is not None:
-                                latest_time_derived = this_latest_time
+                directories_scanned += 1
 
-                    # Sum up the file count
-                    total_file_count += len(files)
+                if counts is not None:
+                    entries_scanned += sum(counts)
 
-                    for name in dirs:
-                        info, this_latest_time = cls.get_file_data(os.path.join(root, name),
+                if root == file_path:
+                    current_depth_relative = 0
+                else:
+                    current_depth_relative = root.count(os.sep) - file_path_depth
+
+                # Determine if the directory is included or only walked to reach the directories
+                # within it that are
+                if directory_filter is not None:
+                    directory_state = directory_filter.get_state(root)
+                else:
+                    directory_state = DirectoryFilter.INCLUDED
+
+                # The root directory is handled once the walk is done so that the totals can be
+                # included
+                if current_depth_relative == 0:
+                    root_counts = counts
+
+                # Include the directory itself now that its contents are known (unless it is
+                # beyond the depth limit)
+                elif directory_state == DirectoryFilter.INCLUDED and \
+                     (depth_limit is None or depth_limit <= 0 or current_depth_relative <= depth_limit):
+
+                    info, this_latest_time = cls.get_file_data(root, logger, latest_time_derived,
+                                                               must_be_later_than,
+                                                               file_hash_limit,
+                                                               hash_executor=hash_executor,
+                                                               file_hasher=file_hasher,
+                                                               manifest=manifest,
+                                                               governor=governor,
+                                                               identity_cache=identity_cache,
+                                                               fields=fields,
+                                                               telemetry=telemetry,
+                                                               dir_entry=root_entry,
+                                                               child_counts=counts)
+
+                    if this_latest_time is not None:
+                        latest_time_derived = this_latest_time
+                        scan_info['latest_time'] = latest_time_derived
+
+                    if info is not None:
+                        yield info
+
+                # Stop if the directory couldn't be listed
+                if dirs is None:
+                    if telemetry is not None:
+                        telemetry.increment('walk_errors')
+
+                    continue
+
+                # Prune the sub-directories that are excluded so that they are not walked
+                if directory_filter is not None:
+                    walked_dirs = [entry for entry in dirs
+                                   if directory_filter.get_state(entry.path) != DirectoryFilter.EXCLUDED]
+
+                    scan_info['skipped_directories'] += len(dirs) - len(walked_dirs)
+                    dirs[:] = walked_dirs
+
+                # Stop if we hit the depth limit; the sub-directories are pruned so that the walk
+                # doesn't descend into them (the sub-directories at the limit are still walked so
+                # that their records are included)
+                if depth_limit is not None and depth_limit > 0 and \
+                   current_depth_relative >= depth_limit:
+                    del dirs[:]
+                    continue
+
+                for entry in files:
+
+                    # Continue only if the files matches the filter (if one is defined) and
+                    # the directory is included
+                    if directory_state == DirectoryFilter.INCLUDED and \
+                       (file_filter is None or file_filter.match(entry.path)):
+
+                        info, this_latest_time = cls.get_file_data(entry.path,
                                                                    logger, latest_time_derived,
                                                                    must_be_later_than,
-                                                                   file_hash_limit)
+                                                                   file_hash_limit,
+                                                                   hash_executor=hash_executor,
+                                                                   file_hasher=file_hasher,
+                                                                   manifest=manifest,
+                                                                   governor=governor,
+                                                                   identity_cache=identity_cache,
+                                                                   fields=fields,
+                                                                   telemetry=telemetry,
+                                                                   dir_entry=entry)
+
+                        if this_latest_time is not None:
+                            latest_time_derived = this_latest_time
+                            scan_info['latest_time'] = latest_time_derived
 
                         if info is not None:
-                            results.append(info)
+                            yield info
+
+                # Sum up the file count
+                total_file_count += len(files)
+
+                # Symbolic links to directories won't be walked so include them here
+                for entry in dirs:
+                    if entry.is_symlink() and (directory_filter is None or \
+                       directory_filter.get_state(entry.path) == DirectoryFilter.INCLUDED):
+                        info, this_latest_time = cls.get_file_data(entry.path,
+                                                                   logger, latest_time_derived,
+                                                                   must_be_later_than,
+                                                                   file_hash_limit,
+                                                                   hash_executor=hash_executor,
+                                                                   file_hasher=file_hasher,
+                                                                   manifest=manifest,
+                                                                   governor=governor,
+                                                                   identity_cache=identity_cache,
+                                                                   fields=fields,
+                                                                   telemetry=telemetry,
+                                                                   dir_entry=entry)
 
                         if this_latest_time is not None:
                             latest_time_derived = this_latest_time
+                            scan_info['latest_time'] = latest_time_derived
+
+                        if info is not None:
+                            yield info
+
+                # Sum up the directory count (including those that were pruned)
+                total_dir_count += counts[1]
 
-                    # Sum up the directory count
-                    total_dir_count += len(dirs)
+            scan_info['file_count'] = total_file_count
+            scan_info['directory_count'] = total_dir_count
 
             # Handle the root directory too
             root_result, latest_time_derived = cls.get_file_data(file_path, logger,
                                                                  latest_time_derived,
                                                                  must_be_later_than,
-                                                                 file_hash_limit)
+                                                                 file_hash_limit,
+                                                                 hash_executor=hash_executor,
+                                                                 file_hasher=file_hasher,
+                                                                 manifest=manifest,
+                                                                 governor=governor,
+                                                                 identity_cache=identity_cache,
+                                                                 fields=fields,
+                                                                 telemetry=telemetry,
+                                                                 child_counts=root_counts)
+
+            scan_info['latest_time'] = latest_time_derived
 
             if root_result is not None:
                 root_result['file_count_recursive'] = total_file_count
                 root_result['directory_count_recursive'] = total_dir_count
-                results.append(root_result)
+                yield root_result
 
-            # Return the results and the latest time
-            return results, latest_time_derived
-        
         except Exception as exception:
 
             # General exception when attempting to proess this path
@@ -250,30 +754,176 @@ class FileMetaDataModularInput(ModularInput):
                 logger.exception('Error when processing path="%s", reason="%s"', file_path,
                                  str(exception))
 
+            scan_info['failed'] = True
+
             if throw_on_error:
                 raise exception
 
-            return None, latest_time_derived
+        finally:
+            entries.close()
 
     @classmethod
-    def get_file_hash(cls, file_path, logger=None):
+    def get_limit_reached_data(cls, file_path, limit, max_entries, max_directories,
+                               directories_scanned, entries_scanned):
         """
-        Get the hash for the given file.
+        Get the warning record noting that the scan was stopped since it reached a limit.
+
+        Arguments:
+        file_path -- The path that was being scanned
+        limit -- The name of the limit that was reached ("max_entries" or "max_directories")
+        max_entries -- The limit on the number of entries
+        max_directories -- The limit on the number of directories
+        directories_scanned -- The number of directories scanned before stopping
+        entries_scanned -- The number of entries scanned before stopping
         """
 
-        try:
+        result = collections.OrderedDict()
 
-            sha224 = hashlib.sha224()
+        result['path'] = file_path
+        result['warning'] = 'The scan was stopped since it reached the %s limit' % limit
+        result['limit_reached'] = limit
+
+        if limit == 'max_entries':
+            result['limit'] = max_entries
+        else:
+            result['limit'] = max_directories
 
-            with open(file_path, 'rb') as file:
-                sha224.update(file.read())
+        result['directories_scanned'] = directories_scanned
+        result['entries_scanned'] = entries_scanned
+
+        return result
+
+    @classmethod
+    def iter_deleted_files_data(cls, manifest):
+        """
+        Yield a record for each of the paths in the manifest that were not observed in the scan
+        (because they were deleted). This should only be called once an entire scan is complete.
+
+        Arguments:
+        manifest -- The FileManifest that was used for the scan
+        """
 
-            return sha224.hexdigest()
+        for path, signature in manifest.get_deleted():
+            result = collections.OrderedDict()
+
+            result['is_directory'] = cls.boolean_to_int(manifest.is_directory(signature))
+            result['path'] = path
+            result['action'] = FileManifest.DELETED
+
+            yield result
+
+    @classmethod
+    def iter_watch_records(cls, changes, logger=None, file_hash_limit=0, file_filter=None,
+                           directory_filter=None, file_hasher=None, governor=None,
+                           identity_cache=None, fields=None, deleted_directories=None):
+        """
+        Yield the records for the paths that a TreeWatcher observed changes to (in the same form
+        as the records of the scan with the action added).
+
+        Arguments:
+        changes -- A dictionary of the paths that changed and the action (created, modified or
+                   deleted)
+        file_filter -- A filter of the files to include
+        directory_filter -- A DirectoryFilter; only the paths within the directories it includes
+                            are output
+        file_hasher -- The FileHasher to compute the file hashes with
+        governor -- An IOGovernor to limit the rate of the stat calls with
+        identity_cache -- The IdentityCache to resolve the names of the owners and groups with
+        fields -- A set of the names of the fields to include (see get_file_data())
+        deleted_directories -- A set of the deleted paths that were directories (see
+                               TreeWatcher.deleted_directories)
+        """
+
+        for path, action in changes.items():
+
+            if directory_filter is not None and \
+               directory_filter.get_state(os.path.dirname(path)) != DirectoryFilter.INCLUDED:
+                continue
+
+            # The filter doesn't apply to directories (like in the scan); the deleted paths can't be
+            # stat'ed so the watcher's record of which were directories is used for them
+            if action == FileManifest.DELETED:
+                if file_filter is None or file_filter.match(path) or \
+                   (deleted_directories is not None and path in deleted_directories):
+                    result = collections.OrderedDict()
+
+                    result['path'] = path
+                    result['action'] = action
+
+                    yield result
+
+                continue
+
+            # Skip the files that don't match the filter before getting their information (so
+            # that they aren't hashed)
+            if file_filter is not None and not file_filter.match(path) and \
+               not os.path.isdir(path):
+                continue
+
+            result, _ = cls.get_file_data(path, logger, file_hash_limit=file_hash_limit,
+                                          file_hasher=file_hasher, governor=governor,
+                                          identity_cache=identity_cache, fields=fields)
+
+            # The path may have been removed since
+            if result is None:
+                continue
+
+            result.action = action
+
+            yield result
+
+    @classmethod
+    def get_file_hash(cls, file_path, logger=None, file_hasher=None, stat_info=None):
+        """
+        Get the hash for the given file. If the hasher computes several algorithms, this returns
+        the hash of the first one; use get_file_hashes() to get all of them.
+
+        Arguments:
+        file_path -- The path of the file to hash
+        logger -- The logger to log failures to
+        file_hasher -- The FileHasher to use (one with the default settings will be used if None)
+        stat_info -- The result of os.stat() for the file (allows cached hashes to be used)
+        """
+
+        if file_hasher is None:
+            file_hasher = FileHasher()
+
+        file_hashes = cls.get_file_hashes(file_path, logger, file_hasher, stat_info)
+
+        if file_hashes is not None:
+            return file_hashes[file_hasher.algorithms[0]]
+
+        return None
+
+    @classmethod
+    def get_file_hashes(cls, file_path, logger=None, file_hasher=None, stat_info=None,
+                        telemetry=None):
+        """
+        Get the hashes for the given file as a dictionary keyed by the algorithm. The file is only
+        read once regardless of how many algorithms are computed.
+
+        Arguments:
+        file_path -- The path of the file to hash
+        logger -- The logger to log failures to
+        file_hasher -- The FileHasher to use (one with the default settings will be used if None)
+        stat_info -- The result of os.stat() for the file (allows cached hashes to be used)
+        telemetry -- A ScanTelemetry to count the failures with
+        """
+
+        try:
+
+            if file_hasher is None:
+                file_hasher = FileHasher()
+
+            return file_hasher.hash_file(file_path, stat_info)
         except:
             if logger:
                 logger.exception(
                     "Unable to compute the file hash, path=%r", file_path)
 
+            if telemetry is not None:
+                telemetry.increment('hash_errors')
+
             return None
 
     @classmethod
@@ -288,9 +938,12 @@ class FileMetaDataModularInput(ModularInput):
         return original_string
 
     @classmethod
-    def get_nix_acl_data(cls, file_path, stat_info=None):
+    def get_nix_acl_data(cls, file_path, stat_info=None, identity_cache=None):
         """
         Get the Unix ACL data for the given path.
+
+        Arguments:
+        identity_cache -- The IdentityCache to resolve the names of the owner and group with
         """
 
         # Stop if this isn't Unix
@@ -303,19 +956,43 @@ class FileMetaDataModularInput(ModularInput):
             stat_info = os.stat(file_path)
 
         # Get the owner
-        output['owner_uid'] = pwd.getpwuid(stat_info.st_uid)[0]
-        output['owner'] = pwd.getpwuid(stat_info.st_uid)[0]
+        owner, group = cls.get_nix_owner_and_group(stat_info, identity_cache)
+
+        output['owner_uid'] = stat_info.st_uid
+        output['owner'] = owner
 
         # Get the group
         output['group_uid'] = stat_info.st_gid
-        # This is disabled because grp isn't available on Splunk's python
-        # output['group'] = grp.getgrgid(stat_info.st_gid)[0]
+
+        if group is not None:
+            output['group'] = group
 
         # Get the permissions
         output['permission_mask'] = oct(stat_info.st_mode & 0o777)
 
         return output
 
+    @classmethod
+    def get_nix_owner_and_group(cls, stat_info, identity_cache=None):
+        """
+        Get the names of the owner (the uid if it cannot be resolved) and group (None if it
+        cannot be resolved) of the file.
+
+        Arguments:
+        stat_info -- The result of os.stat() for the file
+        identity_cache -- The IdentityCache to resolve the names of the owner and group with
+        """
+
+        if identity_cache is None:
+            identity_cache = IdentityCache()
+
+        owner = identity_cache.get_user_name(stat_info.st_uid)
+
+        if owner is None:
+            owner = str(stat_info.st_uid)
+
+        return owner, identity_cache.get_group_name(stat_info.st_gid)
+
     @classmethod
     def get_windows_acl_data(cls, file_path, add_as_mv=True):
         """
@@ -426,103 +1103,170 @@ class FileMetaDataModularInput(ModularInput):
 
     @classmethod
     def get_file_data(cls, file_path, logger=None, latest_time=None, must_be_later_than=None,
-                      file_hash_limit=0):
+                      file_hash_limit=0, dir_entry=None, child_counts=None, hash_executor=None,
+                      file_hasher=None, manifest=None, governor=None, identity_cache=None,
+                      fields=None, telemetry=None):
         """
         Get the data for this specific file.
+
+        Arguments:
+        hash_executor -- An executor to compute the file hashes with; if provided, the hashes
+                         will be a Future that can be resolved with complete_file_hash()
+        file_hasher -- The FileHasher to compute the file hash with
+        dir_entry -- The os.DirEntry for the path if it was obtained from os.scandir(); the
+                     cached type and stat information will be used instead of querying the
+                     file-system again
+        child_counts -- A tuple of the number of files and directories within the directory if
+                        they are already known (they will be determined otherwise)
+        governor -- An IOGovernor to limit the rate of the stat calls with
+        identity_cache -- The IdentityCache to resolve the names of the owner and group with
+        fields -- A set of the names of the fields to include in the record (all of them are
+                  included if None); the work needed for the other fields (such as listing the
+                  directory, hashing the file and looking up the ACLs) is skipped
+        telemetry -- A ScanTelemetry to add the timings of the stat call and the ACL lookups
+                     (and the failures) to
         """
 
         try:
-            result = collections.OrderedDict()
-
-            # Determine if the file is a directory
-            is_directory = os.path.isdir(file_path)
-            result['is_directory'] = cls.boolean_to_int(is_directory)
+            if governor is not None:
+                governor.consume_stat()
 
-            if is_directory:
-                try:
-                    _, dirs, files = next(os.walk(file_path))
+            if telemetry is not None:
+                start = time.perf_counter()
 
-                    result['file_count'] = len(files)
-                    result['directory_count'] = len(dirs)
+            # Get the meta-data
+            if dir_entry is not None:
+                stat_info = dir_entry.stat()
+                is_directory = dir_entry.is_dir()
+            else:
+                stat_info = os.stat(file_path)
+                is_directory = stat.S_ISDIR(stat_info.st_mode)
 
-                except StopIteration:
-                    # Unable to access this directory
-                    logger.info(
-                        'Unable to get the list of files for directory="%s"', file_path)
+            if telemetry is not None:
+                telemetry.add_stat(time.perf_counter() - start, is_directory)
 
             # Get the absolute path
-            result['path'] = os.path.abspath(file_path)
+            absolute_path = os.path.abspath(file_path)
 
-            # Get the meta-data
-            stat_info = os.stat(file_path)
+            # Skip the path if it hasn't changed since the last run
+            if manifest is not None:
+                action = manifest.check(absolute_path, stat_info)
+
+                if action is None:
+                    return None, latest_time
+
+            # Make the record; the fields from the stat results are formatted when it is serialized
+            result = FileRecord(absolute_path, stat_info, is_directory, fields)
+
+            if is_directory and FileRecord.is_any_field_requested(fields, ('file_count',
+                                                                           'directory_count')):
+                if child_counts is None:
+                    try:
+                        if governor is not None:
+                            governor.consume_stat()
+
+                        child_counts = count_entries(file_path)
+                    except OSError:
+                        # Unable to access this directory
+                        if logger:
+                            logger.info('Unable to get the list of files for directory="%s"',
+                                        file_path)
 
-            # Get the file hash
+                if child_counts is not None:
+                    result.file_count, result.directory_count = child_counts
+
+            if manifest is not None:
+                result.action = action
+
+            # Get the file hashes
             if not is_directory and file_hash_limit > 0 and stat_info.st_size <= file_hash_limit:
 
-                # Try to get the hash
-                file_hash = cls.get_file_hash(file_path, logger)
+                if file_hasher is None:
+                    file_hasher = FileHasher()
+
+                # Don't read the file if none of the hashes were requested
+                if not FileRecord.is_any_field_requested(fields, file_hasher.algorithms):
+                    pass
+
+                # Compute the hashes in the background if we have threads for doing so; each of
+                # the fields will refer to the same Future until complete_file_hash() is called
+                elif hash_executor is not None:
+                    file_hashes = hash_executor.submit(cls.get_file_hashes, file_path, logger,
+                                                       file_hasher, stat_info, telemetry)
+
+                    result.hashes = collections.OrderedDict()
+
+                    for algorithm in file_hasher.algorithms:
+                        result.hashes[algorithm] = file_hashes
+
+                # Otherwise, try to get the hashes now
+                else:
+                    file_hashes = cls.get_file_hashes(file_path, logger, file_hasher, stat_info,
+                                                      telemetry)
+
+                    # Insert the results if we got them
+                    if file_hashes is not None:
+                        result.hashes = collections.OrderedDict()
 
-                # Insert the result if we got one
-                if file_hash is not None:
-                    result["sha224"] = file_hash
+                        for algorithm in file_hasher.algorithms:
+                            result.hashes[algorithm] = file_hashes[algorithm]
 
             # By default, assume the item is not later than the latest_time parameter unless we
             # prove otherwise
             is_item_later_than_latest_date = False
 
-            for attribute in dir(stat_info):
-                if attribute.startswith("st_"):
- 
-                    if 'time' in attribute:
-                        # Try to get the ctime if the type is valid
-                        try:
-                            result[attribute[3:]] = time.ctime(getattr(stat_info, attribute))
-                        except Exception as exception:
-                            # This is likely a string or a value with millseconds; include it as whatever value it is
-                            result[attribute[3:]] = getattr(stat_info, attribute)
-                        
-                        # Save the latest value of the time field
-                        if latest_time is not None and getattr(stat_info, attribute) > latest_time:
-                            latest_time = getattr(stat_info, attribute)
-
-                        # Determine if any of the modification or creation times are later than
-                        # the filter
-                        if must_be_later_than is not None and attribute != "st_atime" and getattr(stat_info, attribute) != None and getattr(stat_info, attribute) > must_be_later_than:
-                            if logger:
-                                logger.info("Time is later than filter, %s=%r, must_be_later_than=%r, path=%r", attribute, getattr(
-                                    stat_info, attribute), must_be_later_than, file_path)
-                            is_item_later_than_latest_date = True
- 
-                        # Include the time in raw format
-                        result[attribute[3:] +
-                               "_epoch"] = getattr(stat_info, attribute)
-                        
-                    else:
-                        result[attribute[3:]] = getattr(stat_info, attribute)
+            for attribute in TIME_STAT_FIELDS:
+                value = getattr(stat_info, attribute)
+
+                # Save the latest value of the time field
+                if latest_time is not None and value > latest_time:
+                    latest_time = value
 
-            # Get the Windows ACL info (if we can)
+                # Determine if any of the modification or creation times are later than the filter
+                if must_be_later_than is not None and attribute != "st_atime" and value != None and value > must_be_later_than:
+                    if logger:
+                        logger.info("Time is later than filter, %s=%r, must_be_later_than=%r, path=%r",
+                                    attribute, value, must_be_later_than, file_path)
+                    is_item_later_than_latest_date = True
+
+            # Get the Windows ACL info (if we can and it is needed)
             windows_acl_info = None
 
+            if telemetry is not None:
+                start = time.perf_counter()
+
             try:
-                cls.get_windows_acl_data(file_path)
+                if FileRecord.is_windows_acl_requested(fields):
+                    windows_acl_info = cls.get_windows_acl_data(file_path)
             except Exception as exception:
-                logger.warn(
-                    "Unable to get the ACL data, reason=%s", str(exception))
+                if logger:
+                    logger.warn("Unable to get the ACL data, reason=%s", str(exception))
+
+                if telemetry is not None:
+                    telemetry.increment('acl_errors')
 
             if windows_acl_info is not None:
-                result.update(windows_acl_info)
+                result.acl = windows_acl_info
 
-            # Get the Unix ACL info (if we can)
-            nix_acl_info = None
+            # Get the Unix ACL info (if we can); only the names of the owner and group are stored
+            # since the rest is derived from the stat results (the names aren't looked up unless
+            # they are needed)
+            if nix_import_available and FileRecord.is_any_field_requested(fields, NIX_ACL_FIELDS):
+                try:
+                    if FileRecord.is_any_field_requested(fields, IDENTITY_FIELDS):
+                        result.set_identity(*cls.get_nix_owner_and_group(stat_info,
+                                                                         identity_cache))
+                    else:
+                        result.set_identity('', None)
+                except Exception as exception:
+                    if logger:
+                        logger.warn("Unable to get the ACL data, reason=%s", str(exception))
 
-            try:
-                cls.get_nix_acl_data(file_path, stat_info=stat_info)
-            except Exception as exception:
-                logger.warn(
-                    "Unable to get the ACL data, reason=%s", str(exception))
+                    if telemetry is not None:
+                        telemetry.increment('acl_errors')
 
-            if nix_acl_info is not None:
-                result.update(nix_acl_info)
+            if telemetry is not None:
+                telemetry.add_time('acl', time.perf_counter() - start)
 
             # Return both the result and the latest time if items passed the filter
             if must_be_later_than is None or is_item_later_than_latest_date:
@@ -538,6 +1282,9 @@ class FileMetaDataModularInput(ModularInput):
                 logger.warn('Unable to access path="%s", reason="%s"',
                             file_path, str(exception))
 
+            if telemetry is not None:
+                telemetry.increment('stat_errors')
+
             return None, latest_time
 
         except Exception as exception:
@@ -548,7 +1295,8 @@ class FileMetaDataModularInput(ModularInput):
 
             return None, latest_time
 
-    def save_checkpoint(self, checkpoint_dir, stanza, last_run, latest_file_system_date):
+    def save_checkpoint(self, checkpoint_dir, stanza, last_run, latest_file_system_date,
+                        scan_cursor=None):
         """
         Save the checkpoint state.
 
@@ -557,13 +1305,15 @@ class FileMetaDataModularInput(ModularInput):
         stanza -- The stanza of the input being used
         last_run -- The time when the analysis was last performed
         latest_file_system_date -- The latest date observed on the file-system
+        scan_cursor -- The cursor for resuming a scan that was stopped early
         """
 
         self.save_checkpoint_data(checkpoint_dir,
                                   stanza,
                                   {
                                       'last_run': last_run,
-                                      'latest_file_system_date': latest_file_system_date
+                                      'latest_file_system_date': latest_file_system_date,
+                                      'scan_cursor': scan_cursor
                                   })
 
     def get_latest_file_system_date(self, checkpoint_dir, stanza):
@@ -582,6 +1332,649 @@ class FileMetaDataModularInput(ModularInput):
         else:
             return 0
 
+    def get_checkpoint_store_file_path(self, checkpoint_dir, stanza):
+        """
+        Get the path of the database that the per-path state (the hash cache and the manifest) is
+        stored in (next to the checkpoint).
+
+        Arguments:
+        checkpoint_dir -- The directory where checkpoints ought to be saved
+        stanza -- The stanza of the input being used
+        """
+
+        return os.path.splitext(self.get_file_path(checkpoint_dir, stanza))[0] + "_state.sqlite"
+
+    @classmethod
+    def get_scan_settings_hash(cls, file_path, depth_limit=None, file_filter=None,
+                               exclude_files=None, include_dirs=None, exclude_dirs=None,
+                               track_changes=False):
+        """
+        Get a hash of the settings that determine which paths a scan covers. This is saved with
+        the cursor of a scan that was stopped early so that the cursor can be discarded (instead of
+        resumed) if the settings were changed since.
+
+        Arguments:
+        file_path -- The path that is scanned
+        depth_limit -- The limit on the depth of the scan
+        file_filter -- The list of the wildcards of the files to include
+        exclude_files -- The list of the wildcards of the files to exclude
+        include_dirs -- The list of the wildcards of the directories to include
+        exclude_dirs -- The list of the wildcards of the directories to exclude
+        track_changes -- Whether the manifest is used to track the changes
+        """
+
+        settings = [file_path, depth_limit or 0, file_filter or [], exclude_files or [],
+                    include_dirs or [], exclude_dirs or [], bool(track_changes)]
+
+        return hashlib.sha256(json.dumps(settings).encode('utf-8')).hexdigest()
+
+    @classmethod
+    def format_run_stats(cls, run_stats):
+        """
+        Format the given statistics as a string of key-value pairs that can be appended to a log
+        message.
+
+        Arguments:
+        run_stats -- A dictionary of the statistics
+        """
+
+        return "".join(", %s=%s" % (name, value) for name, value in run_stats.items())
+
+    @classmethod
+    def scan_shard(cls, shard_path, summary, output_options, scan_options, hasher_options,
+                   governor_options, identity_options, logger_name=None):
+        """
+        Scan one of the top-level sub-directories in a worker process and yield the serialized
+        event elements. See iter_sharded_events().
+
+        Arguments:
+        shard_path -- The path of the sub-directory
+        summary -- A dictionary that will be populated with the scan_info of the sub-directory
+        output_options -- The arguments for make_event_serializer() (the stanza, index, etc.)
+        scan_options -- The arguments for iter_files_data()
+        hasher_options -- The arguments for making the FileHasher
+        governor_options -- The arguments for making the IOGovernor
+        identity_options -- The arguments for making the IdentityCache
+        logger_name -- The name of the logger to log errors to (errors are not logged if None);
+                       the records are sent back to the coordinator which writes them to the
+                       input's log (see ShardedScan)
+        """
+
+        modular_input = cls()
+        event_serializer = modular_input.make_event_serializer(**output_options)
+        scan_info = {}
+
+        if logger_name is not None:
+            logger = logging.getLogger(logger_name)
+        else:
+            logger = None
+
+        governor = IOGovernor(**governor_options)
+        identity_cache = IdentityCache(**identity_options)
+        file_hasher = FileHasher(governor=governor, **hasher_options)
+        telemetry = ScanTelemetry()
+
+        results = cls.iter_files_data(shard_path, logger=logger, scan_info=scan_info,
+                                      file_hasher=file_hasher, governor=governor,
+                                      identity_cache=identity_cache, telemetry=telemetry,
+                                      **scan_options)
+
+        for result in results:
+
+            # The record for the sub-directory itself is output by the coordinator (which counts
+            # it too)
+            if 'file_count_recursive' in result:
+                telemetry.directories -= 1
+                continue
+
+            # Add the time
+            result['time'] = time.strftime("%a %b %d %H:%M:%S %Y")
+
+            yield cls.serialize_event_timed(event_serializer, result, telemetry)
+
+        telemetry.add_file_hasher_stats(file_hasher)
+
+        summary.update(scan_info)
+        summary['throttle_stats'] = governor.get_stats()
+        summary['identity_stats'] = identity_cache.get_stats()
+        summary['telemetry_state'] = telemetry.get_state()
+
+    def iter_sharded_events(self, file_path, processes, output_options, logger=None,
+                            latest_time=None, must_be_later_than=None, file_hash_limit=0,
+                            depth_limit=0, file_filter=None, scan_info=None, hash_workers=1,
+                            traversal_workers=1, file_hasher=None, governor=None,
+                            directory_filter=None, identity_cache=None, fields=None,
+                            telemetry=None):
+        """
+        Get the serialized event elements (without the stream element around them; see
+        EventBatcher) for the files within the directory using a pool of processes. Each of the
+        top-level sub-directories is scanned (and the events built and serialized) in a worker
+        process while the entries directly within the root are scanned in this process.
+
+        The events of the sub-directories are interleaved as they are received so they are not in
+        the same order as iter_files_data() but the root directory is still last. The hash cache
+        and the manifest are not supported.
+
+        Arguments:
+        file_path -- The directory to scan
+        processes -- The number of worker processes
+        output_options -- The arguments for make_event_serializer() (the stanza, index, etc.)
+        scan_info -- A dictionary that will be populated with the merged state of the scan (see
+                     iter_files_data())
+        governor -- An IOGovernor to limit the I/O with; its budget is split equally between this
+                    process (which scans the root at the same time as the workers) and each of
+                    the worker processes so the governor is left with this process's share (see
+                    IOGovernor.split()). The workers' statistics are added to it.
+        directory_filter -- A DirectoryFilter for the directories to prune from the walk (the
+                            sub-directories it excludes are not made into shards)
+        identity_cache -- The IdentityCache to resolve the names of the owners and groups with;
+                          each worker process gets its own cache and the workers' statistics
+                          are added to it
+        fields -- A set of the names of the fields to include in the events (see
+                  get_file_data())
+        telemetry -- A ScanTelemetry to add the timings and counts of the scan to; the
+                     workers' telemetry is added to it (so the times of the phases are summed
+                     across the processes)
+        """
+
+        if scan_info is None:
+            scan_info = {}
+
+        if file_hasher is None:
+            file_hasher = FileHasher()
+
+        if identity_cache is None:
+            identity_cache = IdentityCache()
+
+        # Each of the sub-directories that would be walked is a shard (unless the depth limit
+        # excludes their contents)
+        shards = []
+
+        if depth_limit is None or depth_limit != 1:
+            try:
+                dirs, _ = list_directory(file_path)
+                shards = [entry.path for entry in dirs if not is_symlink(entry) and
+                          (directory_filter is None or
+                           directory_filter.get_state(entry.path) != DirectoryFilter.EXCLUDED)]
+            except OSError:
+                # The error will be reported when the root is scanned below
+                pass
+
+        # The sub-directories are one level down so the depth limit is reduced by one
+        if depth_limit is not None and depth_limit > 0:
+            shard_depth_limit = depth_limit - 1
+        else:
+            shard_depth_limit = 0
+
+        scan_options = {
+            'latest_time': latest_time,
+            'must_be_later_than': must_be_later_than,
+            'file_hash_limit': file_hash_limit,
+            'depth_limit': shard_depth_limit,
+            'file_filter': file_filter,
+            'hash_workers': hash_workers,
+            'traversal_workers': traversal_workers,
+            'directory_filter': directory_filter,
+            'fields': fields
+        }
+
+        hasher_options = {
+            'chunk_size': file_hasher.chunk_size,
+            'mmap_threshold': file_hasher.mmap_threshold,
+            'algorithms': file_hasher.algorithms
+        }
+
+        if governor is not None:
+            governor_options = governor.split(processes + 1)
+        else:
+            governor_options = {}
+
+        identity_options = {
+            'ttl': identity_cache.ttl,
+            'group_file': identity_cache.group_file
+        }
+
+        event_serializer = self.make_event_serializer(**output_options)
+
+        if logger is not None:
+            logger_name = logger.name
+        else:
+            logger_name = None
+
+        sharded_scan = ShardedScan(self.scan_shard, processes, logger=logger)
+        sharded_scan.start(shards, output_options, scan_options, hasher_options, governor_options,
+                           identity_options, logger_name)
+
+        root_scan_info = {}
+        root_result = None
+
+        try:
+            # Scan the entries directly within the root (including the sub-directories themselves)
+            results = self.iter_files_data(file_path, logger, latest_time, must_be_later_than,
+                                           file_hash_limit, 1, file_filter,
+                                           scan_info=root_scan_info, hash_workers=hash_workers,
+                                           file_hasher=file_hasher, governor=governor,
+                                           directory_filter=directory_filter,
+                                           identity_cache=identity_cache, fields=fields,
+                                           telemetry=telemetry)
+
+            for result in results:
+
+                # Hold the record for the root until the totals are known
+                if 'file_count_recursive' in result:
+                    root_result = result
+                    continue
+
+                # Add the time
+                result['time'] = time.strftime("%a %b %d %H:%M:%S %Y")
+
+                yield self.serialize_event_timed(event_serializer, result, telemetry)
+
+            # Output the events from the workers as they are received
+            for event in sharded_scan.iter_results():
+                yield event
+
+        finally:
+            sharded_scan.stop()
+
+        # Merge the state of the scans
+        summaries = [root_scan_info] + list(sharded_scan.summaries.values())
+
+        scan_info['failed'] = any(summary.get('failed', False) for summary in summaries)
+        scan_info['cursor'] = None
+        scan_info['limit_reached'] = None
+        scan_info['latest_time'] = max(summary.get('latest_time', 0) for summary in summaries)
+        scan_info['file_count'] = sum(summary.get('file_count', 0) for summary in summaries)
+        scan_info['directory_count'] = sum(summary.get('directory_count', 0)
+                                           for summary in summaries)
+        scan_info['skipped_directories'] = sum(summary.get('skipped_directories', 0)
+                                               for summary in summaries)
+
+        for shard, summary in sharded_scan.summaries.items():
+            if governor is not None and 'throttle_stats' in summary:
+                governor.add_stats(summary['throttle_stats'])
+
+            if 'identity_stats' in summary:
+                identity_cache.add_stats(summary['identity_stats'])
+
+            if telemetry is not None and 'telemetry_state' in summary:
+                telemetry.add_state(summary['telemetry_state'])
+
+            if 'error' in summary and logger:
+                logger.error('Error when processing path="%s", reason="%s"', shard,
+                             summary['error'])
+
+        if root_result is not None:
+            root_result['file_count_recursive'] = scan_info['file_count']
+            root_result['directory_count_recursive'] = scan_info['directory_count']
+
+            # Add the time
+            root_result['time'] = time.strftime("%a %b %d %H:%M:%S %Y")
+
+            yield self.serialize_event_timed(event_serializer, root_result, telemetry)
+
+    def run_watcher(self, stanza, watcher, stop_event, output_options, sink_options,
+                    record_options, hasher_options, hash_cache_file_path=None):
+        """
+        Output the events for the changes that the watcher observes until it is stopped (this
+        runs on a thread of its own).
+
+        Arguments:
+        stanza -- The stanza of the input
+        watcher -- The TreeWatcher
+        stop_event -- The threading.Event that is set when the watcher ought to stop
+        output_options -- The arguments for make_event_serializer()
+        sink_options -- The arguments for make_event_sink()
+        record_options -- The arguments for iter_watch_records() (other than the file_hasher)
+        hasher_options -- The arguments for making the FileHasher (other than the cache)
+        hash_cache_file_path -- The path of the database of the hash cache (if the hashes are
+                                cached)
+        """
+
+        try:
+            watcher.start()
+        except OSError as exception:
+            self.logger.error('Unable to watch for changes, stanza="%s", path="%s", reason="%s"',
+                              stanza, watcher.root, str(exception))
+            return
+
+        # Open the hash cache with a connection of the watcher's own since the watcher outlives
+        # the runs (the hashes of the changed files are then re-used by the next scan). The scans
+        # hold the database for writing until they finish so the watcher doesn't wait for it;
+        # the hashes are saved after a later change instead.
+        checkpoint_store = None
+        hash_cache = None
+
+        if hash_cache_file_path is not None:
+            try:
+                checkpoint_store = CheckpointStore(hash_cache_file_path, timeout=0)
+                hash_cache = HashCache(checkpoint_store, new_run=False)
+            except sqlite3.Error as exception:
+                self.logger.warning('Unable to open the hash cache for watching for changes, '
+                                    'stanza="%s", reason="%s"', stanza, str(exception))
+
+        record_options = dict(record_options,
+                              file_hasher=FileHasher(cache=hash_cache, **hasher_options))
+
+        self.logger.info('Watching for changes, stanza="%s", path="%s"%s', stanza, watcher.root,
+                         self.format_run_stats(watcher.get_stats()))
+
+        event_serializer = self.make_event_serializer(**output_options)
+        event_sink = self.make_event_sink(**sink_options)
+
+        # The changes that couldn't be sent to the HTTP Event Collector (these are sent again)
+        unsent_changes = collections.OrderedDict()
+
+        # The deleted paths that were directories (these are cleared once they are sent)
+        deleted_directories = watcher.deleted_directories
+
+        try:
+            while not stop_event.is_set():
+                changes = watcher.read_changes(timeout=1)
+
+                if not changes and not unsent_changes:
+                    continue
+
+                # Wait for the related events (such as a series of writes to a file) so that they
+                # are output as a single change
+                stop_event.wait(self.WATCH_DELAY)
+                watcher.read_changes(timeout=0, changes=changes)
+
+                # Include the changes that couldn't be sent before (the latest change of each
+                # path is kept)
+                if unsent_changes:
+                    unsent_changes.update(changes)
+                    changes = unsent_changes
+                    unsent_changes = collections.OrderedDict()
+
+                try:
+                    records = self.iter_watch_records(changes, self.logger,
+                                                      deleted_directories=deleted_directories,
+                                                      **record_options)
+
+                    for result in records:
+
+                        # Add the time
+                        result['time'] = time.strftime("%a %b %d %H:%M:%S %Y")
+
+                        event_sink.add(event_serializer.serialize_event(result))
+
+                    event_sink.flush()
+                    deleted_directories.clear()
+
+                # Keep watching and send the changes again later (with a new sink since the
+                # events that are pending in this one may have been lost)
+                except HECError as exception:
+                    self.logger.error('Unable to send the changes to the HTTP Event Collector '
+                                      '(they will be sent again), stanza="%s", reason="%s"',
+                                      stanza, str(exception))
+
+                    unsent_changes = changes
+
+                    try:
+                        self.close_event_sink(event_sink)
+                    except HECError:
+                        pass
+
+                    event_sink = self.make_event_sink(**sink_options)
+
+                    stop_event.wait(self.WATCH_RETRY_DELAY)
+                    continue
+
+                # Save the hashes that were computed; the database may be locked by a scan that is
+                # in progress in which case they are kept until the next change
+                if hash_cache is not None:
+                    try:
+                        hash_cache.save(evict=False)
+                    except sqlite3.Error as exception:
+                        self.logger.debug('Unable to save the hash cache of the watcher, '
+                                          'stanza="%s", reason="%s"', stanza, str(exception))
+
+        except Exception:
+            self.logger.exception('Watching for changes failed, stanza="%s", path="%s"', stanza,
+                                  watcher.root)
+
+        finally:
+            try:
+                self.close_event_sink(event_sink)
+            except HECError as exception:
+                self.logger.error('Unable to send the events to the HTTP Event Collector, '
+                                  'stanza="%s", reason="%s"', stanza, str(exception))
+
+            if checkpoint_store is not None:
+                try:
+                    checkpoint_store.close()
+                except sqlite3.Error as exception:
+                    self.logger.warning('Unable to save the hash cache of the watcher, '
+                                        'stanza="%s", reason="%s"', stanza, str(exception))
+
+            watcher.close()
+
+    def start_watcher(self, stanza, settings, watch_options, output_options, sink_options,
+                      record_options, hasher_options, hash_cache_file_path=None):
+        """
+        Start watching the tree of the stanza for changes (unless it is already being watched
+        with the same settings in which case the watcher is left as is).
+
+        Arguments:
+        stanza -- The stanza of the input
+        settings -- The settings of the stanza (the watcher is restarted if they change)
+        watch_options -- The arguments for making the TreeWatcher
+        output_options -- The arguments for make_event_serializer()
+        sink_options -- The arguments for make_event_sink()
+        record_options -- The arguments for iter_watch_records() (other than the file_hasher)
+        hasher_options -- The arguments for making the FileHasher (other than the cache)
+        hash_cache_file_path -- The path of the database of the hash cache (if the hashes are
+                                cached)
+        """
+
+        if stanza in self.watchers:
+            _, thread, _, previous_settings = self.watchers[stanza]
+
+            if thread.is_alive() and previous_settings == settings:
+                return
+
+            self.stop_watcher(stanza)
+
+        watcher = TreeWatcher(**watch_options)
+        stop_event = threading.Event()
+
+        thread = threading.Thread(target=self.run_watcher,
+                                  args=(stanza, watcher, stop_event, output_options,
+                                        sink_options, record_options, hasher_options,
+                                        hash_cache_file_path))
+        thread.daemon = True
+
+        self.watchers[stanza] = (watcher, thread, stop_event, settings)
+
+        thread.start()
+
+    def stop_watcher(self, stanza):
+        """
+        Stop watching the tree of the stanza for changes (if it is being watched).
+
+        Arguments:
+        stanza -- The stanza of the input
+        """
+
+        if stanza not in self.watchers:
+            return
+
+        _, thread, stop_event, _ = self.watchers.pop(stanza)
+
+        stop_event.set()
+        thread.join()
+
+    def do_shutdown(self):
+        """
+        Stop the watchers when the input is shut down.
+        """
+
+        for stanza in list(self.watchers.keys()):
+            self.stop_watcher(stanza)
+
+    def make_event_serializer(self, stanza, sourcetype, source, index, host=None, unbroken=False,
+                              close=False, output_format=None, output_mode=None):
+        """
+        Make the serializer for the events; this produces the same output as
+        create_event_string() without building a DOM for each event (unless the output format is
+        JSON). The events are serialized for the HTTP Event Collector if the output mode is hec.
+
+        Arguments:
+        stanza -- The stanza used for the input
+        sourcetype -- The sourcetype
+        source -- The source field value
+        index -- The index to send the event to
+        host -- The host
+        unbroken -- If true, the events will be marked as unbroken
+        close -- If true, the events will include the done element
+        output_format -- The format of the content of the events: "kv" for key=value pairs (the
+                         default) or "json" for a JSON object
+        output_mode -- Where the events will be sent: "stdout" (the default) or "hec"
+        """
+
+        if output_mode == 'hec':
+            return HECEventSerializer(sourcetype, source, index, host, output_format)
+
+        if output_format == 'json':
+            serializer_class = JSONEventSerializer
+        else:
+            serializer_class = XMLEventSerializer
+
+        return serializer_class(stanza, sourcetype, source, index, host, unbroken, close,
+                                stanza_attribute=self.streaming_mode == 'true')
+
+    @classmethod
+    def serialize_event_timed(cls, event_serializer, result, telemetry=None):
+        """
+        Serialize the event, adding the time it took to the telemetry.
+
+        Arguments:
+        event_serializer -- The serializer from make_event_serializer()
+        result -- The record to serialize
+        telemetry -- The ScanTelemetry to add the time to (the time isn't measured if None)
+        """
+
+        if telemetry is None:
+            return event_serializer.serialize_event(result)
+
+        return telemetry.call_timed('serialize', event_serializer.serialize_event, result)
+
+    @classmethod
+    def add_event_timed(cls, event_sink, event, telemetry=None):
+        """
+        Add the serialized event to the sink, adding the time it took to the telemetry (this
+        includes the time to write the batch if the event completes one).
+
+        Arguments:
+        event_sink -- The sink from make_event_sink()
+        event -- The serialized event
+        telemetry -- The ScanTelemetry to add the time to (the time isn't measured if None)
+        """
+
+        if telemetry is None:
+            event_sink.add(event)
+        else:
+            telemetry.call_timed('output', event_sink.add, event)
+
+    def get_hec_token(self, hec_token_name=None, session_key=None):
+        """
+        Get the token of the HTTP Event Collector from the secure password in storage/passwords
+        (so that it isn't stored in plain text in inputs.conf). Returns None if no secure password
+        was found.
+
+        Arguments:
+        hec_token_name -- The name (the username) of the secure password in the HEC_TOKEN_REALM
+                          realm; the first secure password of the realm is used if None
+        session_key -- The session key for accessing Splunkd
+        """
+
+        secure_password = get_secure_password(realm=self.HEC_TOKEN_REALM, username=hec_token_name,
+                                              session_key=session_key, logger=self.logger)
+
+        if secure_password is None:
+            return None
+
+        return secure_password['content']['clear_password']
+
+    def make_event_sink(self, output_mode=None, batch_size=None, batch_ms=None, hec_url=None,
+                        hec_token=None, hec_connections=None, hec_verify_ssl=True):
+        """
+        Make the object that the serialized events are added to (and that sends them to where
+        they need to go); see close_event_sink().
+
+        Arguments:
+        output_mode -- Where to send the events: "stdout" (the default) or "hec"
+        batch_size -- The maximum number of events to output at a time
+        batch_ms -- The maximum number of milliseconds to hold the events for
+        hec_url -- The URL of the HTTP Event Collector
+        hec_token -- The token for the HTTP Event Collector
+        hec_connections -- The number of connections to the HTTP Event Collector
+        hec_verify_ssl -- If false, the certificate of the HTTP Event Collector isn't verified
+        """
+
+        if output_mode == 'hec':
+            return HECEventSink(hec_url, hec_token, batch_size, batch_ms,
+                                connections=hec_connections,
+                                verify_ssl=hec_verify_ssl is not False)
+        else:
+            return EventBatcher(self.output_event_string, batch_size, batch_ms)
+
+    @classmethod
+    def close_event_sink(cls, event_sink):
+        """
+        Output the events that are pending and release the resources of the event sink.
+
+        Arguments:
+        event_sink -- The sink from make_event_sink()
+        """
+
+        event_sink.close()
+
+    def output_telemetry(self, stanza, telemetry_event, output_options, sink_options):
+        """
+        Output the event with the telemetry of the run (as JSON with the file_meta_data:telemetry
+        sourcetype) to the same destination as the other events.
+
+        Arguments:
+        stanza -- The stanza of the input
+        telemetry_event -- The record of the telemetry (see ScanTelemetry.make_event())
+        output_options -- The arguments for make_event_serializer()
+        sink_options -- The arguments for make_event_sink()
+        """
+
+        output_options = dict(output_options, sourcetype='file_meta_data:telemetry',
+                              output_format='json')
+
+        event_serializer = self.make_event_serializer(**output_options)
+        event_sink = self.make_event_sink(**sink_options)
+
+        # Add the time
+        telemetry_event['time'] = time.strftime("%a %b %d %H:%M:%S %Y")
+
+        try:
+            try:
+                event_sink.add(event_serializer.serialize_event(telemetry_event))
+            finally:
+                self.close_event_sink(event_sink)
+
+        except HECError as exception:
+            self.logger.error('Unable to send the telemetry to the HTTP Event Collector, '
+                              'stanza="%s", reason="%s"', stanza, str(exception))
+
+    def output_event_string(self, output, out=sys.stdout):
+        """
+        Output an event that was already serialized (see make_event_serializer()).
+
+        Arguments:
+        output -- The serialized event
+        out -- The stream to send the event to (defaults to standard output)
+        """
+
+        with self.lock:
+            out.write(output)
+            out.flush()
+
     def run(self, stanza, cleaned_params, input_config):
         """
         Run the input.
@@ -592,12 +1985,45 @@ class FileMetaDataModularInput(ModularInput):
         file_path = cleaned_params["file_path"]
         recurse = cleaned_params.get("recurse", True)
         only_if_changed = cleaned_params.get("only_if_changed", False)
+        track_changes = cleaned_params.get("track_changes", False)
         file_hash_limit = cleaned_params.get(
             "file_hash_limit", 500 * DataSizeField.MB)
         include_file_hash = cleaned_params.get("include_file_hash", False)
+        hash_workers = cleaned_params.get("hash_workers", 1)
+        traversal_workers = cleaned_params.get("traversal_workers", 1)
+        scan_processes = cleaned_params.get("scan_processes", 1)
+        max_read_bytes_per_sec = cleaned_params.get("max_read_bytes_per_sec", None)
+        max_stat_ops_per_sec = cleaned_params.get("max_stat_ops_per_sec", None)
+        max_scan_duration = cleaned_params.get("max_scan_duration", None)
+        file_hash_chunk_size = cleaned_params.get("file_hash_chunk_size", None)
+        file_hash_mmap_threshold = cleaned_params.get("file_hash_mmap_threshold", None)
+        file_hash_cache = cleaned_params.get("file_hash_cache", False)
+        hash_algorithms = cleaned_params.get("hash_algorithms", None)
         depth_limit = cleaned_params.get("depth_limit", 0)
+        max_entries = cleaned_params.get("max_entries", None)
+        max_directories = cleaned_params.get("max_directories", None)
+        identity_cache_ttl = cleaned_params.get("identity_cache_ttl", None)
+        watch_mode = cleaned_params.get("watch_mode", False)
+        watch_poll_interval = cleaned_params.get("watch_poll_interval", None) or 60
+        output_batch_size = cleaned_params.get("output_batch_size", None)
+        output_batch_ms = cleaned_params.get("output_batch_ms", None)
+        output_format = cleaned_params.get("output_format", None) or "kv"
+        output_mode = cleaned_params.get("output_mode", None) or "stdout"
+        hec_url = cleaned_params.get("hec_url", None)
+        hec_token_name = cleaned_params.get("hec_token_name", None)
+        hec_connections = cleaned_params.get("hec_connections", None)
+        hec_verify_ssl = cleaned_params.get("hec_verify_ssl", True)
+        include_telemetry = cleaned_params.get("telemetry", False)
+        fields = cleaned_params.get("fields", None)
         file_filter = cleaned_params.get("file_filter", None)
+        exclude_files = cleaned_params.get("exclude_files", None)
+        include_dirs = cleaned_params.get("include_dirs", None)
+        exclude_dirs = cleaned_params.get("exclude_dirs", None)
         sourcetype = cleaned_params.get("sourcetype", "file_meta_data")
+
+        # Use the sourcetype that extracts the fields from JSON (unless another one was specified)
+        if output_format == "json" and sourcetype in (None, "file_meta_data"):
+            sourcetype = "file_meta_data:json"
         host = cleaned_params.get("host", None)
         index = cleaned_params.get("index", "default")
         source = stanza
@@ -606,6 +2032,39 @@ class FileMetaDataModularInput(ModularInput):
 
             self.logger.debug('Running input against path="%s"', file_path)
 
+            # Make sure that the events can be sent to the HTTP Event Collector (this is only
+            # checked when the input is due to run since the token is looked up with a request to
+            # splunkd)
+            if output_mode == "hec" and not hec_url:
+                self.logger.error('hec_url must be set when output_mode is hec, stanza="%s"',
+                                  stanza)
+                return
+
+            if output_mode == "hec" and not hec_url.startswith(("http://", "https://")):
+                self.logger.error('hec_url must be an http or https URL, stanza="%s", '
+                                  'hec_url="%s"', stanza, hec_url)
+                return
+
+            # Get the token of the HTTP Event Collector from the secure storage
+            if output_mode == "hec":
+                try:
+                    hec_token = self.get_hec_token(hec_token_name,
+                                                   getattr(input_config, 'session_key', None))
+                except Exception as exception:
+                    self.logger.error('Unable to get the HTTP Event Collector token from '
+                                      'storage/passwords, stanza="%s", reason="%s"', stanza,
+                                      str(exception))
+                    return
+
+                if not hec_token:
+                    self.logger.error('No HTTP Event Collector token was found in '
+                                      'storage/passwords (it must be stored in the realm "%s"), '
+                                      'stanza="%s", hec_token_name="%s"', self.HEC_TOKEN_REALM,
+                                      stanza, hec_token_name or '')
+                    return
+            else:
+                hec_token = None
+
             # Get the date of the latest entry imported
             try:
                 checkpoint_data = self.get_checkpoint_data(input_config.checkpoint_dir, stanza,
@@ -623,8 +2082,26 @@ class FileMetaDataModularInput(ModularInput):
             else:
                 latest_time = 0
 
-            # Set up the filter to indicate which items are considered new
-            if only_if_changed:
+            # Get the cursor of the scan that was stopped early by max_scan_duration so that it can
+            # be resumed (unless the path or the settings that determine which paths are scanned
+            # were changed since)
+            scan_cursor = None
+            scan_settings_hash = self.get_scan_settings_hash(file_path, depth_limit, file_filter,
+                                                             exclude_files, include_dirs,
+                                                             exclude_dirs, track_changes)
+
+            if recurse and checkpoint_data is not None:
+                scan_cursor = checkpoint_data.get('scan_cursor', None)
+
+                if scan_cursor is not None and \
+                   scan_cursor.get('settings_hash') != scan_settings_hash:
+                    self.logger.info('Starting the scan over since the settings were changed '
+                                     'since it was stopped, stanza="%s"', stanza)
+                    scan_cursor = None
+
+            # Set up the filter to indicate which items are considered new (the manifest
+            # supersedes this when tracking changes)
+            if only_if_changed and not track_changes:
                 must_be_later_than = latest_time
             else:
                 must_be_later_than = None
@@ -634,43 +2111,357 @@ class FileMetaDataModularInput(ModularInput):
             if not include_file_hash:
                 file_hash_limit = -1
 
+            # Open the store of the per-path state from the previous runs
+            if track_changes or (include_file_hash and file_hash_cache):
+                checkpoint_store = CheckpointStore(
+                    self.get_checkpoint_store_file_path(input_config.checkpoint_dir, stanza))
+            else:
+                checkpoint_store = None
+
+            # Load the manifest of the paths observed in the previous runs (continuing the previous
+            # run's pass over the tree if the scan is being resumed)
+            if track_changes:
+                manifest = FileManifest(checkpoint_store, new_run=scan_cursor is None)
+            else:
+                manifest = None
+
+            # Load the cache of the hashes from the previous runs
+            if include_file_hash and file_hash_cache:
+                hash_cache = HashCache(checkpoint_store, new_run=scan_cursor is None)
+            else:
+                hash_cache = None
+
+            # Make the governor that limits the rate of the I/O (if a limit is set)
+            if max_read_bytes_per_sec or max_stat_ops_per_sec:
+                governor = IOGovernor(max_read_bytes_per_sec, max_stat_ops_per_sec)
+            else:
+                governor = None
+
+            # Only build the fields that were requested
+            if fields:
+                fields = frozenset(fields)
+            else:
+                fields = None
+
+            # Make the filter of the files to include (the wildcards of paths are matched relative
+            # to the path like those of the directories)
+            if file_filter or exclude_files:
+                file_filter = PathFilter(file_filter, exclude_files, file_path)
+            else:
+                file_filter = None
+
+            # Make the filter that prunes the directories that are not to be walked
+            if include_dirs or exclude_dirs:
+                directory_filter = DirectoryFilter(file_path, include_dirs, exclude_dirs)
+            else:
+                directory_filter = None
+
+            # Keep the cache of the owner and group names across runs (until the entries expire)
+            if identity_cache_ttl is None:
+                identity_cache_ttl = IdentityCache.DEFAULT_TTL
+
+            if self.identity_cache is None or self.identity_cache.ttl != identity_cache_ttl:
+                self.identity_cache = IdentityCache(identity_cache_ttl)
+
+            self.identity_cache.reset_stats()
+
+            # Make the hasher that will compute the file hashes
+            file_hasher = FileHasher(file_hash_chunk_size, file_hash_mmap_threshold, hash_cache,
+                                     hash_algorithms, governor)
+
+            # Scan the top-level sub-directories in worker processes if requested (the manifest,
+            # the hash cache, resuming scans and the limits on the size of the scan are only
+            # supported when scanning in a single process)
+            use_processes = recurse and scan_processes is not None and scan_processes > 1
+
+            if use_processes and (manifest is not None or hash_cache is not None or
+                                  max_scan_duration or max_entries or max_directories):
+                self.logger.info('Scanning in a single process since scan_processes is not '
+                                 'supported with track_changes, file_hash_cache, '
+                                 'max_scan_duration, max_entries or max_directories, '
+                                 'stanza="%s"', stanza)
+                use_processes = False
+
+            # Make the serializer for the events
+            output_options = {
+                'stanza': stanza,
+                'sourcetype': sourcetype,
+                'source': source,
+                'index': index,
+                'host': host,
+                'unbroken': True,
+                'close': True,
+                'output_format': output_format,
+                'output_mode': output_mode
+            }
+
+            event_serializer = self.make_event_serializer(**output_options)
+
+            # Make the options for the destination of the events
+            sink_options = {
+                'output_mode': output_mode,
+                'batch_size': output_batch_size,
+                'batch_ms': output_batch_ms,
+                'hec_url': hec_url,
+                'hec_token': hec_token,
+                'hec_connections': hec_connections,
+                'hec_verify_ssl': hec_verify_ssl
+            }
+
+            # Output the changes as they happen between the scans if requested (the scan still
+            # reconciles the changes that the watcher may have missed)
+            if watch_mode and recurse and Inotify.is_available():
+                watch_options = {
+                    'root': file_path,
+                    'directory_filter': directory_filter,
+                    'depth_limit': depth_limit,
+                    'poll_interval': watch_poll_interval,
+                    'max_polled_entries': max_entries
+                }
+
+                # The watcher limits its I/O separately from the scans (since it outlives them)
+                if max_read_bytes_per_sec or max_stat_ops_per_sec:
+                    watch_governor = IOGovernor(max_read_bytes_per_sec, max_stat_ops_per_sec)
+                else:
+                    watch_governor = None
+
+                record_options = {
+                    'file_hash_limit': file_hash_limit,
+                    'file_filter': file_filter,
+                    'directory_filter': directory_filter,
+                    'governor': watch_governor,
+                    'identity_cache': self.identity_cache,
+                    'fields': fields
+                }
+
+                hasher_options = {
+                    'chunk_size': file_hash_chunk_size,
+                    'mmap_threshold': file_hash_mmap_threshold,
+                    'algorithms': hash_algorithms,
+                    'governor': watch_governor
+                }
+
+                if hash_cache is not None:
+                    hash_cache_file_path = self.get_checkpoint_store_file_path(
+                        input_config.checkpoint_dir, stanza)
+                else:
+                    hash_cache_file_path = None
+
+                self.start_watcher(stanza, dict(cleaned_params), watch_options, output_options,
+                                   sink_options, record_options, hasher_options,
+                                   hash_cache_file_path)
+
+            elif watch_mode:
+                self.logger.warning('watch_mode is only supported for directories on Linux '
+                                    '(recurse must be enabled), stanza="%s"', stanza)
+
+            else:
+                self.stop_watcher(stanza)
+
+            # Collect the timings of the phases of the run
+            if include_telemetry:
+                telemetry = ScanTelemetry()
+            else:
+                telemetry = None
+
+            run_start = time.time()
 
             # Get the file information
-            if recurse:
-                results, new_latest_time = self.get_files_data(file_path, logger=self.logger,
-                                                               latest_time=latest_time,
-                                                               must_be_later_than=must_be_later_than,
-                                                               file_hash_limit=file_hash_limit,
-                                                               depth_limit=depth_limit,
-                                                               file_filter=file_filter)
+            scan_info = {}
+            events = []
+
+            if use_processes:
+                events = self.iter_sharded_events(file_path, scan_processes, output_options,
+                                                  logger=self.logger,
+                                                  latest_time=latest_time,
+                                                  must_be_later_than=must_be_later_than,
+                                                  file_hash_limit=file_hash_limit,
+                                                  depth_limit=depth_limit,
+                                                  file_filter=file_filter,
+                                                  scan_info=scan_info,
+                                                  hash_workers=hash_workers,
+                                                  traversal_workers=traversal_workers,
+                                                  file_hasher=file_hasher,
+                                                  governor=governor,
+                                                  directory_filter=directory_filter,
+                                                  identity_cache=self.identity_cache,
+                                                  fields=fields,
+                                                  telemetry=telemetry)
+                results = []
+
+            elif recurse:
+                results = self.iter_files_data(file_path, logger=self.logger,
+                                               latest_time=latest_time,
+                                               must_be_later_than=must_be_later_than,
+                                               file_hash_limit=file_hash_limit,
+                                               depth_limit=depth_limit,
+                                               file_filter=file_filter,
+                                               scan_info=scan_info,
+                                               hash_workers=hash_workers,
+                                               traversal_workers=traversal_workers,
+                                               file_hasher=file_hasher,
+                                               manifest=manifest,
+                                               governor=governor,
+                                               max_scan_duration=max_scan_duration,
+                                               cursor=scan_cursor,
+                                               directory_filter=directory_filter,
+                                               max_entries=max_entries,
+                                               max_directories=max_directories,
+                                               identity_cache=self.identity_cache,
+                                               fields=fields,
+                                               telemetry=telemetry)
             else:
-                result, new_latest_time = self.get_file_data(file_path, logger=self.logger,
-                                                             latest_time=latest_time,
-                                                             must_be_later_than=must_be_later_than,
-                                                             file_hash_limit=file_hash_limit)
+                result, scan_info['latest_time'] = self.get_file_data(file_path, logger=self.logger,
+                                                                      latest_time=latest_time,
+                                                                      must_be_later_than=must_be_later_than,
+                                                                      file_hash_limit=file_hash_limit,
+                                                                      file_hasher=file_hasher,
+                                                                      manifest=manifest,
+                                                                      governor=governor,
+                                                                      identity_cache=self.identity_cache,
+                                                                      fields=fields,
+                                                                      telemetry=telemetry)
 
                 # Make the results array from the single result
                 results = [result]
 
+            # Output the events as they are found (in batches if requested); the events that are
+            # pending are output even if the run fails
+            event_sink = self.make_event_sink(**sink_options)
+
+            results_count = 0
+
+            try:
+                try:
+                    for result in results:
+
+                        if result is not None:
+
+                            # Add the time
+                            result['time'] = time.strftime("%a %b %d %H:%M:%S %Y")
+
+                            event = self.serialize_event_timed(event_serializer, result,
+                                                               telemetry)
+                            self.add_event_timed(event_sink, event, telemetry)
+
+                            results_count += 1
+
+                    # Output the events that were already serialized by the worker processes
+                    for event in events:
+                        self.add_event_timed(event_sink, event, telemetry)
+                        results_count += 1
+
+                    # Determine if the entire tree was scanned (the scan may have failed, been
+                    # stopped early by max_scan_duration or reached max_entries or max_directories)
+                    scan_complete = not scan_info.get('failed', False) and \
+                                    scan_info.get('cursor', None) is None and \
+                                    scan_info.get('limit_reached', None) is None
+
+                    # Output the paths that were deleted (unless the scan is incomplete since we
+                    # don't know if the paths that weren't observed were deleted)
+                    if manifest is not None and scan_complete:
+                        for result in self.iter_deleted_files_data(manifest):
+
+                            # Add the time
+                            result['time'] = time.strftime("%a %b %d %H:%M:%S %Y")
+
+                            event = self.serialize_event_timed(event_serializer, result,
+                                                               telemetry)
+                            self.add_event_timed(event_sink, event, telemetry)
+
+                            results_count += 1
+
+                finally:
+                    if telemetry is not None:
+                        telemetry.call_timed('output', self.close_event_sink, event_sink)
+                    else:
+                        self.close_event_sink(event_sink)
+
+            # Don't save the state of the run if the events couldn't be sent so that they are sent
+            # again by the next run
+            except HECError as exception:
+                self.logger.error('Unable to send the events to the HTTP Event Collector, '
+                                  'stanza="%s", reason="%s"', stanza, str(exception))
+
+                if checkpoint_store is not None:
+                    checkpoint_store.close(commit=False)
+
+                return
+
+            # Save the manifest
+            if manifest is not None:
+                try:
+                    manifest.save(remove_deleted=scan_complete)
+                except sqlite3.Error:
+                    self.logger.exception('Failed to save the manifest, path="%s"',
+                                          checkpoint_store.file_path)
+
+            # Save the hash cache; only evict the entries not seen if the entire tree was scanned
+            run_stats = collections.OrderedDict()
+
+            if hash_cache is not None:
+                try:
+                    hash_cache.save(evict=scan_complete)
+                except sqlite3.Error:
+                    self.logger.exception('Failed to save the hash cache, path="%s"',
+                                          checkpoint_store.file_path)
+
+                run_stats['hash_cache_hits'] = hash_cache.hits
+                run_stats['hash_cache_misses'] = hash_cache.misses
+
+            if checkpoint_store is not None:
+                checkpoint_store.close()
+
+            # Include the statistics on the throttling of the I/O
+            if governor is not None:
+                run_stats.update(governor.get_stats())
+
+            # Include the statistics on the requests to the HTTP Event Collector
+            if output_mode == "hec":
+                run_stats.update(event_sink.get_stats())
+
+            # Include the statistics on the resolution of the owner and group names
+            if nix_import_available:
+                run_stats.update(self.identity_cache.get_stats())
+
+            # Include the statistics on the watches
+            if stanza in self.watchers:
+                run_stats.update(self.watchers[stanza][0].get_stats())
+
+            # Include the number of directories that were pruned from the walk
+            if directory_filter is not None:
+                run_stats['skipped_directories'] = scan_info.get('skipped_directories', 0)
+
+            # Note that the scan was stopped by a limit on its size
+            if scan_info.get('limit_reached', None) is not None:
+                run_stats['limit_reached'] = scan_info['limit_reached']
+
+            # Note that the scan will be resumed if it was stopped early
+            if scan_info.get('cursor', None) is not None:
+                run_stats['scan_stopped_early'] = 1
+                run_stats['pending_directories'] = len(scan_info['cursor']['pending'])
+
             # Log the result
-            if results is None:
-                self.logger.info("Completed retrieval of file data, no files found, count=%i, path=%s",
-                                 0, file_path)
+            if scan_info.get('failed', False):
+                self.logger.info("Completed retrieval of file data, no files found, count=%i, path=%s%s",
+                                 results_count, file_path, self.format_run_stats(run_stats))
             else:
-                self.logger.info("Completed retrieval of file data, count=%i, path=%s",
-                                 len(results), file_path)
+                self.logger.info("Completed retrieval of file data, count=%i, path=%s%s",
+                                 results_count, file_path, self.format_run_stats(run_stats))
 
-                # Output the event
-                for result in results:
+            # Output the telemetry of the run
+            if telemetry is not None:
+                telemetry.add_file_hasher_stats(file_hasher)
 
-                    if result is not None:
+                telemetry_event = telemetry.make_event(file_path, time.time() - run_start)
+                telemetry_event['events'] = results_count
+                telemetry_event['scan_failed'] = self.boolean_to_int(scan_info.get('failed',
+                                                                                   False))
+                telemetry_event.update(run_stats)
 
-                        # Add the time
-                        result['time'] = time.strftime("%a %b %d %H:%M:%S %Y")
+                self.output_telemetry(stanza, telemetry_event, output_options, sink_options)
 
-                        self.output_event(result, stanza, index=index, source=source,
-                                          sourcetype=sourcetype, host=host, unbroken=True,
-                                          close=True)
+            new_latest_time = scan_info['latest_time']
 
             # Get the time that the input last ran
             if checkpoint_data is not None and 'last_ran' in checkpoint_data:
@@ -682,10 +2473,16 @@ class FileMetaDataModularInput(ModularInput):
             if new_latest_time > latest_time:
                 latest_time = new_latest_time
 
+            # Save the settings with the cursor so that it is only resumed with the same settings
+            new_scan_cursor = scan_info.get('cursor', None)
+
+            if new_scan_cursor is not None:
+                new_scan_cursor['settings_hash'] = scan_settings_hash
+
             self.save_checkpoint(input_config.checkpoint_dir, stanza,
                                  self.get_non_deviated_last_run(
                                      last_ran, interval, stanza),
-                                 latest_time)
+                                 latest_time, new_scan_cursor)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,1294 @@
+# coding=utf-8
+"""
+Benchmarks for the file meta-data input.
+
+Run this from the tests directory; pass the names of the benchmarks to run (all of them are run
+if none are provided):
+
+    python3 benchmark.py file_hash
+
+The number of entries used by the checkpoint_store benchmark can be set with the
+BENCHMARK_CHECKPOINT_ENTRIES environment variable (e.g. "1000000,10000000,50000000") and the
+number of files used by the scan_processes benchmark with BENCHMARK_SCAN_FILES.
+
+The synthetic_tree benchmark measures the parts of a scan separately on a generated tree whose
+shape can be set with BENCHMARK_TREE (e.g. "files=100000,depth=4,fanout=8,sizes=small,
+hard_links=0.1,symlinks=0.1,seed=2"). Its results are saved as JSON to the path in
+BENCHMARK_RESULTS (tmp/benchmark_results.json by default) and compared to those of an earlier run
+if BENCHMARK_BASELINE is set to the path of its results (relative paths in both are resolved
+from the root of the repository):
+
+    BENCHMARK_RESULTS=tmp/baseline.json python3 benchmark.py synthetic_tree
+    BENCHMARK_BASELINE=tmp/baseline.json python3 benchmark.py synthetic_tree
+"""
+import collections
+import fnmatch
+import functools
+import hashlib
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.join("..", "src", "bin"))
+
+from file_meta_data import FileMetaDataModularInput
+from file_info_app.checkpoint_store import CheckpointStore
+from file_info_app.filters import PathFilter
+from file_info_app.hashing import FileHasher
+from file_info_app.hec import HECEventSink
+from file_info_app.identity import IdentityCache
+from file_info_app.serialization import EventBatcher
+
+MB = 1024 * 1024
+
+# The root of the repository (that the paths of the results of the benchmarks are relative to)
+REPOSITORY_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(function, *args, **kwargs):
+    """
+    Run the function and return a tuple of the result, the time it took (in seconds) and the peak
+    amount of memory allocated by Python while it ran (in bytes).
+    """
+
+    tracemalloc.start()
+
+    try:
+        start = time.time()
+        result = function(*args, **kwargs)
+        duration = time.time() - start
+
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return result, duration, peak_memory
+
+
+def make_file(directory, size, name="data.bin"):
+    """
+    Make a file of the given size filled with random data.
+    """
+
+    file_path = os.path.join(directory, name)
+
+    with open(file_path, 'wb') as file:
+        remaining = size
+
+        while remaining > 0:
+            chunk = os.urandom(min(remaining, MB))
+            file.write(chunk)
+            remaining -= len(chunk)
+
+    return file_path
+
+
+def read_whole_file_hash(file_path):
+    """
+    Compute the hash by reading the entire file into memory (the way it was originally done).
+    """
+
+    sha224 = hashlib.sha224()
+
+    with open(file_path, 'rb') as file:
+        sha224.update(file.read())
+
+    return sha224.hexdigest()
+
+
+def print_result(name, duration, peak_memory, data_size=None, items=None):
+    """
+    Print the result of a benchmark.
+    """
+
+    output = "%-40s time=%.3fs" % (name, duration)
+
+    if peak_memory is not None:
+        output += " peak_memory=%.1fMB" % (peak_memory / float(MB))
+
+    if data_size is not None:
+        output += " throughput=%.1fMB/s" % (data_size / float(MB) / max(duration, 0.000001))
+
+    if items is not None:
+        output += " rate=%.0f/s" % (items / max(duration, 0.000001))
+
+    print(output)
+
+
+def benchmark_file_hash(file_size=256 * MB):
+    """
+    Compare the throughput and memory use of reading the whole file vs. streaming it through a
+    re-used buffer vs. memory-mapping it.
+    """
+
+    directory = tempfile.mkdtemp()
+
+    try:
+        file_path = make_file(directory, file_size)
+
+        print("\nHashing a %iMB file" % (file_size // MB))
+
+        expected, duration, peak_memory = measure(read_whole_file_hash, file_path)
+        print_result("read() of the entire file", duration, peak_memory, file_size)
+
+        for chunk_size in (64 * 1024, MB, 8 * MB):
+            file_hasher = FileHasher(chunk_size=chunk_size)
+            result, duration, peak_memory = measure(file_hasher.hash_file, file_path)
+            print_result("readinto() with %ikB chunks" % (chunk_size // 1024), duration,
+                         peak_memory, file_size)
+
+            assert result['sha224'] == expected
+
+        file_hasher = FileHasher(mmap_threshold=1)
+        result, duration, peak_memory = measure(file_hasher.hash_file, file_path)
+        print_result("mmap with 1024kB chunks", duration, peak_memory, file_size)
+
+        assert result['sha224'] == expected
+
+    finally:
+        shutil.rmtree(directory)
+
+
+def benchmark_hash_algorithms(file_size=256 * MB, algorithms=('sha256', 'md5', 'blake2b')):
+    """
+    Compare computing several hashes from a single read of the file vs. reading the file once per
+    algorithm.
+    """
+
+    directory = tempfile.mkdtemp()
+
+    try:
+        file_path = make_file(directory, file_size)
+
+        print("\nHashing a %iMB file with %s" % (file_size // MB, ",".join(algorithms)))
+
+        def hash_separately():
+            file_hashes = {}
+
+            for algorithm in algorithms:
+                file_hashes.update(FileHasher(algorithms=[algorithm]).hash_file(file_path))
+
+            return file_hashes
+
+        expected, duration, peak_memory = measure(hash_separately)
+        print_result("one read per algorithm", duration, peak_memory, file_size * len(algorithms))
+
+        file_hasher = FileHasher(algorithms=algorithms)
+        result, duration, peak_memory = measure(file_hasher.hash_file, file_path)
+        print_result("single read for all algorithms", duration, peak_memory,
+                     file_size * len(algorithms))
+
+        assert result == expected
+
+    finally:
+        shutil.rmtree(directory)
+
+
+def make_checkpoint_value(index):
+    """
+    Make a value similar to a manifest entry.
+    """
+
+    return json.dumps([2049, index, 4096, 1500000000000000000 + index, 1500000000000000000 + index,
+                       33188, 1000, 1000])
+
+
+def benchmark_checkpoint_store(entry_counts=None, lookups=10000):
+    """
+    Measure the time to bulk-load, re-open and look up entries in the checkpoint store and compare
+    it to loading the same state from a single JSON document.
+    """
+
+    if entry_counts is None:
+        entry_counts = [int(count) for count in
+                        os.environ.get("BENCHMARK_CHECKPOINT_ENTRIES", "1000000").split(",")]
+
+    for entry_count in entry_counts:
+        directory = tempfile.mkdtemp()
+
+        try:
+            print("\nCheckpoint state with %i entries" % entry_count)
+
+            store_file_path = os.path.join(directory, "state.sqlite")
+            keys = ["/data/dir_%i/file_%i.txt" % (index // 1000, index) for index in range(lookups)]
+
+            # Bulk-load the entries
+            def bulk_load():
+                with CheckpointStore(store_file_path) as store:
+                    store.start_generation("manifest")
+
+                    for index in range(entry_count):
+                        store.put("manifest", "/data/dir_%i/file_%i.txt" % (index // 1000, index),
+                                  make_checkpoint_value(index))
+
+            _, duration, peak_memory = measure(bulk_load)
+            print_result("bulk upsert", duration, peak_memory, items=entry_count)
+
+            print("%-40s size=%.1fMB" % ("database file",
+                                         os.path.getsize(store_file_path) / float(MB)))
+
+            # Re-open the store (this is the cost of loading the state on each run)
+            store, duration, peak_memory = measure(CheckpointStore, store_file_path)
+            print_result("open", duration, peak_memory)
+
+            # Look up random entries
+            random.shuffle(keys)
+
+            def look_up():
+                for key in keys:
+                    assert store.get("manifest", key) is not None
+
+            _, duration, peak_memory = measure(look_up)
+            print_result("lookup (%.1fus each)" % (duration / lookups * 1000000), duration,
+                         peak_memory, items=lookups)
+
+            # Find the stale entries (all of them since a new generation was started)
+            store.start_generation("manifest")
+
+            stale_count, duration, peak_memory = measure(lambda: sum(1 for _ in store.iter_stale("manifest")))
+            print_result("scan of the stale entries", duration, peak_memory, items=stale_count)
+
+            store.close()
+
+            # Compare against loading the state from a single JSON document
+            if entry_count <= 1000000:
+                json_file_path = os.path.join(directory, "state.json")
+
+                with open(json_file_path, 'w') as file:
+                    json.dump(dict(("/data/dir_%i/file_%i.txt" % (index // 1000, index),
+                                    json.loads(make_checkpoint_value(index)))
+                                   for index in range(entry_count)), file)
+
+                def load_json():
+                    with open(json_file_path, 'r') as file:
+                        return json.load(file)
+
+                _, duration, peak_memory = measure(load_json)
+                print_result("JSON document load", duration, peak_memory, items=entry_count)
+
+        finally:
+            shutil.rmtree(directory)
+
+
+def make_tree(directory, depth, breadth, files_per_directory):
+    """
+    Make a tree of directories with the given depth where each directory has the given number of
+    sub-directories and (empty) files. Returns the total number of directories and files made.
+    """
+
+    directory_count = 0
+    file_count = 0
+
+    for index in range(files_per_directory):
+        open(os.path.join(directory, "file_%i.txt" % index), 'w').close()
+        file_count += 1
+
+    if depth > 0:
+        for index in range(breadth):
+            sub_directory = os.path.join(directory, "dir_%i" % index)
+            os.mkdir(sub_directory)
+
+            sub_directory_count, sub_file_count = make_tree(sub_directory, depth - 1, breadth,
+                                                            files_per_directory)
+
+            directory_count += sub_directory_count + 1
+            file_count += sub_file_count
+
+    return directory_count, file_count
+
+
+class LatencyDirEntry(object):
+    """
+    Wraps a DirEntry so that getting the stat result incurs a delay (like a network file-system).
+    """
+
+    def __init__(self, entry, latency):
+        self.entry = entry
+        self.latency = latency
+        self.name = entry.name
+        self.path = entry.path
+        self.stat_result = None
+
+    def inode(self):
+        return self.entry.inode()
+
+    def is_dir(self, follow_symlinks=True):
+        return self.entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def is_file(self, follow_symlinks=True):
+        return self.entry.is_file(follow_symlinks=follow_symlinks)
+
+    def is_symlink(self):
+        return self.entry.is_symlink()
+
+    def stat(self, follow_symlinks=True):
+        if self.stat_result is None:
+            time.sleep(self.latency)
+            self.stat_result = self.entry.stat(follow_symlinks=follow_symlinks)
+
+        return self.stat_result
+
+
+class LatencyScandir(object):
+    """
+    Wraps os.scandir() so that listing a directory incurs a delay (like a network file-system).
+    """
+
+    def __init__(self, scandir, latency):
+        self.scandir = scandir
+        self.latency = latency
+
+    def __call__(self, path):
+        time.sleep(self.latency)
+
+        with self.scandir(path) as scandir_it:
+            entries = [LatencyDirEntry(entry, self.latency) for entry in scandir_it]
+
+        return LatencyScandirIterator(entries)
+
+
+class LatencyScandirIterator(object):
+    """
+    An iterator over the listed entries that can be used as a context manager like the result of
+    os.scandir().
+    """
+
+    def __init__(self, entries):
+        self.entries = iter(entries)
+
+    def __iter__(self):
+        return self.entries
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+def benchmark_traversal(latency=0.002, depth=3, breadth=6, files_per_directory=10,
+                        worker_counts=(1, 4, 16, 32)):
+    """
+    Compare the time to scan a tree on a stand-in for a high-latency file-system (each directory
+    listing and stat call is delayed) with different numbers of traversal threads.
+    """
+
+    directory = tempfile.mkdtemp()
+    scandir = os.scandir
+
+    try:
+        directory_count, file_count = make_tree(directory, depth, breadth, files_per_directory)
+
+        print("\nScanning %i directories and %i files with %.1fms of latency per call" %
+              (directory_count, file_count, latency * 1000))
+
+        os.scandir = LatencyScandir(scandir, latency)
+
+        expected = None
+
+        for workers in worker_counts:
+            results, duration, peak_memory = measure(
+                lambda: list(FileMetaDataModularInput.iter_files_data(directory, latest_time=0,
+                                                                      traversal_workers=workers)))
+
+            print_result("%i traversal threads" % workers, duration, peak_memory,
+                         items=len(results))
+
+            paths = [result['path'] for result in results]
+
+            if expected is None:
+                expected = paths
+
+            assert paths == expected
+
+    finally:
+        os.scandir = scandir
+        shutil.rmtree(directory)
+
+
+def benchmark_scan_processes(file_count=None, process_counts=None):
+    """
+    Compare the time to scan a tree (and serialize the events) in a single process vs. sharding
+    the top-level sub-directories across processes.
+    """
+
+    if file_count is None:
+        file_count = int(os.environ.get("BENCHMARK_SCAN_FILES", "1000000"))
+
+    # Include a single worker process so that the scaling is measured against the same serializer
+    # and sharding overhead
+    if process_counts is None:
+        process_counts = sorted(set([1, 2, 4, os.cpu_count() or 1]))
+
+    directory = tempfile.mkdtemp()
+
+    try:
+        # Make a tree with 16 top-level directories that are three levels deep
+        directories = 16 + 16 ** 2 + 16 ** 3
+        directory_count, file_count = make_tree(directory, 3, 16,
+                                                max(1, file_count // (directories + 1)))
+
+        print("\nScanning %i directories and %i files" % (directory_count, file_count))
+
+        modular_input = FileMetaDataModularInput()
+        output_options = {'stanza': 'file_meta_data://benchmark', 'sourcetype': 'file_meta_data',
+                          'source': 'benchmark', 'index': 'main', 'unbroken': True,
+                          'close': True}
+
+        # Time the scans without tracemalloc since the worker processes would inherit it
+        def scan_single_process():
+            for result in FileMetaDataModularInput.iter_files_data(directory, latest_time=0):
+                result['time'] = time.strftime("%a %b %d %H:%M:%S %Y")
+                yield modular_input.create_event_string(result, **output_options)
+
+        start = time.time()
+        expected = sum(1 for _ in scan_single_process())
+        print_result("unsharded", time.time() - start, None, items=expected)
+
+        for processes in process_counts:
+            start = time.time()
+            count = sum(1 for _ in modular_input.iter_sharded_events(directory, processes,
+                                                                     output_options,
+                                                                     latest_time=0))
+            print_result("sharded, %i workers" % processes, time.time() - start, None, items=count)
+
+            assert count == expected
+
+    finally:
+        shutil.rmtree(directory)
+
+
+def benchmark_record_memory(depth=3, breadth=10, files_per_directory=90):
+    """
+    Compare the memory held by the records of a tree when each is a dictionary of the formatted
+    fields vs. a FileRecord.
+    """
+
+    directory = tempfile.mkdtemp()
+
+    try:
+        directory_count, file_count = make_tree(directory, depth, breadth, files_per_directory)
+
+        print("\nHolding the records of %i directories and %i files" %
+              (directory_count, file_count))
+
+        # Measure the memory still held once the records are made (the dictionaries are made
+        # the way get_file_data() made them before the fields were formatted lazily)
+        def retained_memory(function):
+            tracemalloc.start()
+
+            try:
+                retained = function()
+                size = tracemalloc.get_traced_memory()[0]
+            finally:
+                tracemalloc.stop()
+
+            return retained, size
+
+        def make_records():
+            return list(FileMetaDataModularInput.iter_files_data(directory, latest_time=0))
+
+        def make_dictionaries():
+            return [collections.OrderedDict(record.items()) for record in make_records()]
+
+        dictionaries, dictionaries_size = retained_memory(make_dictionaries)
+        records, records_size = retained_memory(make_records)
+
+        for name, size in (("OrderedDict", dictionaries_size), ("FileRecord", records_size)):
+            print("%-40s bytes_per_record=%i total=%.1fMB" %
+                  (name, size // len(records), float(size) / MB))
+
+        assert len(records) == len(dictionaries)
+
+    finally:
+        shutil.rmtree(directory)
+
+
+def benchmark_fields(depth=3, breadth=10, files_per_directory=40,
+                     fields=('size', 'mtime_epoch')):
+    """
+    Compare the time to scan a tree (and serialize the events) and the size of the events with all
+    of the fields vs. only some of them.
+    """
+
+    directory = tempfile.mkdtemp()
+
+    try:
+        directory_count, file_count = make_tree(directory, depth, breadth, files_per_directory)
+
+        print("\nScanning %i directories and %i files" % (directory_count, file_count))
+
+        modular_input = FileMetaDataModularInput()
+        event_serializer = modular_input.make_event_serializer(
+            'file_meta_data://benchmark', 'file_meta_data', 'benchmark', 'main', unbroken=True,
+            close=True)
+
+        def scan(fields):
+            event_bytes = 0
+
+            for result in FileMetaDataModularInput.iter_files_data(directory, latest_time=0,
+                                                                   fields=fields):
+                result['time'] = time.strftime("%a %b %d %H:%M:%S %Y")
+                event_bytes += len(event_serializer.serialize_event(result))
+
+            return event_bytes
+
+        # Time the scans without tracemalloc since it slows down the allocations
+        for name, selected_fields in (("all fields", None),
+                                      ("fields=path,%s" % ",".join(fields), frozenset(fields))):
+            start = time.time()
+            event_bytes = scan(selected_fields)
+            duration = time.time() - start
+
+            print_result(name, duration, None, items=directory_count + file_count)
+            print("    %i bytes per event" % (event_bytes // (directory_count + file_count + 1)))
+
+    finally:
+        shutil.rmtree(directory)
+
+
+def benchmark_path_filter(path_count=100000):
+    """
+    Compare matching the paths against 50 wildcards one at a time with fnmatch vs. a single
+    combined regular expression vs. the PathFilter (which sorts the wildcards into classes that
+    don't need a regular expression).
+    """
+
+    extensions = ["log", "conf", "txt", "json", "xml", "csv", "gz", "zip", "tar", "bak", "tmp",
+                  "py", "js", "html", "css", "md", "ini", "cfg", "yml", "yaml", "sql", "db",
+                  "pdf", "doc", "xls", "png", "jpg", "gif", "svg", "sh"]
+
+    patterns = ["*." + extension for extension in extensions]
+    patterns += ["Makefile", "README", "LICENSE", "Dockerfile", "core"]
+    patterns += ["core.*", "access_log*", "error_log*", "catalina*", "messages*"]
+    patterns += ["*~", "*.swp.orig", "*_backup", "*-old", "*.rej"]
+    patterns += ["*.[0-9]", "*.log.[0-9]*", "data_??.bin", "/var/log/*/audit*", "*/cache/*.dat"]
+
+    random.seed(1)
+
+    names = ["file_%i.%s" % (index, random.choice(extensions + ["bin", "dat", "so", "o"]))
+             for index in range(path_count // 2)]
+    names += ["other_%i_%s" % (index, random.choice(["log", "data", "x", "old"]))
+              for index in range(path_count - len(names))]
+
+    paths = [os.path.join(os.sep, "var", "log", "dir_%i" % (index % 100), name)
+             for index, name in enumerate(names)]
+
+    print("\nMatching %i paths against %i wildcards" % (len(paths), len(patterns)))
+
+    def match_fnmatch():
+        count = 0
+
+        for path in paths:
+            name = os.path.basename(path)
+
+            for pattern in patterns:
+                if fnmatch.fnmatchcase(path if '/' in pattern else name, pattern):
+                    count += 1
+                    break
+
+        return count
+
+    name_regex = re.compile('|'.join('(?:%s)' % fnmatch.translate(pattern)
+                                     for pattern in patterns if '/' not in pattern))
+    path_regex = re.compile('|'.join('(?:%s)' % fnmatch.translate(pattern)
+                                     for pattern in patterns if '/' in pattern))
+
+    def match_regex():
+        return sum(1 for path in paths
+                   if name_regex.match(os.path.basename(path)) or path_regex.match(path))
+
+    path_filter = PathFilter(patterns)
+
+    def match_path_filter():
+        return sum(1 for path in paths if path_filter.match(path))
+
+    expected, duration, _ = measure(match_fnmatch)
+    print_result("fnmatch per wildcard", duration, None, items=len(paths))
+
+    count, duration, _ = measure(match_regex)
+    print_result("combined regular expression", duration, None, items=len(paths))
+    assert count == expected
+
+    count, duration, _ = measure(match_path_filter)
+    print_result("PathFilter", duration, None, items=len(paths))
+    assert count == expected
+
+
+def benchmark_event_serializer(event_count=100000):
+    """
+    Compare the rate of serializing events by building a DOM for each event vs. building the
+    string directly.
+    """
+
+    directory = tempfile.mkdtemp()
+
+    try:
+        file_path = make_file(directory, 1024, name="sample file.log")
+        record, _ = FileMetaDataModularInput.get_file_data(file_path, latest_time=0)
+        record['time'] = time.strftime("%a %b %d %H:%M:%S %Y")
+
+    finally:
+        shutil.rmtree(directory)
+
+    modular_input = FileMetaDataModularInput()
+    output_options = {'stanza': 'file_meta_data://benchmark', 'sourcetype': 'file_meta_data',
+                      'source': 'benchmark', 'index': 'main', 'unbroken': True, 'close': True}
+
+    print("\nSerializing %i events with %i fields" % (event_count, len(record)))
+
+    def serialize_dom():
+        for _ in range(event_count):
+            modular_input.create_event_string(record, **output_options)
+
+    serializer = modular_input.make_event_serializer(**output_options)
+
+    def serialize_string():
+        for _ in range(event_count):
+            serializer.serialize(record)
+
+    # Time the serialization without tracemalloc since it slows down the allocations
+    start = time.time()
+    serialize_dom()
+    print_result("create_event_string() (minidom)", time.time() - start, None, items=event_count)
+
+    start = time.time()
+    serialize_string()
+    print_result("XMLEventSerializer", time.time() - start, None, items=event_count)
+
+    assert serializer.serialize(record) == modular_input.create_event_string(record,
+                                                                              **output_options)
+
+
+class DiscardingHECRequestHandler(BaseHTTPRequestHandler):
+    """
+    Accepts the requests to the HTTP Event Collector (over keep-alive connections) and discards the
+    events.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    # Send the headers and the body of the response without waiting for the client to acknowledge
+    # the headers (which it delays)
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+
+        response = b'{"text":"Success","code":0}'
+
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args):
+        pass
+
+
+def benchmark_hec(event_count=100000, batch_size=500):
+    """
+    Compare the rate of outputting events as XML on standard output (written to /dev/null) vs.
+    sending them to a local stub of the HTTP Event Collector.
+    """
+
+    directory = tempfile.mkdtemp()
+
+    try:
+        file_path = make_file(directory, 1024, name="sample file.log")
+        record, _ = FileMetaDataModularInput.get_file_data(file_path, latest_time=0)
+        record['time'] = time.strftime("%a %b %d %H:%M:%S %Y")
+
+    finally:
+        shutil.rmtree(directory)
+
+    modular_input = FileMetaDataModularInput()
+    output_options = {'stanza': 'file_meta_data://benchmark', 'sourcetype': 'file_meta_data',
+                      'source': 'benchmark', 'index': 'main', 'unbroken': True, 'close': True}
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), DiscardingHECRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:%i/services/collector/event' % server.server_address[1]
+
+    print("\nOutputting %i events in batches of %i" % (event_count, batch_size))
+
+    def output(event_serializer, event_sink):
+        for _ in range(event_count):
+            event_sink.add(event_serializer.serialize_event(record))
+
+        event_sink.close()
+
+    try:
+        # Time the output without tracemalloc since it slows down the allocations
+        with open(os.devnull, 'w') as devnull:
+            event_serializer = modular_input.make_event_serializer(**output_options)
+            event_sink = EventBatcher(functools.partial(modular_input.output_event_string,
+                                                        out=devnull), batch_size)
+
+            start = time.time()
+            output(event_serializer, event_sink)
+            print_result("stdout (XML)", time.time() - start, None, items=event_count)
+
+        event_serializer = modular_input.make_event_serializer(output_mode='hec',
+                                                               **output_options)
+
+        for name, options in (("HEC", {'compress': False}),
+                              ("HEC (gzip)", {}),
+                              ("HEC (gzip, 4 connections)", {'connections': 4})):
+
+            event_sink = HECEventSink(url, 'benchmark', batch_size, **options)
+
+            start = time.time()
+            output(event_serializer, event_sink)
+            duration = time.time() - start
+
+            print_result(name, duration, None, items=event_count)
+            print("    %.1f bytes per event sent, %i connections opened" %
+                  (float(event_sink.get_stats()['hec_bytes_sent']) / event_count,
+                   event_sink.pool.opened))
+
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+# The distributions of the sizes of the files of the synthetic trees; each is a list of tuples of
+# the share of the files and the range of their sizes (in bytes)
+SIZE_DISTRIBUTIONS = {
+    'empty': [(1.0, 0, 0)],
+    'small': [(1.0, 0, 4 * 1024)],
+    'mixed': [(0.7, 0, 4 * 1024), (0.25, 4 * 1024, 64 * 1024), (0.05, 64 * 1024, MB)],
+    'large': [(0.5, 64 * 1024, MB), (0.5, MB, 8 * MB)],
+}
+
+# The shape of the synthetic tree (this can be changed with the BENCHMARK_TREE environment
+# variable, e.g. "files=100000,depth=4,fanout=8,sizes=small")
+DEFAULT_TREE_SPEC = collections.OrderedDict([
+    ('files', 10000),
+    ('depth', 3),
+    ('fanout', 8),
+    ('sizes', 'mixed'),
+    ('hard_links', 0.05),
+    ('symlinks', 0.05),
+    ('seed', 1),
+])
+
+
+def get_tree_spec(value=None):
+    """
+    Get the shape of the synthetic tree from a string of comma-separated name=value pairs that
+    override the defaults (see DEFAULT_TREE_SPEC).
+    """
+
+    spec = collections.OrderedDict(DEFAULT_TREE_SPEC)
+
+    if value is None:
+        value = os.environ.get("BENCHMARK_TREE", "")
+
+    for pair in value.split(","):
+        if not pair.strip():
+            continue
+
+        name, _, setting = pair.partition("=")
+        name = name.strip()
+
+        if name not in spec:
+            raise ValueError("'%s' is not a setting of the synthetic tree" % name)
+
+        spec[name] = type(spec[name])(setting.strip())
+
+    if spec['sizes'] not in SIZE_DISTRIBUTIONS:
+        raise ValueError("'%s' is not a size distribution (use one of %s)" %
+                         (spec['sizes'], ", ".join(sorted(SIZE_DISTRIBUTIONS))))
+
+    return spec
+
+
+def make_synthetic_tree(directory, files=10000, depth=3, fanout=8, sizes='mixed', hard_links=0.0,
+                        symlinks=0.0, seed=1):
+    """
+    Make a tree of directories with the given depth where each directory has the given number of
+    sub-directories and the files are spread evenly across the directories. The tree (including
+    the contents of the files) is the same each time for the same settings.
+
+    Returns a dictionary with the number of directories, files, hard links and symbolic links
+    made and the total size of the files.
+
+    Arguments:
+    directory -- The directory to make the tree in
+    files -- The number of files (including the links)
+    depth -- The number of levels of sub-directories
+    fanout -- The number of sub-directories of each directory
+    sizes -- The name of the distribution of the sizes of the files (see SIZE_DISTRIBUTIONS)
+    hard_links -- The share of the files that are hard links to other files
+    symlinks -- The share of the files that are symbolic links to other files
+    seed -- The seed of the random choices
+    """
+
+    rng = random.Random(seed)
+    distribution = SIZE_DISTRIBUTIONS[sizes]
+
+    stats = collections.OrderedDict([('directories', 0), ('files', 0), ('hard_links', 0),
+                                     ('symlinks', 0), ('bytes', 0)])
+
+    # Make the directories (breadth first so that the files are spread across the levels)
+    directories = [directory]
+    level = [directory]
+
+    for _ in range(depth):
+        next_level = []
+
+        for parent in level:
+            for index in range(fanout):
+                sub_directory = os.path.join(parent, "dir_%i" % index)
+                os.mkdir(sub_directory)
+                next_level.append(sub_directory)
+
+        directories.extend(next_level)
+        level = next_level
+
+    stats['directories'] = len(directories) - 1
+
+    # Make the files
+    regular_files = []
+
+    for index in range(files):
+        file_path = os.path.join(directories[index % len(directories)], "file_%i.dat" % index)
+        choice = rng.random()
+
+        if regular_files and choice < symlinks:
+            target = rng.choice(regular_files)
+            os.symlink(os.path.relpath(target, os.path.dirname(file_path)), file_path)
+            stats['symlinks'] += 1
+
+        elif regular_files and choice < symlinks + hard_links:
+            os.link(rng.choice(regular_files), file_path)
+            stats['hard_links'] += 1
+
+        else:
+            # Pick the range of the size and then the size within it
+            bucket = rng.random()
+
+            for share, minimum, maximum in distribution:
+                bucket -= share
+
+                if bucket < 0:
+                    break
+
+            size = rng.randint(minimum, maximum)
+
+            with open(file_path, 'wb') as file:
+                file.write(rng.randbytes(size))
+
+            regular_files.append(file_path)
+            stats['bytes'] += size
+
+        stats['files'] += 1
+
+    return stats
+
+
+class SyscallCounter(object):
+    """
+    Counts the system calls made while it is active. The reads and writes are counted by the
+    kernel (from /proc/self/io on Linux); the directory listings, stat calls and opens are
+    counted by wrapping os.scandir(), os.stat(), os.lstat() and the stat() function of the
+    directory entries and by an audit hook (for the files opened).
+    """
+
+    hook_installed = False
+    active = None
+
+    def __init__(self):
+        self.counts = collections.Counter()
+        self.scandir = None
+        self.stat = None
+        self.lstat = None
+        self.io_start = None
+
+    @classmethod
+    def audit(cls, event, args):
+        # Audit hooks cannot be removed so this one is installed once and checks for a counter
+        if cls.active is not None and event == 'open':
+            cls.active.counts['open'] += 1
+
+    @classmethod
+    def read_io_counts(cls):
+        """
+        Get the number of read and write system calls made by the process (None if this isn't
+        supported on this host).
+        """
+
+        try:
+            with open("/proc/self/io") as file:
+                counts = dict(line.split(": ") for line in file.read().splitlines())
+        except (IOError, ValueError):
+            return None
+
+        return int(counts['syscr']), int(counts['syscw'])
+
+    def __enter__(self):
+        if not SyscallCounter.hook_installed:
+            sys.addaudithook(SyscallCounter.audit)
+            SyscallCounter.hook_installed = True
+
+        self.scandir = os.scandir
+        self.stat = os.stat
+        self.lstat = os.lstat
+
+        os.scandir = CountingScandir(self.scandir, self.counts)
+        os.stat = functools.partial(self.count_call, self.stat, 'stat')
+        os.lstat = functools.partial(self.count_call, self.lstat, 'stat')
+
+        SyscallCounter.active = self
+        self.io_start = self.read_io_counts()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        io_end = self.read_io_counts()
+
+        SyscallCounter.active = None
+
+        os.scandir = self.scandir
+        os.stat = self.stat
+        os.lstat = self.lstat
+
+        if self.io_start is not None and io_end is not None:
+            self.counts['read'] += io_end[0] - self.io_start[0]
+            self.counts['write'] += io_end[1] - self.io_start[1]
+
+    def count_call(self, function, name, *args, **kwargs):
+        self.counts[name] += 1
+        return function(*args, **kwargs)
+
+
+class CountingDirEntry(object):
+    """
+    Wraps a DirEntry so that the stat calls it makes to the file-system are counted. Like a
+    DirEntry, the results are cached and an entry that isn't a symbolic link only needs a single
+    call regardless of whether the link would be followed.
+    """
+
+    def __init__(self, entry, counts):
+        self.entry = entry
+        self.counts = counts
+        self.name = entry.name
+        self.path = entry.path
+        self.stat_results = {}
+
+    def inode(self):
+        return self.entry.inode()
+
+    def is_dir(self, follow_symlinks=True):
+        return self.entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def is_file(self, follow_symlinks=True):
+        return self.entry.is_file(follow_symlinks=follow_symlinks)
+
+    def is_symlink(self):
+        return self.entry.is_symlink()
+
+    def stat(self, follow_symlinks=True):
+        follows = follow_symlinks and self.entry.is_symlink()
+
+        if follows not in self.stat_results:
+            self.counts['stat'] += 1
+            self.stat_results[follows] = self.entry.stat(follow_symlinks=follow_symlinks)
+
+        return self.stat_results[follows]
+
+
+class CountingScandir(object):
+    """
+    Wraps os.scandir() so that the directory listings (and the stat calls of the entries) are
+    counted.
+    """
+
+    def __init__(self, scandir, counts):
+        self.scandir = scandir
+        self.counts = counts
+
+    def __call__(self, path):
+        self.counts['scandir'] += 1
+
+        with self.scandir(path) as scandir_it:
+            entries = [CountingDirEntry(entry, self.counts) for entry in scandir_it]
+
+        return LatencyScandirIterator(entries)
+
+
+def reset_peak_rss():
+    """
+    Reset the peak resident set size of the process (this is only supported on Linux); returns
+    true if it was reset.
+    """
+
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+    except IOError:
+        return False
+
+    return True
+
+
+def get_peak_rss():
+    """
+    Get the peak resident set size of the process (in bytes).
+    """
+
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except IOError:
+        pass
+
+    # Fall back to the peak of the lifetime of the process (this is in bytes on macOS)
+    import resource
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+
+def measure_operation(name, function, items, data_size=None):
+    """
+    Run the operation, print the result and return the measurements as a dictionary. The
+    operation is run twice: once to time it and to get the peak RSS and once with the system
+    calls counted (since counting them slows it down).
+
+    Arguments:
+    name -- The name of the operation
+    function -- The function that runs the operation
+    items -- The number of files (and directories) the operation handles
+    data_size -- The number of bytes the operation reads (if it reads the files)
+    """
+
+    reset_peak_rss()
+
+    start = time.time()
+    function()
+    duration = time.time() - start
+
+    peak_rss = get_peak_rss()
+
+    with SyscallCounter() as counter:
+        function()
+
+    result = collections.OrderedDict()
+    result['items'] = items
+    result['seconds'] = round(duration, 4)
+    result['files_per_sec'] = round(items / max(duration, 0.000001), 1)
+
+    if data_size is not None:
+        result['mb_per_sec'] = round(data_size / float(MB) / max(duration, 0.000001), 1)
+
+    result['peak_rss_mb'] = round(peak_rss / float(MB), 1)
+    result['syscalls'] = collections.OrderedDict(sorted(counter.counts.items()))
+    result['syscalls_per_file'] = round(sum(counter.counts.values()) / float(max(items, 1)), 2)
+
+    print_result(name, duration, None, data_size=data_size, items=items)
+    print("    peak_rss=%.1fMB syscalls=%s" %
+          (result['peak_rss_mb'],
+           " ".join("%s:%i" % (call, count) for call, count in result['syscalls'].items())))
+
+    return result
+
+
+def compare_results(results, baseline, tolerance=0.1):
+    """
+    Print how the results compare to those of a baseline run; returns the names of the
+    operations whose rate dropped by more than the tolerance.
+
+    Arguments:
+    results -- The results of benchmark_synthetic_tree()
+    baseline -- The results of an earlier run
+    tolerance -- The share of the rate that may be lost before it is considered a regression
+    """
+
+    if results['tree'] != baseline.get('tree', None):
+        print("Warning: the baseline was run against a different tree (%s)" %
+              json.dumps(baseline.get('tree', None)))
+
+    regressions = []
+
+    print("\nCompared to the baseline")
+
+    for name, result in results['operations'].items():
+        baseline_result = baseline['operations'].get(name, None)
+
+        if baseline_result is None:
+            continue
+
+        change = result['files_per_sec'] / max(baseline_result['files_per_sec'], 0.000001) - 1
+        syscalls = sum(result['syscalls'].values())
+        baseline_syscalls = sum(baseline_result['syscalls'].values())
+
+        if change < -tolerance:
+            regressions.append(name)
+
+        print("%-40s rate=%+.1f%% peak_rss=%+.1fMB syscalls=%+i%s" %
+              (name, change * 100, result['peak_rss_mb'] - baseline_result['peak_rss_mb'],
+               syscalls - baseline_syscalls, " REGRESSION" if change < -tolerance else ""))
+
+    return regressions
+
+
+def benchmark_synthetic_tree(tree_spec=None, results_path=None, baseline_path=None):
+    """
+    Measure the rate, peak RSS and number of system calls of the parts of a scan (the walk and
+    stat calls, the hashing, the ACL lookups and the output of the events) separately on a
+    reproducible synthetic tree. The results are saved as JSON (to the path in
+    BENCHMARK_RESULTS) and compared to those of an earlier run if BENCHMARK_BASELINE is set to
+    the path of its results.
+    """
+
+    if tree_spec is None:
+        tree_spec = get_tree_spec()
+
+    if results_path is None:
+        results_path = os.path.join(REPOSITORY_PATH,
+                                    os.environ.get('BENCHMARK_RESULTS',
+                                                   'tmp/benchmark_results.json'))
+
+    if baseline_path is None and os.environ.get('BENCHMARK_BASELINE', None):
+        baseline_path = os.path.join(REPOSITORY_PATH, os.environ['BENCHMARK_BASELINE'])
+
+    directory = tempfile.mkdtemp()
+
+    try:
+        tree = make_synthetic_tree(directory, **tree_spec)
+
+        print("\nScanning a synthetic tree with %i directories and %i files (%i hard links, %i "
+              "symbolic links, %.1fMB)" % (tree['directories'], tree['files'], tree['hard_links'],
+                                           tree['symlinks'], tree['bytes'] / float(MB)))
+
+        operations = collections.OrderedDict()
+
+        # Walk the tree (with the stat calls) without hashing the files
+        records = []
+
+        def scan():
+            records[:], _ = FileMetaDataModularInput.get_files_data(directory, latest_time=0)
+
+        operations['get_files_data'] = measure_operation("get_files_data", scan,
+                                                         tree['directories'] + tree['files'] + 1)
+
+        # Hash the files (including those that are hard links since they are hashed by the scan)
+        file_paths = [record['path'] for record in records
+                      if not record['is_directory'] and not os.path.islink(record['path'])]
+        data_size = sum(os.path.getsize(file_path) for file_path in file_paths)
+
+        def hash_files():
+            file_hasher = FileHasher()
+
+            for file_path in file_paths:
+                FileMetaDataModularInput.get_file_hash(file_path, file_hasher=file_hasher)
+
+        operations['get_file_hash'] = measure_operation("get_file_hash", hash_files,
+                                                        len(file_paths), data_size)
+
+        # Look up the owners and groups (given the stat results like the scan does)
+        if os.name == 'posix':
+            stat_results = [(record['path'], os.lstat(record['path'])) for record in records]
+
+            def get_acls():
+                identity_cache = IdentityCache()
+
+                for file_path, stat_info in stat_results:
+                    FileMetaDataModularInput.get_nix_acl_data(file_path, stat_info=stat_info,
+                                                              identity_cache=identity_cache)
+
+            operations['get_nix_acl_data'] = measure_operation("get_nix_acl_data", get_acls,
+                                                               len(stat_results))
+
+        # Serialize and write the events (to the null device)
+        modular_input = FileMetaDataModularInput()
+        event_serializer = modular_input.make_event_serializer(
+            'file_meta_data://benchmark', 'file_meta_data', 'benchmark', 'main', unbroken=True,
+            close=True)
+
+        def output_events():
+            with open(os.devnull, 'w') as out:
+                event_batcher = EventBatcher(
+                    functools.partial(modular_input.output_event_string, out=out))
+
+                for record in records:
+                    record['time'] = time.strftime("%a %b %d %H:%M:%S %Y")
+                    event_batcher.add(event_serializer.serialize_event(record))
+
+                event_batcher.flush()
+
+        operations['output_event'] = measure_operation("output_event", output_events,
+                                                       len(records))
+
+    finally:
+        shutil.rmtree(directory)
+
+    results = collections.OrderedDict()
+    results['time'] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    results['python'] = sys.version.split()[0]
+    results['platform'] = sys.platform
+    results['tree'] = tree_spec
+    results['tree_stats'] = tree
+    results['operations'] = operations
+
+    # Save the results
+    results_directory = os.path.dirname(results_path)
+
+    if results_directory and not os.path.isdir(results_directory):
+        os.makedirs(results_directory)
+
+    with open(results_path, 'w') as results_file:
+        json.dump(results, results_file, indent=2)
+
+    print("\nSaved the results to %s" % results_path)
+
+    if baseline_path:
+        with open(baseline_path) as baseline_file:
+            compare_results(results, json.load(baseline_file))
+
+    return results
+
+
+BENCHMARKS = {
+    'checkpoint_store': benchmark_checkpoint_store,
+    'event_serializer': benchmark_event_serializer,
+    'fields': benchmark_fields,
+    'file_hash': benchmark_file_hash,
+    'hash_algorithms': benchmark_hash_algorithms,
+    'hec': benchmark_hec,
+    'path_filter': benchmark_path_filter,
+    'record_memory': benchmark_record_memory,
+    'scan_processes': benchmark_scan_processes,
+    'synthetic_tree': benchmark_synthetic_tree,
+    'traversal': benchmark_traversal,
+}
+
+
+def run_benchmarks(names=None):
+    """
+    Run the benchmarks with the given names (or all of them if no names are provided).
+    """
+
+    if not names:
+        names = sorted(BENCHMARKS.keys())
+
+    for name in names:
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    run_benchmarks(sys.argv[1:])
@@ -1,15 +1,44 @@
 # coding=utf-8
 import unittest
+import collections
+import hashlib
+import json
+import logging
 import sys
 import os
 import re
 import time
+import types
 import errno
+import gzip
+import fnmatch
+import shutil
+import subprocess
+import sqlite3
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.dom import minidom
 # import HTMLTestRunner
 
 sys.path.append(os.path.join("..", "src", "bin"))
 
-from file_meta_data import FilePathField, FileMetaDataModularInput, DataSizeField
+from file_meta_data import FilePathField, FileMetaDataModularInput, DataSizeField, HashAlgorithmsField
+from file_info_app.hashing import FileHasher
+from file_info_app.hec import HECError, HECEventSerializer, HECEventSink
+from file_info_app.checkpoint_store import CheckpointStore
+from file_info_app.hash_cache import HashCache
+from file_info_app.identity import IdentityCache
+from file_info_app.manifest import FileManifest
+from file_info_app.records import FileRecord
+from file_info_app.serialization import XMLEventSerializer, JSONEventSerializer, EventBatcher
+from file_info_app.sharding import ShardedScan
+from file_info_app.telemetry import ScanTelemetry
+from file_info_app.filters import DirectoryFilter, PathFilter
+from file_info_app.throttle import TokenBucket, IOGovernor
+from file_info_app import watcher
+from file_info_app.watcher import Inotify, TreeWatcher
+from benchmark import CountingScandir
 
 path_to_mod_input_lib = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modular_input.zip')
 sys.path.insert(0, path_to_mod_input_lib)
@@ -44,6 +73,29 @@ class TestDurationField(unittest.TestCase):
         self.assertRaises(FieldValidationException, lambda: duration_field.to_python("1 treefrog"))
         self.assertRaises(FieldValidationException, lambda: duration_field.to_python("minute"))
 
+def log_shard(shard, summary, logger_name):
+    """
+    Log a message for the shard (this is run in the worker processes of a ShardedScan).
+    """
+
+    logging.getLogger(logger_name).warning('Scanned shard=%s', shard)
+
+    return [shard]
+
+
+class ListLogHandler(logging.Handler):
+    """
+    Collects the messages that are logged.
+    """
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
 class TestFileMetaDataModularInput(unittest.TestCase):
     """
     Tests for the input class.
@@ -73,6 +125,32 @@ class TestFileMetaDataModularInput(unittest.TestCase):
         result, _ = FileMetaDataModularInput.get_file_data("..")
         self.assertEquals(result['is_directory'], 1)
 
+    def test_get_file_data_fields(self):
+        """
+        Make sure only the requested fields are included (and that the hashes are only computed
+        if they are requested).
+        """
+
+        hash_limit = 1024 * 1024
+
+        result, _ = FileMetaDataModularInput.get_file_data("unit.py", file_hash_limit=hash_limit,
+                                                           fields=frozenset(['size', 'mtime_epoch']))
+
+        self.assertEqual(list(result.keys()), ['path', 'mtime_epoch', 'size'])
+        self.assertEqual(result['size'], os.stat("unit.py").st_size)
+
+        result, _ = FileMetaDataModularInput.get_file_data("unit.py", file_hash_limit=hash_limit,
+                                                           fields=frozenset(['sha224', 'mtime']))
+
+        self.assertEqual(list(result.keys()), ['path', 'sha224', 'mtime'])
+        self.assertEqual(result['mtime'], time.ctime(os.stat("unit.py").st_mtime))
+
+        # Directories are only listed if the counts are requested
+        results = FileMetaDataModularInput.get_files_data("../src", fields=frozenset(['size']))[0]
+
+        self.assertEqual([list(result.keys()) for result in results if 'file_count' in result], [])
+        self.assertTrue('file_count_recursive' in results[-1])
+
     def test_get_files_data_file_count(self):
         """
         Test loading of file count.
@@ -270,6 +348,63 @@ class TestFileMetaDataModularInput(unittest.TestCase):
         if not root_directory_included:
             self.fail("Root directory was not included in the results")
 
+    def test_iter_files_data(self):
+        """
+        Test iterating over the files data and confirm that the records are yielded as they are
+        found and that the latest time is available once the iteration is done.
+        """
+
+        scan_info = {}
+        results = FileMetaDataModularInput.iter_files_data("test_dir", latest_time=0,
+                                                           scan_info=scan_info)
+
+        # Nothing should have been computed until the iteration starts
+        self.assertNotIn('latest_time', scan_info)
+
+        first_result = next(results)
+        self.assertIn('path', first_result)
+
+        results = [first_result] + list(results)
+
+        self.assertEqual(len(results), 11)
+        self.assertTrue(results[-1]['path'].endswith('test_dir'))
+        self.assertEqual(results[-1]['file_count_recursive'], 6)
+        self.assertGreaterEqual(scan_info['latest_time'], 1435391730)
+        self.assertFalse(scan_info['failed'])
+
+    def test_get_files_data_syscalls(self):
+        """
+        Make sure that the walk re-uses the information obtained when listing the directories
+        instead of making additional calls to the file-system for each entry.
+        """
+
+        calls = {'stat': 0, 'scandir': 0}
+
+        original_stat = os.stat
+        original_scandir = os.scandir
+
+        def counting_stat(*args, **kwargs):
+            calls['stat'] += 1
+            return original_stat(*args, **kwargs)
+
+        os.stat = counting_stat
+        os.scandir = CountingScandir(original_scandir, calls)
+
+        try:
+            results, _ = FileMetaDataModularInput.get_files_data("test_dir")
+        finally:
+            os.stat = original_stat
+            os.scandir = original_scandir
+
+        self.assertEqual(len(results), 11)
+
+        # Previously, this took a stat() and an isdir() per entry along with a listing of every
+        # directory twice (22 stats and 10 listings for this tree); now each entry is stat'ed once
+        # (the root directory through os.stat() and the rest through their DirEntry) and each
+        # directory is listed once
+        self.assertEqual(calls['stat'], 11)
+        self.assertEqual(calls['scandir'], 5)
+
     def test_get_file_hash(self):
         """
         Test getting the file hash from the file.
@@ -293,6 +428,260 @@ class TestFileMetaDataModularInput(unittest.TestCase):
     
         self.assertTrue(file_found)    
 
+    def test_get_files_hash_workers(self):
+        """
+        Test getting the hashes using a pool of threads and make sure the records are returned in
+        the same order with the hashes associated with the correct paths.
+        """
+
+        serial_results = list(FileMetaDataModularInput.iter_files_data("test_dir", latest_time=0,
+                                                                       file_hash_limit=10000000))
+
+        parallel_results = list(FileMetaDataModularInput.iter_files_data("test_dir", latest_time=0,
+                                                                         file_hash_limit=10000000,
+                                                                         hash_workers=4))
+
+        self.assertEqual([result['path'] for result in serial_results],
+                         [result['path'] for result in parallel_results])
+
+        self.assertEqual([result.get('sha224') for result in serial_results],
+                         [result.get('sha224') for result in parallel_results])
+
+        for result in parallel_results:
+            if result['path'].endswith('5.txt'):
+                self.assertEqual(result['sha224'], "66f826f054e6b3e2edbaddd34ae7f257d9a1dc1fecdf9bbfc576edf4")
+
+    def test_get_files_traversal_workers(self):
+        """
+        Test listing the directories using a pool of threads and make sure the records are the
+        same (and in the same order) as when the directories are listed one at a time, including
+        when the depth limit and file filter are used.
+        """
+
+        for kwargs in ({}, {'depth_limit': 2}, {'file_filter': re.compile(r".*\.log")}):
+            serial_results = list(FileMetaDataModularInput.iter_files_data("test_dir",
+                                                                           latest_time=0,
+                                                                           **kwargs))
+
+            parallel_results = list(FileMetaDataModularInput.iter_files_data("test_dir",
+                                                                             latest_time=0,
+                                                                             traversal_workers=4,
+                                                                             **kwargs))
+
+            self.assertEqual(serial_results, parallel_results)
+
+    def test_resume_scan(self):
+        """
+        Test stopping a scan once the time budget is used up and resuming it, and make sure that a
+        full pass produces exactly one record per path.
+        """
+
+        expected, _ = FileMetaDataModularInput.get_files_data("test_dir", latest_time=0)
+
+        for traversal_workers in (1, 4):
+            cursor = None
+            runs = 0
+            results = []
+
+            while runs == 0 or cursor is not None:
+                scan_info = {}
+
+                # Use a tiny budget so that each run only scans a single directory
+                results.extend(FileMetaDataModularInput.iter_files_data("test_dir", latest_time=0,
+                                                                        scan_info=scan_info,
+                                                                        traversal_workers=traversal_workers,
+                                                                        max_scan_duration=0.000001,
+                                                                        cursor=cursor))
+
+                self.assertFalse(scan_info['failed'])
+
+                # The cursor is persisted in the checkpoint as JSON
+                cursor = json.loads(json.dumps(scan_info['cursor']))
+                runs += 1
+
+            self.assertEqual(runs, 5)
+            self.assertEqual([result['path'] for result in results],
+                             [result['path'] for result in expected])
+            self.assertEqual(results[-1]['file_count_recursive'], 6)
+            self.assertEqual(results[-1]['directory_count_recursive'], 4)
+
+    def test_get_files_depth_limit_pruned(self):
+        """
+        Make sure that the directories beneath the depth limit are not listed.
+        """
+
+        governor = IOGovernor(max_stat_ops_per_sec=1000000)
+        results, _ = FileMetaDataModularInput.get_files_data("test_dir", latest_time=0,
+                                                             depth_limit=1, governor=governor)
+
+        # One stat for each record and one listing for the root and each of its sub-directories
+        # (but not dir_2a)
+        self.assertEqual(len(results), 6)
+        self.assertEqual(governor.get_stats()['stat_ops'], len(results) + 4)
+
+    def test_max_entries(self):
+        """
+        Make sure that the scan stops with a warning once max_entries is reached.
+        """
+
+        for kwargs in ({'max_entries': 7}, {'max_directories': 2}):
+            scan_info = {}
+            results = list(FileMetaDataModularInput.iter_files_data("test_dir", latest_time=0,
+                                                                    scan_info=scan_info,
+                                                                    **kwargs))
+
+            self.assertEqual(scan_info['limit_reached'], list(kwargs.keys())[0])
+            self.assertEqual(results[-1]['limit_reached'], scan_info['limit_reached'])
+            self.assertLessEqual(results[-1]['entries_scanned'], kwargs.get('max_entries', 7))
+            self.assertLessEqual(results[-1]['directories_scanned'], 3)
+            self.assertGreaterEqual(results[-1]['directories_scanned'], 2)
+
+            # The root directory's record is not included since the totals are incomplete
+            self.assertFalse(any('file_count_recursive' in result for result in results))
+
+        # The limit isn't reached if the tree is small enough
+        scan_info = {}
+        results = list(FileMetaDataModularInput.iter_files_data("test_dir", latest_time=0,
+                                                                scan_info=scan_info,
+                                                                max_entries=10))
+
+        self.assertIsNone(scan_info['limit_reached'])
+        self.assertEqual(results[-1]['file_count_recursive'], 6)
+
+    def test_exclude_dirs(self):
+        """
+        Test pruning the excluded directories from the walk.
+        """
+
+        for exclude in (["dir_2"], ["dir_2/*"], ["dir_2a"]):
+            scan_info = {}
+            directory_filter = DirectoryFilter("test_dir", exclude=exclude)
+
+            for traversal_workers in (1, 4):
+                results = list(FileMetaDataModularInput.iter_files_data("test_dir", latest_time=0,
+                                                                        scan_info=scan_info,
+                                                                        traversal_workers=traversal_workers,
+                                                                        directory_filter=directory_filter))
+
+                paths = [os.path.relpath(result['path'], "test_dir") for result in results]
+
+                self.assertNotIn(os.path.join("dir_2", "dir_2a", "4.txt"), paths)
+                self.assertNotIn(os.path.join("dir_2", "dir_2a"), paths)
+                self.assertIn(os.path.join("dir_1", "5.txt"), paths)
+                self.assertEqual(scan_info['skipped_directories'], 1)
+
+            # Only the contents of dir_2 are excluded by dir_2/*
+            self.assertEqual(os.path.join("dir_2", "3.txt") in paths, exclude != ["dir_2"])
+
+    def test_include_dirs(self):
+        """
+        Test only walking the included directories.
+        """
+
+        scan_info = {}
+        results = list(FileMetaDataModularInput.iter_files_data("test_dir", latest_time=0,
+                                                                scan_info=scan_info,
+                                                                directory_filter=DirectoryFilter("test_dir", include=["dir_2/dir_2a"])))
+
+        paths = [os.path.relpath(result['path'], "test_dir") for result in results]
+
+        # dir_2 is only walked to reach dir_2a and the root record is always included
+        self.assertEqual(paths, [os.path.join("dir_2", "dir_2a"),
+                                 os.path.join("dir_2", "dir_2a", "4.txt"), "."])
+        self.assertEqual(scan_info['skipped_directories'], 2)
+
+    def test_iter_sharded_events(self):
+        """
+        Test scanning the sub-directories in worker processes and make sure the same events are
+        produced as when scanning in a single process (with the root directory last).
+        """
+
+        modular_input = FileMetaDataModularInput()
+        output_options = {'stanza': 'file_meta_data://test', 'sourcetype': 'file_meta_data',
+                          'source': 'test', 'index': 'main', 'unbroken': True, 'close': True}
+
+        def remove_time(event):
+            return re.sub(r" time=&quot;[^&]*&quot;", "", event)
+
+        for depth_limit in (0, 1, 2):
+            scan_info = {}
+            serial_scan_info = {}
+
+            events = ['<stream>%s</stream>' % remove_time(event) for event in
+                      modular_input.iter_sharded_events("test_dir", 2, output_options,
+                                                        latest_time=0, depth_limit=depth_limit,
+                                                        file_hash_limit=10000000,
+                                                        scan_info=scan_info)]
+
+            serial_events = [modular_input.create_event_string(result, **output_options) for result
+                             in FileMetaDataModularInput.iter_files_data("test_dir", latest_time=0,
+                                                                         depth_limit=depth_limit,
+                                                                         file_hash_limit=10000000,
+                                                                         scan_info=serial_scan_info)]
+
+            self.assertEqual(sorted(events), sorted(serial_events))
+            self.assertEqual(events[-1], serial_events[-1])
+            self.assertEqual(scan_info, serial_scan_info)
+
+    def test_sharded_scan_logging(self):
+        """
+        Make sure that the records logged in the worker processes are logged once each by the
+        coordinator (instead of by the workers themselves).
+        """
+
+        logger = logging.getLogger('test_sharded_scan_logging')
+        logger.propagate = False
+        handler = ListLogHandler()
+        logger.addHandler(handler)
+
+        try:
+            shards = ['shard_%i' % index for index in range(4)]
+
+            sharded_scan = ShardedScan(log_shard, 2, logger=logger)
+            sharded_scan.start(shards, logger.name)
+
+            try:
+                items = list(sharded_scan.iter_results())
+            finally:
+                sharded_scan.stop()
+
+            # The workers aren't forked from this process
+            self.assertNotEqual(ShardedScan.get_context().get_start_method(), 'fork')
+
+            self.assertEqual(sorted(items), shards)
+            self.assertEqual(sorted(handler.messages),
+                             ['Scanned shard=%s' % shard for shard in shards])
+        finally:
+            logger.removeHandler(handler)
+
+    def test_get_files_hash_algorithms(self):
+        """
+        Test getting several hashes via the files data, each in its own field.
+        """
+
+        file_hasher = FileHasher(algorithms=['sha256', 'md5'])
+
+        for hash_workers in (1, 4):
+            results, _ = FileMetaDataModularInput.get_files_data("test_dir/dir_1", latest_time=0,
+                                                                 file_hash_limit=10000000,
+                                                                 file_hasher=file_hasher,
+                                                                 hash_workers=hash_workers)
+            file_found = False
+
+            for result in results:
+
+                if result['path'].endswith('5.txt'):
+                    file_found = True
+
+                    with open(result['path'], 'rb') as file:
+                        content = file.read()
+
+                    self.assertEqual(result['sha256'], hashlib.sha256(content).hexdigest())
+                    self.assertEqual(result['md5'], hashlib.md5(content).hexdigest())
+                    self.assertNotIn('sha224', result)
+
+            self.assertTrue(file_found)
+
     def test_get_files_hash_limit(self):
         """
         Test getting the hash but only for files that are under the given size.
@@ -326,120 +715,2108 @@ class TestFileMetaDataModularInput(unittest.TestCase):
         # Check on the file count using the first entry (which should be the top level directory)
         self.assertEqual(results[0]['file_count'], 1)
 
-class TestFileSizeField(unittest.TestCase):
+class TestFileHasher(unittest.TestCase):
     """
-    Tests the file size field.
+    Tests the streaming file hasher.
     """
 
-    def test_file_size_valid(self):
+    def test_hash_file_small_chunks(self):
         """
-        Test converting a file size to an integer.
+        Make sure that the hash is the same regardless of how many reads it takes.
         """
 
-        file_size_field = DataSizeField("test_file_size_valid", "title", "this is a test")
+        file_hasher = FileHasher(chunk_size=3)
 
-        self.assertEqual(file_size_field.to_python("1m"), 1024 * 1024)
-        self.assertEqual(file_size_field.to_python("5m"), 1024 * 1024 * 5)
-        self.assertEqual(file_size_field.to_python("5mb"), 1024 * 1024 * 5)
-        self.assertEqual(file_size_field.to_python("5 mb"), 1024 * 1024 * 5)
-        self.assertEqual(file_size_field.to_python("5 MB"), 1024 * 1024 * 5)
-        self.assertEqual(file_size_field.to_python("5MB"), 1024 * 1024 * 5)
+        self.assertEqual(file_hasher.hash_file("test_dir/1.txt")['sha224'], "5154aaa49392fb275ce7e12a7d3e00901cf9cf3ab10491673f97322f")
 
-        self.assertEqual(file_size_field.to_python("5"), 5)
-        self.assertEqual(file_size_field.to_python("1k"), 1024)
+    def test_hash_file_mmap(self):
+        """
+        Make sure that the hash is the same when the file is memory-mapped.
+        """
 
-    def test_file_size_invalid(self):
+        file_hasher = FileHasher(chunk_size=3, mmap_threshold=1)
+
+        with open("test_dir/1.txt", 'rb') as file:
+            self.assertTrue(file_hasher.use_mmap(file))
+
+        self.assertEqual(file_hasher.hash_file("test_dir/1.txt")['sha224'], "5154aaa49392fb275ce7e12a7d3e00901cf9cf3ab10491673f97322f")
+
+    def test_hash_file_multiple_algorithms(self):
         """
-        Ensure that invalid file sizes are correctly detected as invalid.
+        Make sure that several hashes can be computed from a single read of the file.
         """
 
-        file_size_field = DataSizeField("test_file_size_invalid", "title", "this is a test")
+        file_hasher = FileHasher(algorithms=['sha256', 'md5'])
+        reads = []
 
-        with self.assertRaises(FieldValidationException):
-            file_size_field.to_python("1 treefrog")
+        original_update_from_file = file_hasher.update_from_file
+
+        def counting_update_from_file(file_path, hashers):
+            reads.append(file_path)
+            return original_update_from_file(file_path, hashers)
+
+        file_hasher.update_from_file = counting_update_from_file
+
+        file_hashes = file_hasher.hash_file("test_dir/1.txt")
+
+        with open("test_dir/1.txt", 'rb') as file:
+            content = file.read()
+
+        self.assertEqual(file_hashes, {'sha256': hashlib.sha256(content).hexdigest(),
+                                       'md5': hashlib.md5(content).hexdigest()})
+        self.assertEqual(len(reads), 1)
+
+    def test_hash_file_invalid_algorithm(self):
+        """
+        Make sure that unsupported algorithms are rejected.
+        """
+
+        with self.assertRaises(ValueError):
+            FileHasher(algorithms=['not_an_algorithm'])
+
+        with self.assertRaises(ValueError):
+            FileHasher(algorithms=['shake_128'])
+
+    def test_hash_algorithms_field(self):
+        """
+        Make sure that the list of algorithms is parsed and validated.
+        """
+
+        hash_algorithms_field = HashAlgorithmsField("hash_algorithms", "title", "this is a test")
+
+        self.assertEqual(hash_algorithms_field.to_python("SHA256, md5,blake2b"), ['sha256', 'md5', 'blake2b'])
 
         with self.assertRaises(FieldValidationException):
-            file_size_field.to_python("mb")
+            hash_algorithms_field.to_python("sha256,treefrog")
 
-class TestFileMetaDataWindows(unittest.TestCase):
+    def test_hash_file_reuses_buffer(self):
+        """
+        Make sure that the buffer is allocated once and re-used across files.
+        """
+
+        file_hasher = FileHasher(chunk_size=1024)
+
+        file_hasher.hash_file("test_dir/1.txt")
+        buffer = file_hasher.get_buffer()
+
+        file_hasher.hash_file("test_dir/2.txt")
+        self.assertIs(file_hasher.get_buffer(), buffer)
+        self.assertEqual(len(buffer), 1024)
+
+    def test_bytes_hashed(self):
+        """
+        Make sure that the bytes read are counted (whether or not the file is memory-mapped).
+        """
+
+        expected = os.path.getsize("test_dir/1.txt") + os.path.getsize("test_dir/2.txt")
+
+        for mmap_threshold in (None, 1):
+            file_hasher = FileHasher(chunk_size=3, mmap_threshold=mmap_threshold)
+
+            file_hasher.hash_file("test_dir/1.txt")
+            file_hasher.hash_file("test_dir/2.txt")
+
+            self.assertEqual(file_hasher.bytes_hashed, expected)
+
+class TestFileRecord(unittest.TestCase):
     """
-    Tests the loading of file meta-data on Windows.
+    Tests the record of a file.
     """
 
-    def test_get_windows_acl_data_file(self):
+    def make_expected(self, path, stat_info):
         """
-        Ensure that file ACL data for Windows is returned.
+        Make the fields the way get_file_data() did before the records were stored compactly.
         """
 
-        output = FileMetaDataModularInput.get_windows_acl_data("../src/bin/file_meta_data.py")
+        expected = collections.OrderedDict()
 
-        self.assertEqual(output["owner_sid"][0:5], "S-1-5")
-        self.assertEqual(output["group_sid"][0:5], "S-1-5")
-        self.assertEqual(output["ace_0_type"], ["ACCESS_ALLOWED"])
-        self.assertGreaterEqual(output["ace_0_permissions"].index("FILE_GENERIC_READ"), 0)
- 
-    def test_get_windows_acl_data_dir(self):
+        expected['is_directory'] = 0
+        expected['path'] = os.path.abspath(path)
+
+        for attribute in dir(stat_info):
+            if attribute.startswith("st_"):
+                if 'time' in attribute:
+                    try:
+                        expected[attribute[3:]] = time.ctime(getattr(stat_info, attribute))
+                    except Exception:
+                        expected[attribute[3:]] = getattr(stat_info, attribute)
+
+                    expected[attribute[3:] + "_epoch"] = getattr(stat_info, attribute)
+                else:
+                    expected[attribute[3:]] = getattr(stat_info, attribute)
+
+        return expected
+
+    def test_fields(self):
         """
-        Ensure that directory ACL data for Windows is returned.
+        Make sure the fields are the same (and in the same order) as the stat results.
         """
 
-        output = FileMetaDataModularInput.get_windows_acl_data("../src/bin")
+        stat_info = os.stat("unit.py")
+        record = FileRecord(os.path.abspath("unit.py"), stat_info, False)
 
-        self.assertEqual(output["owner_sid"][0:5], "S-1-5")
-        self.assertEqual(output["group_sid"][0:5], "S-1-5")
-        self.assertEqual(output["ace_0_type"], ["ACCESS_ALLOWED"])
-        self.assertGreaterEqual(output["ace_0_permissions"].index("READ_CONTROL"), 0)
+        expected = self.make_expected("unit.py", stat_info)
 
-class TestFileMetaDataNix(unittest.TestCase):
+        self.assertEqual(list(record.items()), list(expected.items()))
+        self.assertEqual(record['path'], os.path.abspath("unit.py"))
+        self.assertEqual(record['mtime_epoch'], stat_info.st_mtime)
+        self.assertEqual(len(record), len(list(record.keys())))
+        self.assertFalse('owner' in record)
+
+    def test_extra_fields(self):
+        """
+        Make sure fields can be added, changed and removed.
+        """
+
+        stat_info = os.stat("unit.py")
+        record = FileRecord(os.path.abspath("unit.py"), stat_info, False)
+        record.hashes = collections.OrderedDict([('sha224', None)])
+
+        record['time'] = 'now'
+        record['sha224'] = 'abc'
+
+        self.assertEqual(list(record.keys())[-1], 'time')
+        self.assertEqual(list(record.keys())[2], 'sha224')
+        self.assertEqual(record['sha224'], 'abc')
+
+        # Changing a field from the stat results converts the record into a dictionary
+        record['size'] = -1
+        del record['mode']
+
+        self.assertEqual(record['size'], -1)
+        self.assertFalse('mode' in record)
+        self.assertEqual(list(record.keys())[-1], 'time')
+        self.assertRaises(KeyError, lambda: record['mode'])
+
+    def test_shared_strings(self):
+        """
+        Make sure the records of the files in the same directory share the string of the
+        directory.
+        """
+
+        directory = os.path.abspath(".")
+        first = FileRecord(directory + os.sep + "unit.py", os.stat("unit.py"), False)
+        second = FileRecord(os.path.join(directory, "benchmark.py"), os.stat("benchmark.py"),
+                            False)
+
+        self.assertTrue(first.directory is second.directory)
+
+    def test_serialize(self):
+        """
+        Make sure the record is serialized the same as a dictionary of its fields.
+        """
+
+        stat_info = os.stat("unit.py")
+        record = FileRecord(os.path.abspath("unit.py"), stat_info, False)
+        expected = self.make_expected("unit.py", stat_info)
+
+        serializer = XMLEventSerializer("file_meta_data://test", "file_meta_data", "test", "main")
+        self.assertEqual(serializer.serialize(record), serializer.serialize(expected))
+
+        serializer = JSONEventSerializer("file_meta_data://test", "file_meta_data", "test", "main")
+        self.assertEqual(serializer.serialize(record), serializer.serialize(expected))
+
+class TestXMLEventSerializer(unittest.TestCase):
     """
-    Tests the loading of file meta-data on Unix.
+    Tests the serialization of the events.
     """
 
-    def test_get_nix_acl_data_file(self):
+    def test_serialize_golden(self):
         """
-        Ensure that file ACL data for Unix is returned.
+        Make sure the serializer produces exactly the expected output.
         """
 
-        output = FileMetaDataModularInput.get_nix_acl_data("../src/bin/file_meta_data.py")
+        serializer = XMLEventSerializer("file_meta_data://test", "file_meta_data", "test", "main",
+                                        unbroken=True, close=True)
 
-        self.assertGreaterEqual(output["owner_uid"], '1')
-        self.assertGreaterEqual(len(output["owner"]), 1)
-        self.assertGreaterEqual(output["group_uid"], 0)
-        self.assertGreaterEqual(output["permission_mask"], '0')
+        record = collections.OrderedDict([('path', '/tmp/a b&<c>.txt'), ('owner', "o'brien"),
+                                          ('note', 'say "hi"'), ('empty', ''), ('none', None),
+                                          ('ace', ['READ', 'WRITE']), ('size', 12)])
 
-    def test_get_nix_acl_data_dir(self):
+        self.assertEqual(serializer.serialize(record),
+                         '<stream><event unbroken="1" stanza="file_meta_data://test"><data>'
+                         'path=&quot;/tmp/a b&amp;&lt;c&gt;.txt&quot; owner=o\\\'brien '
+                         'note=&quot;say \\&quot;hi\\&quot;&quot; empty=&quot;&quot; none=None '
+                         'ace=READ ace=WRITE size=12</data><index>main</index>'
+                         '<sourcetype>file_meta_data</sourcetype><source>test</source><done/>'
+                         '</event></stream>')
+
+    def test_serialize_same_as_create_event_string(self):
         """
-        Ensure that directory ACL data for Unix is returned.
+        Make sure the serializer produces the same output as the DOM-based
+        create_event_string() byte for byte.
         """
 
-        output = FileMetaDataModularInput.get_nix_acl_data("../src/bin")
+        modular_input = FileMetaDataModularInput()
 
-        self.assertGreaterEqual(len(output["owner"]), 1)
-        self.assertGreaterEqual(output["group_uid"], 0)
-        self.assertGreaterEqual(output["permission_mask"], '0')
+        results, _ = FileMetaDataModularInput.get_files_data("test_dir", latest_time=0)
 
+        results.append(collections.OrderedDict([('path', u'/tmp/\u00e9t\u00e9 & <x> "q" \'a\''),
+                                                ('empty', ''), ('none', None),
+                                                ('values', ['a b', '', 1.5, True]),
+                                                ('unicode', u'\u2603'), ('tabs', 'a\tb\nc')]))
 
-def run_tests():
+        for output_options in ({'stanza': 'file_meta_data://test', 'sourcetype': 'file_meta_data',
+                                'source': 'test', 'index': 'main', 'unbroken': True,
+                                'close': True},
+                               {'stanza': 'file_meta_data://a&"b"', 'sourcetype': None,
+                                'source': '<source>', 'index': 'main', 'host': 'h&h'}):
+
+            serializer = modular_input.make_event_serializer(**output_options)
+
+            for result in results:
+                self.assertEqual(serializer.serialize(result),
+                                 modular_input.create_event_string(result, **output_options))
+
+    def test_serialize_json(self):
+        """
+        Make sure the JSON events include the record as a compact JSON object with the lists as
+        arrays.
+        """
+
+        modular_input = FileMetaDataModularInput()
+        serializer = modular_input.make_event_serializer("file_meta_data://test",
+                                                         "file_meta_data:json", "test", "main",
+                                                         unbroken=True, close=True,
+                                                         output_format="json")
+
+        record = collections.OrderedDict([('path', '/tmp/a b&<c>.txt'), ('size', 12),
+                                          ('none', None), ('ace_0_permissions', ['READ', 'WRITE'])])
+
+        event = serializer.serialize(record)
+        document = minidom.parseString(event)
+        data = document.getElementsByTagName('data')[0].firstChild.data
+
+        self.assertEqual(json.loads(data, object_pairs_hook=collections.OrderedDict), record)
+        self.assertNotIn(', ', data)
+        self.assertEqual(document.getElementsByTagName('sourcetype')[0].firstChild.data,
+                         'file_meta_data:json')
+
+
+class TestEventBatcher(unittest.TestCase):
     """
-    Run the tests.
+    Tests the output of the events in batches.
     """
 
-    loader = unittest.TestLoader()
-    suites = []
-    suites.append(loader.loadTestsFromTestCase(TestFileMetaDataModularInput))
-    suites.append(loader.loadTestsFromTestCase(TestFileSizeField))
-    suites.append(loader.loadTestsFromTestCase(TestDurationField))
+    def test_batch_size(self):
+        """
+        Make sure the events are output in full batches and that the partial batch is output
+        when flushed.
+        """
 
-    if os.name == 'nt':
-        suites.append(loader.loadTestsFromTestCase(TestFileMetaDataWindows))
-    else:
-        print("Warning: Windows specific tests will be skipped since this host is not running Windows")
+        output = []
+        event_batcher = EventBatcher(output.append, batch_size=3)
 
-    if os.name == 'posix':
-        suites.append(loader.loadTestsFromTestCase(TestFileMetaDataNix))
-    else:
+        for index in range(7):
+            event_batcher.add('<event><data>%i</data><done/></event>' % index)
+
+        self.assertEqual(len(output), 2)
+
+        event_batcher.flush()
+        event_batcher.flush()
+
+        self.assertEqual(len(output), 3)
+        self.assertEqual(output[2], '<stream><event><data>6</data><done/></event></stream>')
+        self.assertEqual(output[0].count('<event>'), 3)
+        self.assertTrue(output[0].startswith('<stream><event>'))
+        self.assertTrue(output[0].endswith('</event></stream>'))
+
+    def test_unbatched(self):
+        """
+        Make sure each event is output on its own (the same as without batching) by default.
+        """
+
+        output = []
+        event_batcher = EventBatcher(output.append)
+        serializer = XMLEventSerializer("file_meta_data://test", "file_meta_data", "test", "main",
+                                        unbroken=True, close=True)
+        record = collections.OrderedDict([('path', '/tmp/a'), ('size', 1)])
+
+        event_batcher.add(serializer.serialize_event(record))
+
+        self.assertEqual(output, [serializer.serialize(record)])
+
+    def test_batch_ms(self):
+        """
+        Make sure the batch is output once the events have been held for too long.
+        """
+
+        output = []
+        event_batcher = EventBatcher(output.append, batch_size=1000, batch_ms=50)
+
+        event_batcher.add('<event><data>1</data></event>')
+        event_batcher.add('<event><data>2</data></event>')
+        self.assertEqual(output, [])
+
+        # The batch must be output by the timer even though no more events are added
+        time.sleep(0.5)
+
+        self.assertEqual(output, ['<stream><event><data>1</data></event>'
+                                  '<event><data>2</data></event></stream>'])
+
+        # The next event starts a new batch
+        event_batcher.add('<event><data>3</data></event>')
+        event_batcher.flush()
+
+        self.assertEqual(output[1], '<stream><event><data>3</data></event></stream>')
+        self.assertEqual(event_batcher.batches, 2)
+
+        event_batcher.close()
+
+    def test_batch_ms_single_thread(self):
+        """
+        Make sure the batches are timed by a single thread that is stopped when the batcher is
+        closed.
+        """
+
+        output = []
+        event_batcher = EventBatcher(output.append, batch_size=1000, batch_ms=20)
+
+        event_batcher.add('<event><data>1</data></event>')
+        thread = event_batcher.timer.thread
+
+        for index in range(2, 5):
+            time.sleep(0.2)
+            event_batcher.add('<event><data>%i</data></event>' % index)
+
+        time.sleep(0.2)
+
+        self.assertEqual(len(output), 4)
+        self.assertIs(event_batcher.timer.thread, thread)
+
+        event_batcher.close()
+        thread.join(1)
+
+        self.assertFalse(thread.is_alive())
+
+    def test_batch_ms_error(self):
+        """
+        Make sure an error outputting the batch from the timer is raised when the next event is
+        added.
+        """
+
+        def output(stream):
+            raise IOError('The output is closed')
+
+        event_batcher = EventBatcher(output, batch_size=1000, batch_ms=50)
+
+        event_batcher.add('<event><data>1</data></event>')
+        time.sleep(0.5)
+
+        with self.assertRaises(IOError):
+            event_batcher.add('<event><data>2</data></event>')
+
+        event_batcher.close()
+
+    def test_flush_error(self):
+        """
+        Make sure an error outputting the batch from the timer is raised by flush() (so that the
+        checkpoint isn't saved as if the events were output).
+        """
+
+        def output(stream):
+            raise BrokenPipeError('The output is closed')
+
+        event_batcher = EventBatcher(output, batch_size=1000, batch_ms=50)
+
+        event_batcher.add('<event><data>1</data></event>')
+        time.sleep(0.5)
+
+        with self.assertRaises(BrokenPipeError):
+            event_batcher.flush()
+
+        event_batcher.close()
+
+class StubHECServer(ThreadingHTTPServer):
+    """
+    A stub of the HTTP Event Collector that records the requests it receives. The statuses to
+    respond with can be queued to simulate failures.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        ThreadingHTTPServer.__init__(self, ('127.0.0.1', 0), StubHECRequestHandler)
+
+        self.requests = []
+        self.statuses = []
+        self.client_ports = set()
+
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def get_url(self):
+        return 'http://127.0.0.1:%i/services/collector/event' % self.server_address[1]
+
+    def get_events(self):
+        events = []
+
+        for request in self.requests:
+            events.extend([json.loads(line) for line in request['body'].splitlines()])
+
+        return events
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+class StubHECRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles the requests to the stub of the HTTP Event Collector (over keep-alive connections).
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    # Send the headers and the body of the response without waiting for the client to acknowledge
+    # the headers (which it delays)
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+
+        if self.headers.get('Content-Encoding', None) == 'gzip':
+            body = gzip.decompress(body)
+
+        self.server.client_ports.add(self.client_address[1])
+        self.server.requests.append({
+            'path': self.path,
+            'authorization': self.headers.get('Authorization', None),
+            'encoding': self.headers.get('Content-Encoding', None),
+            'body': body.decode('utf-8')
+        })
+
+        if self.server.statuses:
+            status = self.server.statuses.pop(0)
+        else:
+            status = 200
+
+        response = json.dumps({'text': 'Success' if status == 200 else 'Failed',
+                               'code': 0 if status == 200 else 9}).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args):
+        pass
+
+class TestHECEventSink(unittest.TestCase):
+    """
+    Tests the sending of the events to the HTTP Event Collector.
+    """
+
+    def setUp(self):
+        self.server = StubHECServer()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_send_batches(self):
+        """
+        Make sure the events are sent in gzipped batches over a single persistent connection.
+        """
+
+        event_sink = HECEventSink(self.server.get_url(), 'secret-token', batch_size=3)
+
+        for index in range(7):
+            event_sink.add(json.dumps({'event': 'number=%i' % index}))
+
+        self.assertEqual(len(self.server.requests), 2)
+
+        event_sink.close()
+
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len(self.server.client_ports), 1)
+        self.assertEqual(event_sink.pool.opened, 1)
+
+        self.assertEqual(self.server.requests[0]['path'], '/services/collector/event')
+        self.assertEqual(self.server.requests[0]['authorization'], 'Splunk secret-token')
+        self.assertEqual(self.server.requests[0]['encoding'], 'gzip')
+        self.assertEqual([event['event'] for event in self.server.get_events()],
+                         ['number=%i' % index for index in range(7)])
+
+        stats = event_sink.get_stats()
+        self.assertEqual(stats['hec_events_sent'], 7)
+        self.assertEqual(stats['hec_batches_sent'], 3)
+        self.assertEqual(stats['hec_retries'], 0)
+
+    def test_batch_ms(self):
+        """
+        Make sure the batch is sent once the events have been held for too long.
+        """
+
+        event_sink = HECEventSink(self.server.get_url(), 'token', batch_size=1000, batch_ms=50)
+
+        event_sink.add('{"event":"1"}')
+        event_sink.add('{"event":"2"}')
+        self.assertEqual(len(self.server.requests), 0)
+
+        # The batch must be sent by the timer even though no more events are added
+        time.sleep(0.5)
+
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(len(self.server.get_events()), 2)
+
+        event_sink.close()
+
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_concurrent_connections(self):
+        """
+        Make sure all of the events are sent when the batches are sent concurrently.
+        """
+
+        event_sink = HECEventSink(self.server.get_url(), 'token', batch_size=2, connections=3,
+                                  compress=False)
+
+        for index in range(20):
+            event_sink.add('{"event":"%i"}' % index)
+
+        event_sink.close()
+
+        self.assertEqual(self.server.requests[0]['encoding'], None)
+        self.assertEqual(sorted([int(event['event']) for event in self.server.get_events()]),
+                         list(range(20)))
+        self.assertLessEqual(event_sink.pool.opened, 3)
+
+    def test_retry(self):
+        """
+        Make sure the requests that fail with a status indicating the server is busy are retried.
+        """
+
+        self.server.statuses = [503, 500]
+
+        event_sink = HECEventSink(self.server.get_url(), 'token', backoff=0.01)
+        event_sink.add('{"event":"1"}')
+        event_sink.close()
+
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(event_sink.get_stats()['hec_retries'], 2)
+        self.assertEqual(event_sink.get_stats()['hec_events_sent'], 1)
+
+    def test_retry_exhausted(self):
+        """
+        Make sure an error is raised once the retries are exhausted.
+        """
+
+        self.server.statuses = [503] * 3
+
+        event_sink = HECEventSink(self.server.get_url(), 'token', max_retries=2, backoff=0.01)
+        event_sink.add('{"event":"1"}')
+
+        with self.assertRaises(HECError) as context:
+            event_sink.close()
+
+        self.assertEqual(context.exception.status, 503)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_no_retry_invalid_token(self):
+        """
+        Make sure the requests that are rejected (e.g. due to an invalid token) aren't retried.
+        """
+
+        self.server.statuses = [403]
+
+        event_sink = HECEventSink(self.server.get_url(), 'token', backoff=0.01)
+        event_sink.add('{"event":"1"}')
+
+        self.assertRaises(HECError, event_sink.close)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_connection_refused(self):
+        """
+        Make sure an error is raised if the server cannot be reached.
+        """
+
+        url = self.server.get_url()
+        self.server.stop()
+        self.server = StubHECServer()
+
+        event_sink = HECEventSink(url, 'token', max_retries=1, backoff=0.01, timeout=1)
+        event_sink.add('{"event":"1"}')
+
+        self.assertRaises(HECError, event_sink.close)
+
+    def test_serializer(self):
+        """
+        Make sure the events are serialized into the HEC format.
+        """
+
+        record = collections.OrderedDict([('path', '/tmp/a b'), ('size', 1)])
+
+        serializer = HECEventSerializer("file_meta_data", "file_meta_data://test", "main")
+        self.assertEqual(json.loads(serializer.serialize_event(record)),
+                         {'source': 'file_meta_data://test', 'sourcetype': 'file_meta_data',
+                          'index': 'main', 'event': 'path="/tmp/a b" size=1'})
+
+        serializer = HECEventSerializer("file_meta_data:json", output_format='json')
+        self.assertEqual(json.loads(serializer.serialize_event(record)),
+                         {'sourcetype': 'file_meta_data:json',
+                          'event': {'path': '/tmp/a b', 'size': 1}})
+
+class TestPathFilter(unittest.TestCase):
+    """
+    Tests the filter of the files to include.
+    """
+
+    def test_match(self):
+        """
+        Test matching each of the classes of wildcards.
+        """
+
+        path_filter = PathFilter(["*.log", "*.conf", "core*", "*~", "README", "[ab]?c.txt",
+                                  "/var/*/x.txt"], ["debug*"])
+
+        self.assertTrue(path_filter.match(os.path.join("x", "a.log")))
+        self.assertTrue(path_filter.match(os.path.join("x", "a.conf")))
+        self.assertTrue(path_filter.match(os.path.join("x", "core.123")))
+        self.assertTrue(path_filter.match(os.path.join("x", "notes~")))
+        self.assertTrue(path_filter.match(os.path.join("x", "README")))
+        self.assertTrue(path_filter.match(os.path.join("x", "abc.txt")))
+        self.assertTrue(path_filter.match(os.path.join(os.sep, "var", "log", "x.txt")))
+
+        self.assertFalse(path_filter.match(os.path.join("x", "debug.log")))
+        self.assertFalse(path_filter.match(os.path.join("x", "a.conf.bak")))
+        self.assertFalse(path_filter.match(os.path.join("x", "README.md")))
+        self.assertFalse(path_filter.match(os.path.join("x", "cbc.txt")))
+        self.assertFalse(path_filter.match(os.path.join("x", "log", "readme")))
+
+    def test_match_relative_path(self):
+        """
+        Make sure that the wildcards with a slash are matched against the path relative to the
+        root like those of the DirectoryFilter (with each wildcard matching within a component).
+        """
+
+        root = os.path.join(os.sep, "data")
+        path_filter = PathFilter(exclude=["*/cache/*", "logs/app.log", "tmp/[!a]*"], root=root)
+
+        self.assertFalse(path_filter.match(os.path.join(root, "a", "cache", "b.txt")))
+        self.assertFalse(path_filter.match(os.path.join(root, "logs", "app.log")))
+        self.assertFalse(path_filter.match(os.path.join(root, "tmp", "b.txt")))
+
+        self.assertTrue(path_filter.match(os.path.join(root, "a", "b", "cache", "c.txt")))
+        self.assertTrue(path_filter.match(os.path.join(root, "cache", "b.txt")))
+        self.assertTrue(path_filter.match(os.path.join(root, "x", "logs", "app.log")))
+        self.assertTrue(path_filter.match(os.path.join(root, "tmp", "a.txt")))
+
+        # The same wildcard selects the same directories in both filters
+        directory_filter = DirectoryFilter(root, exclude=["*/cache"])
+
+        self.assertEqual(directory_filter.get_state(os.path.join(root, "a", "cache")),
+                         DirectoryFilter.EXCLUDED)
+        self.assertEqual(directory_filter.get_state(os.path.join(root, "a", "b", "cache")),
+                         DirectoryFilter.INCLUDED)
+
+    def test_match_absolute_path(self):
+        """
+        Make sure that the wildcards that start with a slash are still matched against the full
+        path (as file_filter was before the relative paths were supported).
+        """
+
+        root = os.path.join(os.sep, "var", "log")
+        path_filter = PathFilter(["/var/log/*.log", "/opt/app/x.txt"], root=root)
+
+        self.assertTrue(path_filter.match(os.path.join(root, "a.log")))
+        self.assertTrue(path_filter.match(os.path.join(root, "app", "b.log")))
+        self.assertTrue(path_filter.match(os.path.join(os.sep, "opt", "app", "x.txt")))
+
+        self.assertFalse(path_filter.match(os.path.join(root, "a.txt")))
+        self.assertFalse(path_filter.match(os.path.join(os.sep, "var", "a.log")))
+
+        # The form with the full path of the scan selects the same files as the relative one
+        test_dir = os.path.abspath("test_dir")
+
+        for include in (["*.txt"], [test_dir + "/*.txt"]):
+            results, _ = FileMetaDataModularInput.get_files_data(
+                test_dir, latest_time=0, file_filter=PathFilter(include, root=test_dir))
+
+            names = sorted(os.path.basename(result['path']) for result in results
+                           if result['is_directory'] == 0)
+
+            self.assertEqual(names, ["1.txt", "2.txt", "3.txt", "4.txt", "5.txt"], include)
+
+    def test_match_same_as_fnmatch(self):
+        """
+        Make sure the fast classes of wildcards match the same names as fnmatch.
+        """
+
+        patterns = ["*.log", "*.tar.gz", "data_*", "*.bak", "Makefile", "*[0-9].txt", "x?y"]
+        names = ["a.log", "a.log.1", ".log", "b.tar.gz", "data_1", "data", "c.bak", "Makefile",
+                 "makefile", "3.txt", "a.txt", "xzy", "xy"]
+
+        for pattern in patterns:
+            path_filter = PathFilter([pattern])
+
+            for name in names:
+                self.assertEqual(path_filter.match(os.path.join("dir", name)),
+                                 fnmatch.fnmatchcase(name, pattern), "%s %s" % (pattern, name))
+
+    def test_get_files_data(self):
+        """
+        Test scanning with the filter.
+        """
+
+        results, _ = FileMetaDataModularInput.get_files_data("test_dir", latest_time=0,
+                                                             file_filter=PathFilter(["*.txt"], ["5.txt", "*/dir_2a/*"], "test_dir"))
+
+        names = sorted(os.path.basename(result['path']) for result in results
+                       if result['is_directory'] == 0)
+
+        self.assertEqual(names, ["1.txt", "2.txt", "3.txt"])
+
+class TestIOGovernor(unittest.TestCase):
+    """
+    Tests the limiting of the rate of the I/O.
+    """
+
+    def test_token_bucket(self):
+        """
+        Make sure that consuming more than is available waits for the tokens to be refilled.
+        """
+
+        token_bucket = TokenBucket(1000)
+
+        # The bucket starts full
+        self.assertEqual(token_bucket.consume(1000), 0)
+
+        start = time.time()
+        wait = token_bucket.consume(100)
+
+        self.assertGreater(wait, 0.05)
+        self.assertGreaterEqual(time.time() - start, wait)
+        self.assertEqual(token_bucket.consumed, 1100)
+        self.assertEqual(token_bucket.throttled, 1)
+
+    def test_hash_read_bytes(self):
+        """
+        Make sure that the bytes read when hashing are drawn from the budget.
+        """
+
+        governor = IOGovernor(max_read_bytes_per_sec=1000000)
+        file_hasher = FileHasher(chunk_size=4, governor=governor)
+
+        file_hasher.hash_file("test_dir/1.txt")
+
+        self.assertEqual(governor.get_stats()['read_bytes'], os.path.getsize("test_dir/1.txt"))
+        self.assertNotIn('stat_ops', governor.get_stats())
+
+    def test_scan_stat_ops(self):
+        """
+        Make sure that the directory listings and stat calls of a scan are drawn from the budget.
+        """
+
+        for traversal_workers in (1, 4):
+            governor = IOGovernor(max_stat_ops_per_sec=1000000)
+
+            results = list(FileMetaDataModularInput.iter_files_data("test_dir",
+                                                                    traversal_workers=traversal_workers,
+                                                                    governor=governor))
+
+            # One operation for each of the records and the directories listed
+            self.assertEqual(governor.get_stats()['stat_ops'], len(results) + 5)
+
+    def test_split(self):
+        """
+        Make sure that splitting the budget leaves the governor with its share so that the total
+        rate of the governors doesn't exceed the limit.
+        """
+
+        governor = IOGovernor(max_read_bytes_per_sec=1000, max_stat_ops_per_sec=100)
+
+        options = governor.split(4)
+
+        self.assertEqual(options, {'max_read_bytes_per_sec': 250, 'max_stat_ops_per_sec': 25})
+        self.assertEqual(governor.max_read_bytes_per_sec, 250)
+        self.assertEqual(governor.read_bucket.rate, 250)
+        self.assertEqual(governor.read_bucket.capacity, 250)
+        self.assertEqual(governor.stat_bucket.rate, 25)
+
+        # The tokens that accumulated are capped to the new capacity
+        self.assertLessEqual(governor.read_bucket.tokens, 250)
+
+    def test_sharded_scan_split(self):
+        """
+        Make sure that a sharded scan splits the budget between the coordinator and the workers.
+        """
+
+        governor = IOGovernor(max_stat_ops_per_sec=3000000)
+        output_options = {'stanza': 'file_meta_data://test', 'sourcetype': 'file_meta_data',
+                          'source': 'test', 'index': 'main'}
+
+        list(FileMetaDataModularInput().iter_sharded_events("test_dir", 2, output_options,
+                                                             governor=governor))
+
+        self.assertEqual(governor.max_stat_ops_per_sec, 1000000)
+        self.assertEqual(governor.stat_bucket.rate, 1000000)
+
+class TestScanTelemetry(unittest.TestCase):
+    """
+    Tests the collection of the performance telemetry of a run.
+    """
+
+    def test_stat_latency_percentiles(self):
+        """
+        Make sure the percentiles of the stat latency are within the precision of the buckets.
+        """
+
+        telemetry = ScanTelemetry()
+
+        self.assertIsNone(telemetry.get_stat_latency_percentile(50))
+
+        for _ in range(90):
+            telemetry.add_stat(0.00001, False)
+
+        for _ in range(10):
+            telemetry.add_stat(0.001, True)
+
+        self.assertGreaterEqual(telemetry.get_stat_latency_percentile(50), 0.00001)
+        self.assertLess(telemetry.get_stat_latency_percentile(50), 0.000012)
+        self.assertLess(telemetry.get_stat_latency_percentile(90), 0.000012)
+        self.assertEqual(telemetry.get_stat_latency_percentile(99), 0.001)
+        self.assertAlmostEqual(telemetry.phase_seconds['stat'], 0.0109)
+        self.assertEqual(telemetry.files, 90)
+        self.assertEqual(telemetry.directories, 10)
+
+    def test_add_state(self):
+        """
+        Make sure the telemetry of another process can be added.
+        """
+
+        telemetry = ScanTelemetry()
+        telemetry.increment('hash_errors', 2)
+        telemetry.add_time('walk', 1.5)
+        telemetry.add_stat(0.002, False)
+
+        other_telemetry = ScanTelemetry()
+        other_telemetry.increment('hash_errors', 3)
+        other_telemetry.add_time('walk', 0.5)
+        other_telemetry.add_stat(0.004, False)
+
+        telemetry.add_state(other_telemetry.get_state())
+
+        self.assertEqual(telemetry.counts['hash_errors'], 5)
+        self.assertEqual(telemetry.files, 2)
+        self.assertEqual(telemetry.phase_seconds['walk'], 2.0)
+        self.assertEqual(sum(telemetry.stat_latencies), 2)
+        self.assertEqual(telemetry.max_stat_latency, 0.004)
+
+    def test_iter_timed(self):
+        """
+        Make sure the time spent getting the items is added to the phase.
+        """
+
+        telemetry = ScanTelemetry()
+
+        def slow_items():
+            for item in range(3):
+                time.sleep(0.01)
+                yield item
+
+        self.assertEqual(list(telemetry.iter_timed('walk', slow_items())), [0, 1, 2])
+        self.assertGreaterEqual(telemetry.phase_seconds['walk'], 0.03)
+
+        self.assertEqual(telemetry.call_timed('output', sorted, [2, 1]), [1, 2])
+        self.assertGreater(telemetry.phase_seconds['output'], 0)
+
+    def test_scan(self):
+        """
+        Make sure the files, directories and stat calls of a scan are counted.
+        """
+
+        for hash_workers in (1, 4):
+            telemetry = ScanTelemetry()
+            file_hasher = FileHasher()
+
+            results = list(FileMetaDataModularInput.iter_files_data("test_dir",
+                                                                    file_hash_limit=1000000,
+                                                                    hash_workers=hash_workers,
+                                                                    file_hasher=file_hasher,
+                                                                    telemetry=telemetry))
+
+            telemetry.add_file_hasher_stats(file_hasher)
+
+            directories = sum(1 for result in results if result['is_directory'])
+            file_sizes = sum(result['size'] for result in results if not result['is_directory'])
+
+            self.assertEqual(telemetry.directories, directories)
+            self.assertEqual(telemetry.files, len(results) - directories)
+            self.assertEqual(sum(telemetry.stat_latencies), len(results))
+            self.assertGreater(telemetry.phase_seconds['walk'], 0)
+            self.assertGreater(telemetry.phase_seconds['hash'], 0)
+            self.assertEqual(telemetry.counts['bytes_hashed'], file_sizes)
+
+            event = telemetry.make_event("test_dir", 1.0)
+
+            self.assertEqual(event['files_per_sec'], len(results) - directories)
+            self.assertEqual(event['stat_errors'], 0)
+            self.assertIn('stat_latency_p99_ms', event)
+
+            for phase in ScanTelemetry.PHASES:
+                self.assertIn(phase + '_seconds', event)
+
+    def test_errors(self):
+        """
+        Make sure the paths that cannot be accessed are counted as errors.
+        """
+
+        telemetry = ScanTelemetry()
+
+        result, _ = FileMetaDataModularInput.get_file_data("test_dir/does_not_exist",
+                                                           telemetry=telemetry)
+
+        self.assertIsNone(result)
+        self.assertEqual(telemetry.counts['stat_errors'], 1)
+
+        self.assertIsNone(FileMetaDataModularInput.get_file_hashes("test_dir/does_not_exist",
+                                                                   telemetry=telemetry))
+        self.assertEqual(telemetry.counts['hash_errors'], 1)
+
+class TestCheckpointStore(unittest.TestCase):
+    """
+    Tests the store of the per-path state.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store_file_path = os.path.join(self.temp_dir, "state.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_put_and_get(self):
+        """
+        Make sure that the entries can be read back both before and after they are committed.
+        """
+
+        with CheckpointStore(self.store_file_path, batch_size=3) as store:
+            store.put("test", "a", "1")
+            store.put("test", "b", "2")
+
+            # Not committed yet
+            self.assertEqual(store.get("test", "a"), "1")
+            self.assertEqual(len(store.pending), 2)
+
+            # The batch is written once it is full (but not committed)
+            store.put("other", "a", "3")
+            self.assertEqual(len(store.pending), 0)
+
+            self.assertEqual(store.get("test", "b"), "2")
+            self.assertEqual(store.get("other", "a"), "3")
+            self.assertIsNone(store.get("test", "c"))
+
+        # The entries should be persisted
+        with CheckpointStore(self.store_file_path) as store:
+            self.assertEqual(store.get("test", "a"), "1")
+            self.assertEqual(store.count("test"), 2)
+
+    def test_stale_entries(self):
+        """
+        Make sure that the entries that were not written or touched in the current generation are
+        identified as stale and can be deleted.
+        """
+
+        with CheckpointStore(self.store_file_path) as store:
+            store.start_generation("test")
+            store.put("test", "a", "1")
+            store.put("test", "b", "2")
+            store.put("test", "c", "3")
+
+        with CheckpointStore(self.store_file_path) as store:
+            self.assertEqual(store.start_generation("test"), 2)
+
+            store.touch("test", "a")
+            store.put("test", "b", "4")
+
+            self.assertEqual(list(store.iter_stale("test")), [("c", "3")])
+            self.assertEqual(store.delete_stale("test"), 1)
+
+            # The touched entry should retain its value
+            self.assertEqual(store.get("test", "a"), "1")
+            self.assertEqual(store.get("test", "b"), "4")
+            self.assertEqual(store.count("test"), 2)
+
+    def test_commit_deferred(self):
+        """
+        Make sure that the writes are only persisted once they are committed (even once a batch
+        is written) and that they can be rolled back along with the start of the generation.
+        """
+
+        with CheckpointStore(self.store_file_path) as store:
+            store.start_generation("test")
+            store.put("test", "a", "1")
+
+        store = CheckpointStore(self.store_file_path, batch_size=2)
+        other_store = CheckpointStore(self.store_file_path)
+
+        try:
+            self.assertEqual(store.start_generation("test"), 2)
+
+            store.put("test", "b", "2")
+            store.put("test", "c", "3")
+            self.assertEqual(len(store.pending), 0)
+
+            # The batch that was written isn't visible to others until it is committed
+            self.assertIsNone(other_store.get("test", "b"))
+            self.assertEqual(other_store.get_generation("test"), 1)
+
+            # Rolling back discards the writes and the new generation
+            store.rollback()
+
+            self.assertIsNone(store.get("test", "b"))
+            self.assertEqual(store.get_generation("test"), 1)
+            self.assertEqual(list(store.iter_stale("test")), [])
+
+            store.put("test", "d", "4")
+            store.commit()
+
+            self.assertEqual(other_store.get("test", "d"), "4")
+
+            # Closing without committing discards the pending writes
+            store.put("test", "e", "5")
+            store.close(commit=False)
+
+            self.assertIsNone(other_store.get("test", "e"))
+
+        finally:
+            store.close()
+            other_store.close()
+
+    def test_timeout(self):
+        """
+        Make sure that the writes fail without waiting when another connection is writing to the
+        database and that they are kept so that they can be committed later.
+        """
+
+        store = CheckpointStore(self.store_file_path, batch_size=1)
+        other_store = CheckpointStore(self.store_file_path, timeout=0)
+
+        try:
+            # The batch is written into the open transaction (like a scan that is in progress)
+            store.put("test", "a", "1")
+
+            other_store.put("test", "b", "2")
+
+            start_time = time.time()
+            self.assertRaises(sqlite3.OperationalError, other_store.commit)
+            self.assertLess(time.time() - start_time, 1)
+
+            self.assertEqual(len(other_store.pending), 1)
+
+            # The writes can be committed once the other connection is done
+            store.commit()
+            other_store.commit()
+
+            self.assertEqual(store.get("test", "b"), "2")
+
+        finally:
+            store.close()
+            other_store.close()
+
+class TestHashCache(unittest.TestCase):
+    """
+    Tests the persistent cache of file hashes.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = CheckpointStore(os.path.join(self.temp_dir, "state.sqlite"))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_cache_hit(self):
+        """
+        Make sure that the cached hash is used when the file hasn't changed.
+        """
+
+        hash_cache = HashCache(self.store)
+        file_hasher = FileHasher(cache=hash_cache)
+        stat_info = os.stat("test_dir/1.txt")
+
+        self.assertEqual(file_hasher.hash_file("test_dir/1.txt", stat_info)['sha224'], "5154aaa49392fb275ce7e12a7d3e00901cf9cf3ab10491673f97322f")
+        self.assertEqual(hash_cache.misses, 1)
+
+        # Make sure the file isn't read again by using a different cached value
+        hash_cache.set("test_dir/1.txt", stat_info, {'sha224': 'cached'})
+
+        self.assertEqual(file_hasher.hash_file("test_dir/1.txt", stat_info), {'sha224': 'cached'})
+        self.assertEqual(hash_cache.hits, 1)
+
+    def test_cache_miss_on_change(self):
+        """
+        Make sure that the cached hash is not used when the file was modified.
+        """
+
+        hash_cache = HashCache(self.store)
+        stat_info = os.stat("test_dir/1.txt")
+
+        hash_cache.set("test_dir/1.txt", stat_info, {'sha224': 'cached'})
+
+        StatResult = collections.namedtuple('StatResult', ['st_dev', 'st_ino', 'st_size', 'st_mtime_ns'])
+        modified_stat_info = StatResult(stat_info.st_dev, stat_info.st_ino, stat_info.st_size,
+                                        stat_info.st_mtime_ns + 1)
+
+        self.assertIsNone(hash_cache.get("test_dir/1.txt", modified_stat_info))
+        self.assertEqual(hash_cache.misses, 1)
+
+    def test_save_and_evict(self):
+        """
+        Make sure that the cache is persisted and that the entries for paths that were not seen
+        are removed.
+        """
+
+        stat_info = os.stat("test_dir/1.txt")
+
+        hash_cache = HashCache(self.store)
+        hash_cache.set("test_dir/1.txt", stat_info, {'sha224': 'one'})
+        hash_cache.set("test_dir/2.txt", stat_info, {'sha224': 'two'})
+        hash_cache.save()
+
+        # Start another run but only look up one of the files
+        hash_cache = HashCache(self.store)
+        self.assertEqual(hash_cache.get("test_dir/1.txt", stat_info), {'sha224': 'one'})
+
+        # Save without evicting; both entries should be retained
+        hash_cache.save(evict=False)
+        self.assertEqual(self.store.count(HashCache.NAMESPACE), 2)
+
+        # Save with evicting; only the entry seen should be retained
+        hash_cache.save()
+
+        self.assertEqual(self.store.count(HashCache.NAMESPACE), 1)
+        self.assertIsNotNone(self.store.get(HashCache.NAMESPACE, "test_dir/1.txt"))
+
+    def test_load_missing(self):
+        """
+        Make sure that a missing cache is treated as empty.
+        """
+
+        hash_cache = HashCache(self.store)
+
+        self.assertIsNone(hash_cache.get("test_dir/1.txt", os.stat("test_dir/1.txt")))
+        self.assertEqual(self.store.count(HashCache.NAMESPACE), 0)
+
+class TestFileManifest(unittest.TestCase):
+    """
+    Tests the tracking of changes using the manifest.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.tree_dir = os.path.join(self.temp_dir, "test_dir")
+        self.store_file_path = os.path.join(self.temp_dir, "state.sqlite")
+
+        shutil.copytree("test_dir", self.tree_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def scan(self):
+        """
+        Scan the tree using the persisted manifest and return the records keyed by the path.
+        """
+
+        with CheckpointStore(self.store_file_path) as store:
+            manifest = FileManifest(store)
+
+            results = list(FileMetaDataModularInput.iter_files_data(self.tree_dir,
+                                                                    manifest=manifest))
+            results.extend(FileMetaDataModularInput.iter_deleted_files_data(manifest))
+
+            manifest.save()
+
+        return dict((result['path'], result) for result in results)
+
+    def test_track_changes(self):
+        """
+        Make sure that created, modified and deleted paths are reported and that unchanged paths
+        are not.
+        """
+
+        # Everything is new on the first run
+        results = self.scan()
+
+        self.assertEqual(len(results), 11)
+
+        for result in results.values():
+            self.assertEqual(result['action'], 'created')
+
+        # Nothing changed
+        self.assertEqual(self.scan(), {})
+
+        # Change a file, delete a file and add a file
+        modified_path = os.path.abspath(os.path.join(self.tree_dir, "1.txt"))
+        deleted_path = os.path.abspath(os.path.join(self.tree_dir, "dir_1", "5.txt"))
+        created_path = os.path.abspath(os.path.join(self.tree_dir, "dir_3", "7.log"))
+
+        with open(modified_path, 'a') as file:
+            file.write("modified")
+
+        os.remove(deleted_path)
+
+        with open(created_path, 'w') as file:
+            file.write("created")
+
+        results = self.scan()
+
+        self.assertEqual(results[modified_path]['action'], 'modified')
+        self.assertEqual(results[deleted_path]['action'], 'deleted')
+        self.assertEqual(results[deleted_path]['is_directory'], 0)
+        self.assertEqual(results[created_path]['action'], 'created')
+
+        # The directories that had entries added or removed are modified too
+        self.assertEqual(results[os.path.dirname(deleted_path)]['action'], 'modified')
+        self.assertEqual(results[os.path.dirname(created_path)]['action'], 'modified')
+
+        # The deleted path should only be reported once
+        self.assertEqual(self.scan(), {})
+
+    def test_access_time_ignored(self):
+        """
+        Make sure that reading a file is not considered a change.
+        """
+
+        self.scan()
+
+        file_path = os.path.join(self.tree_dir, "1.txt")
+        stat_info = os.stat(file_path)
+
+        # Make a copy of the stat result with a later access time
+        accessed_stat_info = types.SimpleNamespace(**dict((name, getattr(stat_info, name))
+                                                          for name in dir(stat_info)
+                                                          if name.startswith('st_')))
+
+        accessed_stat_info.st_atime += 10
+        accessed_stat_info.st_atime_ns += 10 * 10 ** 9
+
+        with CheckpointStore(self.store_file_path) as store:
+            manifest = FileManifest(store)
+
+            self.assertIsNone(manifest.check(os.path.abspath(file_path), accessed_stat_info))
+
+class TestFileMetaDataRun(unittest.TestCase):
+    """
+    Tests running the input.
+    """
+
+    def setUp(self):
+        self.checkpoint_dir = tempfile.mkdtemp()
+        self.stanza = 'file_meta_data://test'
+        self.file_path = os.path.abspath('test_dir')
+
+        self.modular_input = FileMetaDataModularInput()
+        self.modular_input.logger = logging.getLogger('test_file_meta_data_run')
+
+        # Capture the output of the input
+        self.output = []
+        self.modular_input.output_event_string = self.output.append
+
+    def tearDown(self):
+        self.modular_input.do_shutdown()
+        shutil.rmtree(self.checkpoint_dir)
+
+    def run_input(self, **params):
+        """
+        Run the input with the given parameters and return the paths of the events it output.
+        """
+
+        cleaned_params = {'interval': 0, 'file_path': self.file_path, 'telemetry': False}
+        cleaned_params.update(params)
+
+        input_config = types.SimpleNamespace(checkpoint_dir=self.checkpoint_dir)
+
+        del self.output[:]
+        self.modular_input.run(self.stanza, cleaned_params, input_config)
+
+        return [match.group(1) for output in self.output
+                for match in re.finditer(r' path=(\S+)', output)]
+
+    def test_scan_cursor_settings_changed(self):
+        """
+        Make sure that the cursor of a scan that was stopped early is only resumed if the
+        settings that determine which paths are scanned haven't changed.
+        """
+
+        settings_hash = FileMetaDataModularInput.get_scan_settings_hash(self.file_path)
+        pending = os.path.join(self.file_path, 'dir_3')
+
+        def save_cursor(settings_hash):
+            cursor = {'file_path': self.file_path, 'pending': [pending], 'file_count': 4,
+                      'directory_count': 4, 'root_counts': [2, 3], 'must_be_later_than': None,
+                      'settings_hash': settings_hash}
+
+            self.modular_input.save_checkpoint(self.checkpoint_dir, self.stanza, 0, 0, cursor)
+
+        # The scan is resumed with the same settings
+        save_cursor(settings_hash)
+
+        paths = self.run_input()
+        self.assertEqual(paths, [pending, os.path.join(pending, '6.log'), self.file_path])
+
+        # The scan is started over if the settings changed
+        for params in ({'exclude_dirs': ['dir_1']}, {'depth_limit': 1},
+                       {'file_filter': ['*.txt']}):
+            save_cursor(settings_hash)
+
+            paths = self.run_input(**params)
+            self.assertIn(os.path.join(self.file_path, 'dir_2'), paths)
+            self.assertNotEqual(FileMetaDataModularInput.get_scan_settings_hash(self.file_path,
+                                                                               **params),
+                                settings_hash)
+
+    def test_hec_token_secure_storage(self):
+        """
+        Make sure the token of the HTTP Event Collector is read from storage/passwords and that
+        nothing is sent without one.
+        """
+
+        server = StubHECServer()
+        self.addCleanup(server.stop)
+
+        hec_token_names = []
+
+        def get_hec_token(hec_token_name=None, session_key=None):
+            hec_token_names.append(hec_token_name)
+            return 'secret-token' if hec_token_name == 'indexer' else None
+
+        self.modular_input.get_hec_token = get_hec_token
+
+        # No events are sent without a token
+        self.run_input(output_mode='hec', hec_url=server.get_url(), hec_token_name='missing')
+        self.assertEqual(server.requests, [])
+
+        self.run_input(output_mode='hec', hec_url=server.get_url(), hec_token_name='indexer')
+
+        self.assertEqual(hec_token_names, ['missing', 'indexer'])
+        self.assertTrue(server.requests)
+        self.assertEqual(server.requests[0]['authorization'], 'Splunk secret-token')
+
+    def test_hec_token_only_when_due(self):
+        """
+        Make sure the token of the HTTP Event Collector is only looked up when the input is due
+        to run (since run() is called every few seconds).
+        """
+
+        server = StubHECServer()
+        self.addCleanup(server.stop)
+
+        hec_token_names = []
+
+        def get_hec_token(hec_token_name=None, session_key=None):
+            hec_token_names.append(hec_token_name)
+            return 'token'
+
+        self.modular_input.get_hec_token = get_hec_token
+
+        for _ in range(3):
+            self.run_input(output_mode='hec', hec_url=server.get_url(), interval=3600)
+
+        self.assertEqual(len(hec_token_names), 1)
+
+    def test_hec_failure_not_saved(self):
+        """
+        Make sure the state of a run isn't saved if its events couldn't be sent to the HTTP Event
+        Collector so that the next run sends the same changes again.
+        """
+
+        server = StubHECServer()
+        self.addCleanup(server.stop)
+
+        self.modular_input.get_hec_token = lambda hec_token_name=None, session_key=None: 'token'
+
+        # Don't wait between the retries
+        make_event_sink = self.modular_input.make_event_sink
+
+        def make_event_sink_without_backoff(**kwargs):
+            event_sink = make_event_sink(**kwargs)
+            event_sink.backoff = 0
+            return event_sink
+
+        self.modular_input.make_event_sink = make_event_sink_without_backoff
+
+        def get_changes():
+            return sorted((event['event']['path'], event['event']['action'])
+                          for event in server.get_events() if 'action' in event['event'])
+
+        # Fail every attempt to send the events
+        server.statuses = [500] * 10
+
+        self.run_input(output_mode='hec', hec_url=server.get_url(), output_format='json',
+                       track_changes=True)
+
+        # Each attempt sent the same batch
+        failed_changes = sorted(set(get_changes()))
+        self.assertTrue(failed_changes)
+        self.assertEqual(server.statuses, [500] * 6)
+
+        # The same changes must be sent again
+        server.statuses = []
+        del server.requests[:]
+
+        self.run_input(output_mode='hec', hec_url=server.get_url(), output_format='json',
+                       track_changes=True)
+
+        self.assertEqual(get_changes(), failed_changes)
+
+    def test_telemetry_default(self):
+        """
+        Make sure the telemetry event is only output if it is enabled.
+        """
+
+        self.run_input(telemetry=None)
+        self.assertFalse([output for output in self.output
+                          if 'file_meta_data:telemetry' in output])
+
+        self.run_input(telemetry=True)
+        self.assertTrue([output for output in self.output
+                         if 'file_meta_data:telemetry' in output])
+
+class TestFileMetaDataScript(unittest.TestCase):
+    """
+    Tests running the input as a script (the way that splunkd runs it).
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.file_path = os.path.abspath('test_dir')
+
+        # The log of the input is written under SPLUNK_HOME
+        self.splunk_home = os.path.join(self.temp_dir, 'splunk')
+        os.makedirs(os.path.join(self.splunk_home, 'var', 'log'))
+
+        self.checkpoint_dir = os.path.join(self.temp_dir, 'checkpoint')
+        os.mkdir(self.checkpoint_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def run_script(self, timeout=60, **params):
+        """
+        Run the script with a stanza with the given parameters until the first run completes and
+        return the output and the log.
+        """
+
+        config = ('<input><server_host>test</server_host>'
+                  '<server_uri>https://127.0.0.1:8089</server_uri><session_key></session_key>'
+                  '<checkpoint_dir>%s</checkpoint_dir><configuration>'
+                  '<stanza name="file_meta_data://test">%s</stanza>'
+                  '</configuration></input>') % (self.checkpoint_dir, ''.join(
+                      '<param name="%s">%s</param>' % (name, value)
+                      for name, value in params.items()))
+
+        log_file_path = os.path.join(self.splunk_home, 'var', 'log',
+                                     'file_meta_data_modular_input.log')
+
+        # The input keeps running (since it is in single instance mode) so stop it once the first
+        # run is logged as complete
+        process = subprocess.Popen([sys.executable, os.path.join("..", "src", "bin",
+                                                                 "file_meta_data.py")],
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL,
+                                   env=dict(os.environ, SPLUNK_HOME=self.splunk_home))
+
+        try:
+            process.stdin.write(config.encode('utf-8'))
+            process.stdin.close()
+
+            deadline = time.time() + timeout
+            log = ''
+
+            while 'Completed retrieval of file data' not in log and time.time() < deadline:
+                time.sleep(0.2)
+
+                if os.path.exists(log_file_path):
+                    with open(log_file_path) as log_file:
+                        log = log_file.read()
+
+        finally:
+            process.terminate()
+
+            with process.stdout:
+                output = process.stdout.read()
+
+            process.wait()
+
+        return output.decode('utf-8'), log
+
+    def test_scan_processes(self):
+        """
+        Make sure that the worker processes can scan the sub-directories when the input is run as
+        the main module.
+        """
+
+        output, log = self.run_script(file_path=self.file_path, recurse=1, interval=3600,
+                                      scan_processes=2)
+
+        self.assertIn('Completed retrieval of file data', log)
+        self.assertNotIn(' ERROR ', log)
+
+        expected_paths = set([self.file_path])
+
+        for root, dirs, files in os.walk(self.file_path):
+            expected_paths.update(os.path.join(root, name) for name in dirs + files)
+
+        paths = re.findall(r'(?:<data>| )path=([^ <]+)', output)
+
+        self.assertEqual(sorted(paths), sorted(expected_paths))
+
+class TestFileSizeField(unittest.TestCase):
+    """
+    Tests the file size field.
+    """
+
+    def test_file_size_valid(self):
+        """
+        Test converting a file size to an integer.
+        """
+
+        file_size_field = DataSizeField("test_file_size_valid", "title", "this is a test")
+
+        self.assertEqual(file_size_field.to_python("1m"), 1024 * 1024)
+        self.assertEqual(file_size_field.to_python("5m"), 1024 * 1024 * 5)
+        self.assertEqual(file_size_field.to_python("5mb"), 1024 * 1024 * 5)
+        self.assertEqual(file_size_field.to_python("5 mb"), 1024 * 1024 * 5)
+        self.assertEqual(file_size_field.to_python("5 MB"), 1024 * 1024 * 5)
+        self.assertEqual(file_size_field.to_python("5MB"), 1024 * 1024 * 5)
+
+        self.assertEqual(file_size_field.to_python("5"), 5)
+        self.assertEqual(file_size_field.to_python("1k"), 1024)
+
+    def test_file_size_invalid(self):
+        """
+        Ensure that invalid file sizes are correctly detected as invalid.
+        """
+
+        file_size_field = DataSizeField("test_file_size_invalid", "title", "this is a test")
+
+        with self.assertRaises(FieldValidationException):
+            file_size_field.to_python("1 treefrog")
+
+        with self.assertRaises(FieldValidationException):
+            file_size_field.to_python("mb")
+
+class TestFileMetaDataWindows(unittest.TestCase):
+    """
+    Tests the loading of file meta-data on Windows.
+    """
+
+    def test_get_windows_acl_data_file(self):
+        """
+        Ensure that file ACL data for Windows is returned.
+        """
+
+        output = FileMetaDataModularInput.get_windows_acl_data("../src/bin/file_meta_data.py")
+
+        self.assertEqual(output["owner_sid"][0:5], "S-1-5")
+        self.assertEqual(output["group_sid"][0:5], "S-1-5")
+        self.assertEqual(output["ace_0_type"], ["ACCESS_ALLOWED"])
+        self.assertGreaterEqual(output["ace_0_permissions"].index("FILE_GENERIC_READ"), 0)
+ 
+    def test_get_windows_acl_data_dir(self):
+        """
+        Ensure that directory ACL data for Windows is returned.
+        """
+
+        output = FileMetaDataModularInput.get_windows_acl_data("../src/bin")
+
+        self.assertEqual(output["owner_sid"][0:5], "S-1-5")
+        self.assertEqual(output["group_sid"][0:5], "S-1-5")
+        self.assertEqual(output["ace_0_type"], ["ACCESS_ALLOWED"])
+        self.assertGreaterEqual(output["ace_0_permissions"].index("READ_CONTROL"), 0)
+
+class TestFileMetaDataNix(unittest.TestCase):
+    """
+    Tests the loading of file meta-data on Unix.
+    """
+
+    def test_get_nix_acl_data_file(self):
+        """
+        Ensure that file ACL data for Unix is returned.
+        """
+
+        output = FileMetaDataModularInput.get_nix_acl_data("../src/bin/file_meta_data.py")
+
+        self.assertEqual(output["owner_uid"], os.stat("../src/bin/file_meta_data.py").st_uid)
+        self.assertGreaterEqual(len(output["owner"]), 1)
+        self.assertGreaterEqual(output["group_uid"], 0)
+        self.assertGreaterEqual(output["permission_mask"], '0')
+
+    def test_get_nix_acl_data_dir(self):
+        """
+        Ensure that directory ACL data for Unix is returned.
+        """
+
+        output = FileMetaDataModularInput.get_nix_acl_data("../src/bin")
+
+        self.assertGreaterEqual(len(output["owner"]), 1)
+        self.assertGreaterEqual(output["group_uid"], 0)
+        self.assertGreaterEqual(output["permission_mask"], '0')
+
+    def test_identity_cache(self):
+        """
+        Make sure the owner and group names are resolved once per id (including the ids that are
+        unknown) until the entries expire.
+        """
+
+        identity_cache = IdentityCache()
+        stat_info = os.stat("../src/bin")
+
+        for _ in range(3):
+            output = FileMetaDataModularInput.get_nix_acl_data("../src/bin", stat_info=stat_info,
+                                                               identity_cache=identity_cache)
+
+        self.assertGreaterEqual(len(output["group"]), 1)
+        self.assertEqual(identity_cache.hits, 4)
+        self.assertEqual(identity_cache.misses, 2)
+        self.assertEqual(identity_cache.get_stats()['identity_cache_hit_rate'], 66.7)
+
+        # Unknown ids are cached too
+        self.assertIsNone(identity_cache.get_user_name(2 ** 31 - 7))
+        self.assertIsNone(identity_cache.get_user_name(2 ** 31 - 7))
+        self.assertEqual(identity_cache.misses, 3)
+
+        # Entries that expired are looked up again
+        identity_cache = IdentityCache(ttl=0)
+        identity_cache.get_user_name(stat_info.st_uid)
+        identity_cache.get_user_name(stat_info.st_uid)
+        self.assertEqual(identity_cache.misses, 2)
+
+    def test_fields_skip_identity_lookup(self):
+        """
+        Make sure the names of the owner and group are only looked up if they are requested.
+        """
+
+        identity_cache = IdentityCache()
+
+        result, _ = FileMetaDataModularInput.get_file_data("unit.py",
+                                                           identity_cache=identity_cache,
+                                                           fields=frozenset(['permission_mask',
+                                                                             'owner_uid']))
+
+        self.assertEqual(list(result.keys()), ['path', 'owner_uid', 'permission_mask'])
+        self.assertEqual(result['owner_uid'], os.stat("unit.py").st_uid)
+        self.assertEqual(identity_cache.misses + identity_cache.hits, 0)
+
+        result, _ = FileMetaDataModularInput.get_file_data("unit.py",
+                                                           identity_cache=identity_cache,
+                                                           fields=frozenset(['owner']))
+
+        self.assertEqual(list(result.keys()), ['path', 'owner'])
+        self.assertEqual(identity_cache.misses, 2)
+
+    def test_read_group_file(self):
+        """
+        Test reading the group names from a file in the format of /etc/group.
+        """
+
+        temp_dir = tempfile.mkdtemp()
+
+        try:
+            group_file = os.path.join(temp_dir, "group")
+
+            with open(group_file, "w") as file:
+                file.write("# comment\nroot:x:0:\nwheel:x:10:alice,bob\nbroken\n")
+
+            self.assertEqual(IdentityCache.read_group_file(group_file), {0: "root", 10: "wheel"})
+            self.assertEqual(IdentityCache.read_group_file(os.path.join(temp_dir, "missing")), {})
+
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+class TestTreeWatcher(unittest.TestCase):
+    """
+    Tests the watching of a directory for changes using inotify.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.watcher = None
+
+    def tearDown(self):
+        if self.watcher is not None:
+            self.watcher.close()
+
+        shutil.rmtree(self.temp_dir)
+
+    def write_file(self, *names):
+        path = os.path.join(self.temp_dir, *names)
+
+        with open(path, "w") as file:
+            file.write("changed")
+
+        return path
+
+    def read_all_changes(self, timeout=1):
+        """
+        Read the changes until no more arrive.
+        """
+
+        changes = self.watcher.read_changes(timeout)
+
+        while True:
+            count = len(changes)
+            self.watcher.read_changes(0.1, changes)
+
+            if len(changes) == count:
+                return changes
+
+    def test_changes(self):
+        """
+        Make sure files that are created, modified and deleted are reported (including those
+        within directories created after the watch started).
+        """
+
+        self.watcher = TreeWatcher(self.temp_dir)
+        self.watcher.start()
+
+        file_path = self.write_file("a.txt")
+        os.mkdir(os.path.join(self.temp_dir, "sub"))
+        sub_file_path = self.write_file("sub", "b.txt")
+
+        changes = self.read_all_changes()
+
+        self.assertEqual(changes[file_path], FileManifest.CREATED)
+        self.assertEqual(changes[os.path.join(self.temp_dir, "sub")], FileManifest.CREATED)
+        self.assertEqual(changes[sub_file_path], FileManifest.CREATED)
+        self.assertEqual(self.watcher.get_stats()['watched_directories'], 2)
+
+        # Modify the files
+        self.write_file("a.txt")
+        self.write_file("sub", "b.txt")
+
+        changes = self.read_all_changes()
+
+        self.assertEqual(changes[file_path], FileManifest.MODIFIED)
+        self.assertEqual(changes[sub_file_path], FileManifest.MODIFIED)
+
+        # Delete them
+        os.remove(file_path)
+        shutil.rmtree(os.path.join(self.temp_dir, "sub"))
+
+        changes = self.read_all_changes()
+
+        self.assertEqual(changes[file_path], FileManifest.DELETED)
+        self.assertEqual(changes[sub_file_path], FileManifest.DELETED)
+        self.assertEqual(self.watcher.get_stats()['watched_directories'], 1)
+
+        # The deleted directory should be known to have been one
+        self.assertEqual(self.watcher.deleted_directories, {os.path.join(self.temp_dir, "sub")})
+
+    def test_poll_when_watch_limit_reached(self):
+        """
+        Make sure the sub-trees that cannot be watched are polled instead.
+        """
+
+        os.mkdir(os.path.join(self.temp_dir, "sub"))
+        os.mkdir(os.path.join(self.temp_dir, "sub", "inner"))
+        self.write_file("sub", "existing.txt")
+
+        self.watcher = TreeWatcher(self.temp_dir, poll_interval=0, max_watches=1)
+        self.watcher.start()
+
+        self.assertEqual(self.watcher.get_stats()['watched_directories'], 1)
+        self.assertEqual(self.watcher.get_stats()['polled_subtrees'], 1)
+
+        file_path = self.write_file("sub", "new.txt")
+        os.remove(os.path.join(self.temp_dir, "sub", "existing.txt"))
+        os.rmdir(os.path.join(self.temp_dir, "sub", "inner"))
+
+        changes = self.read_all_changes()
+
+        self.assertEqual(changes[file_path], FileManifest.CREATED)
+        self.assertEqual(changes[os.path.join(self.temp_dir, "sub", "existing.txt")],
+                         FileManifest.DELETED)
+        self.assertEqual(self.watcher.deleted_directories,
+                         {os.path.join(self.temp_dir, "sub", "inner")})
+
+    def test_poll_limit(self):
+        """
+        Make sure the sub-trees whose snapshots would exceed the limit are not polled.
+        """
+
+        for name in ("small", "large"):
+            os.mkdir(os.path.join(self.temp_dir, name))
+
+        self.write_file("small", "a.txt")
+
+        for index in range(3):
+            self.write_file("large", "%i.txt" % index)
+
+        self.watcher = TreeWatcher(self.temp_dir, poll_interval=0, max_watches=1,
+                                   max_polled_entries=2)
+        self.watcher.start()
+
+        self.assertEqual(list(self.watcher.polled.keys()), [os.path.join(self.temp_dir, "small")])
+        self.assertEqual(self.watcher.get_stats()['unpolled_subtrees'], 1)
+
+        # The sub-tree is no longer polled once it grows past the limit
+        self.write_file("small", "b.txt")
+        self.write_file("small", "c.txt")
+
+        self.read_all_changes()
+
+        self.assertEqual(self.watcher.get_stats()['polled_subtrees'], 0)
+        self.assertEqual(self.watcher.get_stats()['unpolled_subtrees'], 2)
+
+    def test_rescan_on_overflow(self):
+        """
+        Make sure the tree is rescanned for the changes if the queue of events overflowed.
+        """
+
+        self.watcher = TreeWatcher(self.temp_dir)
+        self.watcher.start()
+
+        file_path = self.write_file("a.txt")
+
+        # Simulate the loss of the events
+        self.watcher.inotify.read_events = lambda timeout: [(-1, watcher.IN_Q_OVERFLOW, 0, '')]
+
+        changes = self.watcher.read_changes(0)
+
+        self.assertEqual(changes[file_path], FileManifest.MODIFIED)
+        self.assertEqual(self.watcher.get_stats()['watch_overflows'], 1)
+
+    def test_rescan_changed_directories(self):
+        """
+        Make sure only the directories that changed are listed when rescanning after an overflow
+        and that the directories created while the events were lost are watched.
+        """
+
+        os.mkdir(os.path.join(self.temp_dir, "quiet"))
+        os.mkdir(os.path.join(self.temp_dir, "busy"))
+        self.write_file("quiet", "old.txt")
+
+        self.watcher = TreeWatcher(self.temp_dir)
+        self.watcher.start()
+
+        # Allow for the granularity of the timestamps of the file-system
+        time.sleep(0.05)
+        since = time.time_ns()
+        time.sleep(0.05)
+
+        file_path = self.write_file("busy", "new.txt")
+        os.mkdir(os.path.join(self.temp_dir, "busy", "sub"))
+        sub_file_path = self.write_file("busy", "sub", "c.txt")
+
+        # Count the directories that are listed
+        listed = []
+        list_directory = watcher.list_directory
+
+        def counting_list_directory(path, *args, **kwargs):
+            listed.append(path)
+            return list_directory(path, *args, **kwargs)
+
+        watcher.list_directory = counting_list_directory
+
+        try:
+            changes = collections.OrderedDict()
+            self.watcher.rescan(since, changes)
+        finally:
+            watcher.list_directory = list_directory
+
+        self.assertEqual(changes[file_path], FileManifest.MODIFIED)
+        self.assertEqual(changes[os.path.join(self.temp_dir, "busy", "sub")],
+                         FileManifest.CREATED)
+        self.assertEqual(changes[sub_file_path], FileManifest.CREATED)
+        self.assertNotIn(os.path.join(self.temp_dir, "quiet", "old.txt"), changes)
+
+        self.assertEqual(sorted(listed), [os.path.join(self.temp_dir, "busy"),
+                                          os.path.join(self.temp_dir, "busy", "sub")])
+        self.assertIn(os.path.join(self.temp_dir, "busy", "sub"), self.watcher.watches)
+
+    def test_iter_watch_records(self):
+        """
+        Make sure the records are built for the changes that pass the filters.
+        """
+
+        file_path = self.write_file("a.txt")
+        excluded_path = self.write_file("b.log")
+        dir_path = os.path.join(self.temp_dir, "new_dir")
+        os.mkdir(dir_path)
+
+        changes = collections.OrderedDict()
+        changes[file_path] = FileManifest.CREATED
+        changes[excluded_path] = FileManifest.MODIFIED
+        changes[os.path.join(self.temp_dir, "gone.txt")] = FileManifest.DELETED
+        changes[os.path.join(self.temp_dir, "gone.log")] = FileManifest.DELETED
+        changes[os.path.join(self.temp_dir, "vanished.txt")] = FileManifest.MODIFIED
+        changes[dir_path] = FileManifest.CREATED
+        changes[os.path.join(self.temp_dir, "gone_dir")] = FileManifest.DELETED
+
+        file_hasher = FileHasher()
+
+        records = list(FileMetaDataModularInput.iter_watch_records(
+            changes, file_filter=PathFilter(include=['*.txt']), file_hash_limit=1000,
+            file_hasher=file_hasher,
+            deleted_directories={os.path.join(self.temp_dir, "gone_dir")}))
+
+        self.assertEqual(len(records), 4)
+        self.assertEqual(records[0]['path'], file_path)
+        self.assertEqual(records[0]['action'], FileManifest.CREATED)
+        self.assertEqual(records[0]['size'], 7)
+        self.assertEqual(dict(records[1]), {'path': os.path.join(self.temp_dir, "gone.txt"),
+                                            'action': FileManifest.DELETED})
+
+        # The filter doesn't apply to directories whether they were created or deleted
+        self.assertEqual(records[2]['path'], dir_path)
+        self.assertEqual(records[2]['action'], FileManifest.CREATED)
+        self.assertEqual(dict(records[3]), {'path': os.path.join(self.temp_dir, "gone_dir"),
+                                            'action': FileManifest.DELETED})
+
+        # The file that doesn't match the filter must not have been hashed
+        self.assertEqual(file_hasher.bytes_hashed, 7)
+
+    def test_run_watcher_hec_error(self):
+        """
+        Make sure the watcher keeps running and sends the changes again if they couldn't be sent
+        to the HTTP Event Collector.
+        """
+
+        server = StubHECServer()
+        self.addCleanup(server.stop)
+
+        # Reject the first request
+        server.statuses = [400]
+
+        modular_input = FileMetaDataModularInput()
+        modular_input.logger = logging.getLogger('test_run_watcher_hec_error')
+        modular_input.WATCH_RETRY_DELAY = 0
+
+        output_options = {'stanza': 'file_meta_data://test', 'sourcetype': 'file_meta_data',
+                          'source': None, 'index': None, 'output_format': 'json',
+                          'output_mode': 'hec'}
+        sink_options = {'output_mode': 'hec', 'hec_url': server.get_url(), 'hec_token': 'token'}
+
+        self.watcher = TreeWatcher(self.temp_dir)
+        stop_event = threading.Event()
+
+        thread = threading.Thread(target=modular_input.run_watcher,
+                                  args=('file_meta_data://test', self.watcher, stop_event,
+                                        output_options, sink_options, {}, {}))
+        thread.start()
+
+        try:
+            deadline = time.time() + 5
+
+            while not self.watcher.watches and time.time() < deadline:
+                time.sleep(0.05)
+
+            file_path = self.write_file("a.txt")
+
+            while len(server.requests) < 2 and time.time() < deadline + 10:
+                time.sleep(0.05)
+
+            self.assertTrue(thread.is_alive())
+
+        finally:
+            stop_event.set()
+            thread.join(10)
+
+        # The change that was rejected must have been sent again
+        self.assertEqual(len(server.requests), 2)
+
+        for request in server.requests:
+            self.assertIn(file_path, [json.loads(line)['event']['path']
+                                      for line in request['body'].splitlines()])
+
+    def test_run_watcher_hash_cache(self):
+        """
+        Make sure the files changed while watching are hashed with the governor and that the
+        hashes are saved to the hash cache for the next scan.
+        """
+
+        state_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, state_dir)
+
+        hash_cache_file_path = os.path.join(state_dir, 'state.sqlite')
+
+        modular_input = FileMetaDataModularInput()
+        modular_input.logger = logging.getLogger('test_run_watcher_hash_cache')
+
+        output = []
+        modular_input.output_event_string = output.append
+
+        governor = IOGovernor(max_read_bytes_per_sec=1000000)
+        output_options = {'stanza': 'file_meta_data://test', 'sourcetype': 'file_meta_data',
+                          'source': None, 'index': None, 'unbroken': True, 'close': True}
+
+        self.watcher = TreeWatcher(self.temp_dir)
+        stop_event = threading.Event()
+
+        thread = threading.Thread(target=modular_input.run_watcher,
+                                  args=('file_meta_data://test', self.watcher, stop_event,
+                                        output_options, {},
+                                        {'file_hash_limit': 1000, 'governor': governor},
+                                        {'governor': governor}, hash_cache_file_path))
+        thread.start()
+
+        try:
+            # Wait for the watches to be added before changing the file
+            deadline = time.time() + 5
+
+            while not self.watcher.watches and time.time() < deadline:
+                time.sleep(0.05)
+
+            file_path = self.write_file("a.txt")
+
+            while not output and time.time() < deadline + 5:
+                time.sleep(0.05)
+
+        finally:
+            stop_event.set()
+            thread.join(10)
+
+        self.assertEqual(len(output), 1)
+        self.assertEqual(governor.get_stats()['read_bytes'], 7)
+
+        with CheckpointStore(hash_cache_file_path) as checkpoint_store:
+            hash_cache = HashCache(checkpoint_store, new_run=False)
+            self.assertIsNotNone(hash_cache.get(file_path, os.stat(file_path)))
+
+def run_tests():
+    """
+    Run the tests.
+    """
+
+    loader = unittest.TestLoader()
+    suites = []
+    suites.append(loader.loadTestsFromTestCase(TestFileMetaDataModularInput))
+    suites.append(loader.loadTestsFromTestCase(TestFileHasher))
+    suites.append(loader.loadTestsFromTestCase(TestFileRecord))
+    suites.append(loader.loadTestsFromTestCase(TestXMLEventSerializer))
+    suites.append(loader.loadTestsFromTestCase(TestEventBatcher))
+    suites.append(loader.loadTestsFromTestCase(TestHECEventSink))
+    suites.append(loader.loadTestsFromTestCase(TestPathFilter))
+    suites.append(loader.loadTestsFromTestCase(TestIOGovernor))
+    suites.append(loader.loadTestsFromTestCase(TestScanTelemetry))
+    suites.append(loader.loadTestsFromTestCase(TestCheckpointStore))
+    suites.append(loader.loadTestsFromTestCase(TestHashCache))
+    suites.append(loader.loadTestsFromTestCase(TestFileManifest))
+    suites.append(loader.loadTestsFromTestCase(TestFileMetaDataRun))
+    suites.append(loader.loadTestsFromTestCase(TestFileMetaDataScript))
+    suites.append(loader.loadTestsFromTestCase(TestFileSizeField))
+    suites.append(loader.loadTestsFromTestCase(TestDurationField))
+
+    if os.name == 'nt':
+        suites.append(loader.loadTestsFromTestCase(TestFileMetaDataWindows))
+    else:
+        print("Warning: Windows specific tests will be skipped since this host is not running Windows")
+
+    if os.name == 'posix':
+        suites.append(loader.loadTestsFromTestCase(TestFileMetaDataNix))
+    else:
         print("Warning: POSIX specific tests will be skipped since this host is not running Unix or Linux")
 
+    if Inotify.is_available():
+        suites.append(loader.loadTestsFromTestCase(TestTreeWatcher))
+    else:
+        print("Warning: the tests of watch mode will be skipped since inotify is not available")
+
     report_path = os.path.join('..', os.environ.get('TEST_OUTPUT', 'tmp/test_report.html'))
 
     # Make the test directory